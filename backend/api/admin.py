@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import UserProfile, Like, Match, ChatMessage, MatchSuggestion, Skill
+from .models import UserProfile, Like, Match, ChatMessage, MatchSuggestion, SuggestedProfile, Skill
 
 
 @admin.register(Skill)
@@ -37,13 +37,26 @@ class MatchAdmin(admin.ModelAdmin):
 
 @admin.register(ChatMessage)
 class ChatMessageAdmin(admin.ModelAdmin):
-    list_display = ['match', 'sender', 'created_at', 'is_read']
-    list_filter = ['created_at', 'is_read']
+    list_display = ['match', 'sender', 'created_at', 'read']
+    list_select_related = ['match', 'sender__user']
+    list_filter = ['created_at']
     search_fields = ['message', 'sender__user__first_name']
     readonly_fields = ['created_at']
+    
+    @admin.display(boolean=True, description='Is read')
+    def read(self, obj):
+        return obj.is_read
+
+
+class SuggestedProfileInline(admin.TabularInline):
+    model = SuggestedProfile
+    fields = ['rank', 'profile', 'compatibility_score']
+    readonly_fields = ['rank', 'profile', 'compatibility_score']
+    extra = 0
 
 
 @admin.register(MatchSuggestion)
 class MatchSuggestionAdmin(admin.ModelAdmin):
     list_display = ['user', 'last_updated']
     readonly_fields = ['last_updated']
+    inlines = [SuggestedProfileInline]
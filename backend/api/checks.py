@@ -0,0 +1,9 @@
+from django.core import checks
+
+from .scoring_tables import check_tables
+
+
+@checks.register()
+def scoring_tables_check(app_configs, **kwargs):
+    """Report scoring lookup tables that disagree with the model choices"""
+    return [checks.Error(problem, id='api.E001') for problem in check_tables()]
@@ -6,7 +6,9 @@ from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import User
 from django.conf import settings
+from . import json_codec
 from .models import Match, ChatMessage, UserProfile
+from .query_budget import enforce_budget, track_queries
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
@@ -19,6 +21,9 @@ class ChatConsumer(AsyncWebsocketConsumer):
     In production, authentication is required.
     """
     
+    # Database queries allowed per received message (see query_budget)
+    query_budget = 6
+    
     async def connect(self):
         """Handle WebSocket connection"""
         self.match_id = self.scope['url_route']['kwargs']['match_id']
@@ -53,10 +58,14 @@ class ChatConsumer(AsyncWebsocketConsumer):
         await self.accept()
         
         # Send connection confirmation
-        await self.send(text_data=json.dumps({
+        await self.send_json({
             'type': 'connection_established',
             'message': 'Connected to chat'
-        }))
+        })
+    
+    async def send_json(self, content):
+        """Send `content` as a JSON text frame"""
+        await self.send(text_data=json_codec.dumps_text(content))
     
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection"""
@@ -67,29 +76,35 @@ class ChatConsumer(AsyncWebsocketConsumer):
         )
     
     async def receive(self, text_data):
+        """Handle one WebSocket message, counting its database queries"""
+        with track_queries() as usage:
+            await self.handle_message(text_data)
+        enforce_budget(f'ChatConsumer message (match {self.match_id})', usage, self.query_budget)
+    
+    async def handle_message(self, text_data):
         """
         Receive message from WebSocket
         Expected format: {'message': 'text content'}
         """
         try:
-            data = json.loads(text_data)
+            data = json_codec.loads(text_data)
             message_text = data.get('message', '').strip()
             
             if not message_text:
-                await self.send(text_data=json.dumps({
+                await self.send_json({
                     'type': 'error',
                     'message': 'Message cannot be empty'
-                }))
+                })
                 return
             
             # Save message to database
             saved_message = await self.save_message(message_text)
             
             if not saved_message:
-                await self.send(text_data=json.dumps({
+                await self.send_json({
                     'type': 'error',
                     'message': 'Failed to save message'
-                }))
+                })
                 return
             
             # Send message to room group
@@ -106,21 +121,21 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 }
             )
         except json.JSONDecodeError:
-            await self.send(text_data=json.dumps({
+            await self.send_json({
                 'type': 'error',
                 'message': 'Invalid JSON format'
-            }))
+            })
         except Exception as e:
-            await self.send(text_data=json.dumps({
+            await self.send_json({
                 'type': 'error',
                 'message': f'An error occurred: {str(e)}'
-            }))
+            })
     
     async def chat_message(self, event):
         """
         Receive message from room group and send to WebSocket
         """
-        await self.send(text_data=json.dumps({
+        await self.send_json({
             'type': 'message',
             'message': event['message'],
             'sender_id': event['sender_id'],
@@ -128,7 +143,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'sender_name': event['sender_name'],
             'created_at': event['created_at'],
             'message_id': event['message_id']
-        }))
+        })
     
     @database_sync_to_async
     def check_match_exists(self):
@@ -148,14 +163,9 @@ class ChatConsumer(AsyncWebsocketConsumer):
         """
         try:
             user_profile = UserProfile.objects.get(user=self.user)
-            match = Match.objects.get(id=self.match_id)
-            
-            # Check if user is either user1 or user2 in the match
-            if match.user1 == user_profile or match.user2 == user_profile:
-                return True
-            return False
-        except (Match.DoesNotExist, UserProfile.DoesNotExist):
+        except UserProfile.DoesNotExist:
             return False
+        return Match.objects.involving(user_profile).filter(id=self.match_id).exists()
     
     @database_sync_to_async
     def save_message(self, message_text):
@@ -0,0 +1,128 @@
+"""
+Hand-compiled list serializers for the hot read endpoints.
+
+DRF serializes every row by walking its bound fields (get_attribute, None
+checks and to_representation per field), which dominates CPU time when
+listing profiles, matches and chat messages. The functions below build the
+same dicts directly from model instances, expecting the relations of the
+serializer's QueryPlan to be loaded (see query_plans). Output is identical to
+the DRF serializers, key order included; types with non-trivial formatting
+(datetimes, files) go through the same DRF field code.
+
+They are hooked in as Meta.list_serializer_class, so every many=True use of
+UserProfileListSerializer, MatchSerializer and ChatMessageSerializer (views,
+nested serializers) takes the fast path, while single instances still go
+through DRF.
+"""
+
+from rest_framework import serializers
+
+_datetime_field = serializers.DateTimeField()
+
+
+def _datetime(value):
+    return _datetime_field.to_representation(value)
+
+
+def _file_url(value, request):
+    """FileField.to_representation with the serializer context's request"""
+    if not value:
+        return None
+    try:
+        url = value.url
+    except AttributeError:
+        return None
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def _optional_int(value):
+    return None if value is None else int(value)
+
+
+def skill_row(skill):
+    """SkillSerializer(skill).data"""
+    return {
+        'id': skill.id,
+        'name': skill.name,
+        'slug': skill.slug,
+        'icon': skill.icon,
+        'category': skill.category,
+    }
+
+
+def profile_list_row(profile, request=None):
+    """UserProfileListSerializer(profile).data"""
+    user = profile.user
+    return {
+        'id': profile.id,
+        'user': {
+            'id': user.id,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+        },
+        'age': _optional_int(profile.age),
+        'bio': profile.bio,
+        'profile_image': _file_url(profile.profile_image, request),
+        'developer_type': profile.developer_type,
+        'teammate_preference': profile.teammate_preference,
+        'skills': [skill_row(skill) for skill in profile.skills.all()],
+        'years_of_experience': int(profile.years_of_experience),
+        'availability': profile.availability,
+        'github_url': profile.github_url,
+        'x_url': profile.x_url,
+        'portfolio_url': profile.portfolio_url,
+    }
+
+
+def match_row(match, request=None):
+    """MatchSerializer(match).data"""
+    return {
+        'id': match.id,
+        'user1': match.user1_id,
+        'user2': match.user2_id,
+        'user1_profile': profile_list_row(match.user1, request),
+        'user2_profile': profile_list_row(match.user2, request),
+        'created_at': _datetime(match.created_at),
+        'compatibility_score': float(match.compatibility_score),
+    }
+
+
+def chat_message_row(message, request=None):
+    """ChatMessageSerializer(message).data"""
+    sender = message.sender
+    return {
+        'id': message.id,
+        'match': message.match_id,
+        'sender': message.sender_id,
+        'sender_id': sender.id,
+        'sender_name': sender.user.first_name,
+        'message': message.message,
+        'created_at': _datetime(message.created_at),
+        'is_read': message.is_read,
+    }
+
+
+class CompiledListSerializer(serializers.ListSerializer):
+    """ListSerializer rendering each item with the compiled `row` function"""
+
+    row = None
+
+    def to_representation(self, data):
+        iterable = data.all() if hasattr(data, 'all') else data
+        request = self.context.get('request')
+        row = type(self).row
+        return [row(item, request) for item in iterable]
+
+
+class ProfileListRows(CompiledListSerializer):
+    row = profile_list_row
+
+
+class MatchRows(CompiledListSerializer):
+    row = match_row
+
+
+class ChatMessageRows(CompiledListSerializer):
+    row = chat_message_row
@@ -0,0 +1,204 @@
+"""
+Compact feature snapshots of user profiles for the matching algorithm.
+
+A ProfileFeatures holds everything calculate_compatibility_score needs as
+plain integers: skills and looking_for as bitmasks (bit n set = skill id n)
+and small-int codes for the categorical fields (see scoring_tables).
+The bitmasks are stored on the profile row (skills_mask / looking_for_mask,
+kept in sync with the M2M tables by sync_skill_masks), so snapshots for any
+number of profiles are read from the profile table alone and scoring never
+touches the ORM.
+"""
+
+from itertools import islice
+
+from .models import UserProfile
+from .scoring_tables import AVAILABILITY_CODES, TYPE_CODES, tables
+
+
+# Fields read from the profile row when loading snapshots
+PROFILE_FIELDS = (
+    'id', 'developer_type', 'teammate_preference', 'availability', 'years_of_experience',
+    'updated_at', 'skills_mask', 'looking_for_mask',
+)
+
+
+def skill_mask(skill_ids):
+    """Bitmask with bit n set for every skill id n"""
+    mask = 0
+    for skill_id in skill_ids:
+        mask |= 1 << skill_id
+    return mask
+
+
+def encode_mask(mask):
+    """Bitmask as stored in a BinaryField: little-endian bytes, empty for no skills"""
+    return mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+
+
+def decode_mask(value):
+    """Bitmask from a BinaryField value (bytes or memoryview)"""
+    return int.from_bytes(value, 'little') if value else 0
+
+
+def mask_skill_ids(mask):
+    """Skill ids whose bits are set in `mask`, ascending"""
+    skill_ids = []
+    while mask:
+        low_bit = mask & -mask
+        skill_ids.append(low_bit.bit_length() - 1)
+        mask ^= low_bit
+    return skill_ids
+
+
+class ProfileFeatures:
+    """Immutable-by-convention scoring snapshot of a UserProfile"""
+
+    __slots__ = (
+        'id', 'version', 'skills', 'looking_for', 'skill_count', 'looking_count',
+        'developer_type', 'teammate_preference', 'availability', 'years_of_experience',
+    )
+
+    def __init__(self, id, skills, looking_for, developer_type, teammate_preference,
+                 availability, years_of_experience, version=None):
+        self.id = id
+        # updated_at of the profile row the snapshot was taken from
+        self.version = version
+        self.skills = skills
+        self.looking_for = looking_for
+        self.skill_count = skills.bit_count()
+        self.looking_count = looking_for.bit_count()
+        self.developer_type = developer_type
+        self.teammate_preference = teammate_preference
+        self.availability = availability
+        self.years_of_experience = years_of_experience
+
+    @classmethod
+    def from_values(cls, id, developer_type, teammate_preference, availability,
+                    years_of_experience, version=None, skills=0, looking_for=0):
+        """Build a snapshot from raw field values"""
+        return cls(
+            id=id,
+            version=version,
+            skills=skills,
+            looking_for=looking_for,
+            developer_type=tables.encode(TYPE_CODES, developer_type),
+            teammate_preference=tables.encode(TYPE_CODES, teammate_preference),
+            availability=tables.encode(AVAILABILITY_CODES, availability),
+            years_of_experience=years_of_experience,
+        )
+
+    @classmethod
+    def from_profile(cls, profile):
+        """Build a snapshot from a UserProfile's row, without querying its skills"""
+        return cls.from_values(
+            profile.id,
+            profile.developer_type,
+            profile.teammate_preference,
+            profile.availability,
+            profile.years_of_experience,
+            version=profile.updated_at,
+            skills=decode_mask(profile.skills_mask),
+            looking_for=decode_mask(profile.looking_for_mask),
+        )
+
+    def __repr__(self):
+        return f"<ProfileFeatures id={self.id} skills={self.skills:#x} looking_for={self.looking_for:#x}>"
+
+
+def as_features(profile):
+    """Return `profile` as a ProfileFeatures, converting UserProfile instances"""
+    if isinstance(profile, ProfileFeatures):
+        return profile
+    return ProfileFeatures.from_profile(profile)
+
+
+def load_skill_masks(through, profile_ids):
+    """Skill bitmasks per profile id from an M2M through table"""
+    masks = {}
+    rows = through.objects.filter(userprofile_id__in=profile_ids).values_list(
+        'userprofile_id', 'skill_id'
+    )
+    for profile_id, skill_id in rows:
+        masks[profile_id] = masks.get(profile_id, 0) | (1 << skill_id)
+    return masks
+
+
+def sync_skill_masks(profile_ids, fields=('skills', 'looking_for'), **values):
+    """
+    Recompute the stored bitmasks of profiles from their M2M rows.
+
+    Two queries at most: one per through table read, and one bulk update
+    that also sets any extra column `values` (e.g. updated_at).
+
+    Args:
+        profile_ids: ids of the profiles to update
+        fields: Which of 'skills' / 'looking_for' to recompute
+        **values: Other columns to set on the same profiles
+
+    Returns:
+        Dict of profile id -> {mask field name: stored bytes}
+    """
+    profile_ids = list(profile_ids)
+    masks = {
+        f'{field}_mask': load_skill_masks(getattr(UserProfile, field).through, profile_ids)
+        for field in fields
+    }
+    stored = {
+        profile_id: {name: encode_mask(masks_by_id.get(profile_id, 0)) for name, masks_by_id in masks.items()}
+        for profile_id in profile_ids
+    }
+    UserProfile.objects.bulk_update(
+        [UserProfile(pk=profile_id, **columns, **values) for profile_id, columns in stored.items()],
+        [*masks, *values],
+    )
+    return stored
+
+
+def _build_features(rows):
+    return [
+        ProfileFeatures.from_values(
+            *row[:6],
+            skills=decode_mask(row[6]),
+            looking_for=decode_mask(row[7]),
+        )
+        for row in rows
+    ]
+
+
+def load_profile_features(queryset=None):
+    """
+    Load feature snapshots for every profile in a queryset.
+
+    Runs exactly one query regardless of the number of profiles, as the
+    skills are read from the profile rows' bitmask columns.
+
+    Args:
+        queryset: UserProfile queryset (default: all profiles)
+
+    Returns:
+        Dict of profile id -> ProfileFeatures, in queryset order
+    """
+    if queryset is None:
+        queryset = UserProfile.objects.all()
+
+    features = _build_features(queryset.values_list(*PROFILE_FIELDS))
+    return {f.id: f for f in features}
+
+
+def iter_feature_chunks(queryset, chunk_size=2000):
+    """
+    Stream feature snapshots for a queryset in chunks of `chunk_size`.
+
+    Profile rows are read with a chunked iterator, so memory stays
+    O(chunk_size) however many profiles match.
+
+    Yields:
+        Lists of ProfileFeatures, in queryset order
+    """
+    rows = queryset.values_list(*PROFILE_FIELDS).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield _build_features(chunk)
@@ -0,0 +1,159 @@
+"""
+Pluggable JSON codec for REST responses, request bodies and chat frames.
+
+settings.JSON_CODEC selects the implementation: 'orjson' (the default, used
+when the package is installed) or 'json' (the standard library, always
+available). The stdlib codec produces the same bytes as DRF's JSONRenderer
+with default settings: compact separators, unescaped non-ASCII except
+U+2028/U+2029, and DRF's encoder for everything JSON has no type for.
+
+orjson matches it for strings, integers, containers and the types DRF's
+encoder formats (datetimes are passed through to it, so datetime, date,
+time and Decimal values come out as before). Integers beyond 64 bits, which
+orjson cannot encode, are retried with the stdlib codec, and bodies that may
+hold such integers are parsed by it so they stay exact. Two differences
+remain, both in floats:
+
+- floats Python writes in exponent form are spelled differently
+  (1e16 instead of 1e+16, 0.00001 instead of 1e-05); they parse back to the
+  same value
+- NaN and infinite floats, which the stdlib codec rejects, become null
+"""
+
+import json
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework import parsers, renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.utils import encoders
+from rest_framework.utils.json import strict_constant
+
+try:
+    import orjson
+except ImportError:  # Optional: the stdlib codec is used instead
+    orjson = None
+
+JSON_CODECS = ('orjson', 'json')
+
+_drf_encoder = encoders.JSONEncoder()
+
+# Shortest digit run that can be an integer outside orjson's 64-bit range
+_LONG_DIGITS = re.compile(r'\d{19}')
+_LONG_DIGITS_BYTES = re.compile(rb'\d{19}')
+
+
+def _escape_line_separators(data):
+    # Keep the output a strict JavaScript subset, as DRF does
+    if b'\xe2\x80\xa8' in data or b'\xe2\x80\xa9' in data:
+        data = data.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return data
+
+
+class StdlibCodec:
+    name = 'json'
+
+    def dumps(self, obj):
+        """Compact UTF-8 JSON bytes"""
+        data = json.dumps(
+            obj, cls=encoders.JSONEncoder, ensure_ascii=False, allow_nan=False, separators=(',', ':')
+        )
+        return _escape_line_separators(data.encode())
+
+    def loads(self, data):
+        """Python value of JSON `data` (bytes or str); raises ValueError"""
+        return json.loads(data, parse_constant=strict_constant)
+
+
+class OrjsonCodec:
+    name = 'orjson'
+
+    def __init__(self):
+        self.options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj):
+        """Compact UTF-8 JSON bytes"""
+        try:
+            data = orjson.dumps(obj, default=_drf_encoder.default, option=self.options)
+        except orjson.JSONEncodeError:
+            # Integers beyond 64 bits; values nothing can encode raise again
+            return StdlibCodec().dumps(obj)
+        return _escape_line_separators(data)
+
+    def loads(self, data):
+        """Python value of JSON `data` (bytes or str); raises ValueError"""
+        # orjson reads integers beyond 64 bits as floats, losing precision.
+        # Any run of 19+ digits (even inside a string) goes through the stdlib
+        long_digits = _LONG_DIGITS_BYTES if isinstance(data, (bytes, bytearray)) else _LONG_DIGITS
+        if long_digits.search(data):
+            return StdlibCodec().loads(data)
+        return orjson.loads(data)
+
+
+@lru_cache(maxsize=None)
+def get_codec():
+    """The codec selected by settings.JSON_CODEC, falling back to the stdlib"""
+    name = getattr(settings, 'JSON_CODEC', 'orjson')
+    if name not in JSON_CODECS:
+        raise ValueError(f"Unknown JSON_CODEC {name!r}, expected one of {JSON_CODECS}")
+    if name == 'orjson' and orjson is not None:
+        return OrjsonCodec()
+    return StdlibCodec()
+
+
+@receiver(setting_changed)
+def reset_codec(setting, **kwargs):
+    if setting == 'JSON_CODEC':
+        get_codec.cache_clear()
+
+
+def dumps(obj):
+    """`obj` as JSON bytes"""
+    return get_codec().dumps(obj)
+
+
+def dumps_text(obj):
+    """`obj` as a JSON string, e.g. for a WebSocket text frame"""
+    return get_codec().dumps(obj).decode()
+
+
+def loads(data):
+    """Parse JSON bytes or str"""
+    return get_codec().loads(data)
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """DRF JSONRenderer encoding through the configured codec"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # Indented output (e.g. the browsable API) and non-default
+        # UNICODE/COMPACT/STRICT_JSON settings keep DRF's own encoding
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None or self.ensure_ascii or not self.compact or not self.strict:
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+class JSONParser(parsers.JSONParser):
+    """DRF JSONParser decoding through the configured codec"""
+
+    renderer_class = JSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if not self.strict:
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            data = stream.read()
+            if encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+                data = data.decode(encoding)
+            return loads(data)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,188 @@
+"""
+MinHash / LSH index for approximate suggestion candidates.
+
+Every profile is indexed by the set of tokens it offers: one "has" token per
+skill and one "wants" token per looking_for skill. A lookup builds the
+complementary set, which holds "has" tokens for the user's skills and
+looking_for, and "wants" tokens for the user's skills. Two profiles share a
+token exactly when SkillIndex would pair them. The MinHash signatures of the
+two sets agree in proportion to their Jaccard similarity.
+
+Signatures are split into `bands` bands of `rows` values. Profiles that match
+on a whole band land in the same bucket, and only profiles sharing a bucket
+with the query are scored exactly. More bands raise recall, and more rows
+make buckets smaller. Use the matching_recall command to measure the
+tradeoff for the current data.
+
+The index lives in process memory. It is built on first use and refreshed by
+re-hashing the profiles whose updated_at moved since the last refresh.
+Deleted profiles stay in their buckets until the next rebuild. They never
+become suggestions, because candidates are still filtered by the database.
+"""
+
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .features import iter_feature_chunks, mask_skill_ids
+from .models import UserProfile
+
+MERSENNE_PRIME = (1 << 31) - 1
+
+# Re-read profiles changed this long before the last refresh, so rows
+# committed shortly after their updated_at was set are not missed
+REFRESH_OVERLAP = timedelta(seconds=30)
+
+
+def offer_tokens(features):
+    """Tokens a profile is indexed under: its skills and what it looks for"""
+    return (
+        [2 * skill_id for skill_id in mask_skill_ids(features.skills)]
+        + [2 * skill_id + 1 for skill_id in mask_skill_ids(features.looking_for)]
+    )
+
+
+def query_tokens(features):
+    """Offer tokens of the profiles that can score on skills with `features`"""
+    return (
+        [2 * skill_id for skill_id in mask_skill_ids(features.skills | features.looking_for)]
+        + [2 * skill_id + 1 for skill_id in mask_skill_ids(features.skills)]
+    )
+
+
+class LSHIndex:
+    """Banded MinHash buckets of profile ids"""
+
+    def __init__(self, bands=16, rows=2, seed=0):
+        rng = np.random.default_rng(seed)
+        self.bands = bands
+        self.rows = rows
+        # a * token + b stays below 2**63 for tokens below 2**32
+        self.a = rng.integers(1, MERSENNE_PRIME, bands * rows, dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_PRIME, bands * rows, dtype=np.uint64)
+        self.buckets = [{} for _ in range(bands)]
+        # profile id -> its key in each band, to move it when it changes
+        self.keys = {}
+        self.synced_at = None
+        self.refreshed = None
+        self.lock = threading.Lock()
+
+    def signature(self, tokens):
+        """MinHash signature of a non-empty token list"""
+        tokens = np.asarray(tokens, dtype=np.uint64)
+        hashes = (self.a[:, None] * tokens[None, :] + self.b[:, None]) % MERSENNE_PRIME
+        return hashes.min(axis=1)
+
+    def band_keys(self, tokens):
+        signature = self.signature(tokens).tolist()
+        return [
+            tuple(signature[band * self.rows:(band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+    def _remove(self, profile_id):
+        for bucket, key in zip(self.buckets, self.keys.pop(profile_id, ())):
+            members = bucket[key]
+            members.discard(profile_id)
+            if not members:
+                del bucket[key]
+
+    def _add(self, features):
+        self._remove(features.id)
+        tokens = offer_tokens(features)
+        if not tokens:
+            # No skills at all: not a candidate for anyone through the index
+            return
+        keys = self.band_keys(tokens)
+        for bucket, key in zip(self.buckets, keys):
+            bucket.setdefault(key, set()).add(features.id)
+        self.keys[features.id] = keys
+
+    def update(self, features_list):
+        """Insert or move the given profile snapshots"""
+        with self.lock:
+            for features in features_list:
+                self._add(features)
+
+    def remove(self, profile_id):
+        with self.lock:
+            self._remove(profile_id)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def candidates(self, user_features):
+        """
+        Ids of the profiles sharing at least one bucket with a user.
+
+        Args:
+            user_features: ProfileFeatures of the user suggestions are for
+
+        Returns:
+            Set of profile ids (may include the user and deleted profiles)
+        """
+        tokens = query_tokens(user_features)
+        if not tokens:
+            return set()
+        found = set()
+        with self.lock:
+            for bucket, key in zip(self.buckets, self.band_keys(tokens)):
+                found.update(bucket.get(key, ()))
+        return found
+
+    def build(self, chunk_size=2000):
+        """Index every profile"""
+        started = timezone.now()
+        for chunk in iter_feature_chunks(UserProfile.objects.all(), chunk_size):
+            self.update(chunk)
+        self.synced_at = started
+        self.refreshed = time.monotonic()
+
+    def refresh(self, chunk_size=2000):
+        """Re-hash the profiles changed since the last build or refresh"""
+        if self.synced_at is None:
+            return self.build(chunk_size)
+        started = timezone.now()
+        changed = UserProfile.objects.filter(updated_at__gt=self.synced_at - REFRESH_OVERLAP)
+        for chunk in iter_feature_chunks(changed, chunk_size):
+            self.update(chunk)
+        self.synced_at = started
+        self.refreshed = time.monotonic()
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_lsh_index():
+    """
+    The process-wide LSHIndex configured from settings.
+
+    It is built on first use and refreshed when it is older than
+    MATCHING_LSH_REFRESH seconds.
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = LSHIndex(
+                bands=getattr(settings, 'MATCHING_LSH_BANDS', 16),
+                rows=getattr(settings, 'MATCHING_LSH_ROWS', 2),
+            )
+        index = _index
+        max_age = getattr(settings, 'MATCHING_LSH_REFRESH', 5)
+        if index.refreshed is None or time.monotonic() - index.refreshed >= max_age:
+            index.refresh(getattr(settings, 'MATCHING_CHUNK_SIZE', 2000))
+    return index
+
+
+@receiver(setting_changed)
+def reset_lsh_index(setting, **kwargs):
+    global _index
+    if setting.startswith('MATCHING_LSH_'):
+        _index = None
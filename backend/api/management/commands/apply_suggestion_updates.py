@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.suggestions import apply_profile_change, pending_profile_changes
+
+
+class Command(BaseCommand):
+    help = 'Patch profile changes left pending by requests into the stored suggestion lists'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help='Most profile changes applied in this run')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        profile_ids = list(
+            pending_profile_changes().order_by('updated_at').values_list('pk', flat=True)[:options['limit']]
+        )
+        applied = sum(apply_profile_change(profile_id) for profile_id in profile_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Applied {applied} pending profile changes in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,254 @@
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from api.features import encode_mask, load_profile_features, skill_mask
+from api.matching_algorithm import (
+    CANDIDATE_SOURCES, MATCHING_ENGINES, calculate_compatibility_score, get_top_suggestions
+)
+from api.models import DEVELOPER_TYPES, TEAMMATE_PREFERENCES, UserProfile, Skill
+
+AVAILABILITY = ['part-time', 'full-time', 'weekends', 'flexible']
+
+# Skill categories a developer type mostly knows (and is looked for with)
+TYPE_CATEGORIES = {
+    'frontend': ['frontend'],
+    'backend': ['backend', 'database'],
+    'fullstack': ['frontend', 'backend', 'database'],
+    'devops': ['devops', 'backend'],
+    'mobile': ['mobile', 'frontend'],
+    'data': ['database', 'other'],
+    'ml': ['other', 'backend'],
+    'other': ['other'],
+    'any': [],
+}
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class SkillSampler:
+    """
+    Draws skill sets the way real profiles look: a few skills, mostly from
+    the categories of a developer type, with Zipf-like popularity so some
+    skills (the Pythons and Reacts) are far more common than others.
+    """
+
+    def __init__(self, skills, rng):
+        self.rng = rng
+        # category -> skill ids, most popular first; None holds every skill
+        self.pools = {None: [skill.id for skill in skills]}
+        for skill in skills:
+            self.pools.setdefault(skill.category, []).append(skill.id)
+        self.weights = {}
+        for category, skill_ids in self.pools.items():
+            rng.shuffle(skill_ids)
+            self.weights[category] = [1 / (rank + 1) for rank in range(len(skill_ids))]
+
+    def sample(self, developer_type, count):
+        pool, weights = [], []
+        for category in TYPE_CATEGORIES.get(developer_type) or [None]:
+            if category not in self.pools:
+                category = None
+            pool += self.pools[category]
+            weights += self.weights[category]
+        chosen = set()
+        for _ in range(count * 3):
+            if len(chosen) >= min(count, len(pool)):
+                break
+            chosen.add(self.rng.choices(pool, weights)[0])
+        # A tenth of the picks come from outside the usual categories
+        if self.rng.random() < 0.1:
+            chosen.add(self.rng.choice(self.pools[None]))
+        return chosen
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the matching engines on synthetic populations (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+            help='Population sizes to benchmark'
+        )
+        parser.add_argument(
+            '--engines', nargs='+', choices=MATCHING_ENGINES,
+            # Off PostgreSQL the sql engine would only measure its Python fallback
+            default=[e for e in MATCHING_ENGINES if e != 'sql' or connection.vendor == 'postgresql'],
+            help='Scoring engines to benchmark'
+        )
+        parser.add_argument(
+            '--candidates', nargs='+', choices=CANDIDATE_SOURCES,
+            default=[getattr(settings, 'MATCHING_CANDIDATES', 'index')],
+            help='Candidate sources to benchmark'
+        )
+        parser.add_argument('--requests', type=int, default=50, help='get_top_suggestions calls per run')
+        parser.add_argument('--limit', type=int, default=10, help='Suggestions per call')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic population')
+        parser.add_argument(
+            '--output', default='matching-benchmark.json',
+            help='JSON file the results are written to'
+        )
+
+    def handle(self, *args, **options):
+        skills = list(Skill.objects.all())
+        if not skills:
+            raise CommandError('No skills found. Run populate_skills first.')
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'commit': self.git_commit(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'requests': options['requests'],
+            'limit': options['limit'],
+            'results': [],
+        }
+        for size in options['sizes']:
+            # Everything written for a population is rolled back
+            with transaction.atomic():
+                started = time.monotonic()
+                profile_ids = self.create_population(skills, size, random.Random(options['seed']))
+                self.stdout.write(f'\nPopulation of {size} created in {time.monotonic() - started:.1f}s')
+
+                report['results'].append(dict(size=size, **self.benchmark_pair_scoring()))
+                sample = random.Random(options['seed']).sample(profile_ids, min(options['requests'], size))
+                for engine in options['engines']:
+                    for source in options['candidates']:
+                        result = self.benchmark_suggestions(sample, engine, source, options['limit'])
+                        report['results'].append(dict(size=size, **result))
+                transaction.set_rollback(True)
+
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'\n✓ Results written to {options["output"]}'))
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                cwd=settings.BASE_DIR
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def create_population(self, skills, size, rng):
+        """Bulk-create `size` profiles with realistic skills; returns their ids"""
+        sampler = SkillSampler(skills, rng)
+        batch_size = 2000
+        users = User.objects.bulk_create(
+            [User(username=f'benchmark-{i}', password='!') for i in range(size)],
+            batch_size=batch_size
+        )
+        profiles = []
+        for user in users:
+            developer_type = rng.choice(DEVELOPER_TYPES)[0]
+            profile = UserProfile(
+                user=user,
+                developer_type=developer_type,
+                teammate_preference=rng.choice(TEAMMATE_PREFERENCES)[0],
+                availability=rng.choice(AVAILABILITY),
+                years_of_experience=min(int(rng.expovariate(1 / 5)), 30),
+            )
+            profile.skill_ids = sampler.sample(developer_type, rng.randint(2, 8))
+            profile.looking_for_ids = sampler.sample(profile.teammate_preference, rng.randint(1, 5))
+            # Bulk inserts bypass the m2m_changed signals that maintain these
+            profile.skills_mask = encode_mask(skill_mask(profile.skill_ids))
+            profile.looking_for_mask = encode_mask(skill_mask(profile.looking_for_ids))
+            profiles.append(profile)
+        UserProfile.objects.bulk_create(profiles, batch_size=batch_size)
+        if profiles[0].pk is None:
+            # Backends that cannot return ids from bulk inserts
+            ids = UserProfile.objects.filter(user__in=users).order_by('user_id').values_list('id', flat=True)
+            for profile, profile_id in zip(profiles, ids):
+                profile.pk = profile_id
+
+        for field, attname in (('skills', 'skill_ids'), ('looking_for', 'looking_for_ids')):
+            through = getattr(UserProfile, field).through
+            through.objects.bulk_create([
+                through(userprofile_id=profile.pk, skill_id=skill_id)
+                for profile in profiles
+                for skill_id in getattr(profile, attname)
+            ], batch_size=batch_size * 5)
+        return [profile.pk for profile in profiles]
+
+    def benchmark_pair_scoring(self):
+        """Raw calculate_compatibility_score throughput over feature snapshots"""
+        features = list(load_profile_features().values())
+        users = features[:20]
+        started = time.perf_counter()
+        pairs = 0
+        for user in users:
+            for other in features:
+                calculate_compatibility_score(user, other)
+            pairs += len(features)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'  calculate_compatibility_score: {pairs / elapsed:,.0f} pairs/s')
+        return {'benchmark': 'pair_scoring', 'pairs': pairs, 'pairs_per_second': pairs / elapsed}
+
+    def benchmark_suggestions(self, sample, engine, source, limit):
+        """Latency, throughput, peak memory and query counts of get_top_suggestions"""
+        profiles = UserProfile.objects.in_bulk(sample)
+        # A disabled pair-score cache measures the engine itself; overriding
+        # the LSH settings resets the index before and after the run
+        with override_settings(
+            MATCHING_ENGINE=engine,
+            PAIR_SCORE_CACHE_SIZE=0,
+            PAIR_SCORE_CACHE_ALIAS=None,
+            MATCHING_LSH_BANDS=getattr(settings, 'MATCHING_LSH_BANDS', 16),
+        ):
+            # Warm-up, so one-off setup (e.g. building the LSH index) is not timed
+            get_top_suggestions(profiles[sample[0]], limit=limit, source=source)
+
+            latencies, queries = [], []
+            started = time.perf_counter()
+            for profile_id in sample:
+                with CaptureQueriesContext(connection) as context:
+                    request_started = time.perf_counter()
+                    get_top_suggestions(profiles[profile_id], limit=limit, source=source)
+                    latencies.append(time.perf_counter() - request_started)
+                queries.append(len(context.captured_queries))
+            elapsed = time.perf_counter() - started
+
+            # tracemalloc slows allocation down, so memory is measured separately
+            tracemalloc.start()
+            for profile_id in sample[:5]:
+                get_top_suggestions(profiles[profile_id], limit=limit, source=source)
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        result = {
+            'benchmark': 'get_top_suggestions',
+            'engine': engine,
+            'candidates': source,
+            'latency_ms': {
+                'mean': statistics.mean(latencies) * 1000,
+                'p50': percentile(latencies, 0.50) * 1000,
+                'p90': percentile(latencies, 0.90) * 1000,
+                'p99': percentile(latencies, 0.99) * 1000,
+                'max': max(latencies) * 1000,
+            },
+            'requests_per_second': len(sample) / elapsed,
+            'peak_memory_bytes': peak_memory,
+            'queries': {'min': min(queries), 'max': max(queries), 'mean': statistics.mean(queries)},
+        }
+        self.stdout.write(
+            f'  {engine}/{source}: p50 {result["latency_ms"]["p50"]:.1f}ms, '
+            f'p99 {result["latency_ms"]["p99"]:.1f}ms, {result["requests_per_second"]:.1f} req/s, '
+            f'peak {peak_memory / 2**20:.1f} MiB, {result["queries"]["max"]} queries'
+        )
+        return result
@@ -0,0 +1,93 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import ListSerializer
+from rest_framework.test import APIRequestFactory
+
+from api.models import DEVELOPER_TYPES, TEAMMATE_PREFERENCES, UserProfile, Match, ChatMessage, Skill
+from api.query_plans import plan_queryset
+from api.serializers import ChatMessageSerializer, MatchSerializer, UserProfileListSerializer
+
+
+class Command(BaseCommand):
+    help = 'Per-row cost of DRF vs compiled list serializers on synthetic rows (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200, help='Rows per serializer')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed renderings per serializer')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic rows')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        # Everything written here is rolled back
+        with transaction.atomic():
+            self.create_rows(rows, random.Random(options['seed']))
+            context = {'request': APIRequestFactory().get('/api/v1/')}
+            for serializer_class, queryset in (
+                (UserProfileListSerializer, UserProfile.objects.all()),
+                (MatchSerializer, Match.objects.all()),
+                (ChatMessageSerializer, ChatMessage.objects.all()),
+            ):
+                instances = list(plan_queryset(queryset, serializer_class)[:rows])
+                drf = self.time_rendering(
+                    lambda: ListSerializer(instances, child=serializer_class(), context=context).data,
+                    options['repeat']
+                )
+                compiled = self.time_rendering(
+                    lambda: serializer_class(instances, many=True, context=context).data,
+                    options['repeat']
+                )
+                self.stdout.write(
+                    f'{serializer_class.__name__}: {drf / len(instances) * 1e6:.1f}us/row DRF, '
+                    f'{compiled / len(instances) * 1e6:.1f}us/row compiled ({drf / compiled:.1f}x)'
+                )
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('\n✓ Serializer benchmark complete'))
+
+    def time_rendering(self, render, repeat):
+        """Best time of `repeat` renderings to JSON, in seconds"""
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            JSONRenderer().render(render())
+            best = min(best, time.perf_counter() - started)
+        return best
+
+    def create_rows(self, count, rng):
+        """`count` profiles with skills, matches between them and a message per match"""
+        skills = Skill.objects.bulk_create([
+            Skill(name=f'Benchmark skill {i}', slug=f'benchmark-skill-{i}') for i in range(12)
+        ])
+        users = User.objects.bulk_create([
+            User(username=f'benchmark-{i}', first_name=f'Dev {i}', last_name='Benchmark', password='!')
+            for i in range(count + 1)
+        ])
+        UserProfile.objects.bulk_create([
+            UserProfile(
+                user=user,
+                bio='Synthetic profile',
+                developer_type=rng.choice(DEVELOPER_TYPES)[0],
+                teammate_preference=rng.choice(TEAMMATE_PREFERENCES)[0],
+                years_of_experience=rng.randint(0, 15),
+            )
+            for user in users
+        ])
+        profiles = list(UserProfile.objects.filter(user__in=users).order_by('pk'))
+        UserProfile.skills.through.objects.bulk_create([
+            UserProfile.skills.through(userprofile_id=profile.pk, skill_id=skill.pk)
+            for profile in profiles
+            for skill in rng.sample(skills, rng.randint(1, 5))
+        ])
+        Match.objects.bulk_create([
+            Match(user1=profiles[0], user2=profile, compatibility_score=rng.uniform(0, 100))
+            for profile in profiles[1:]
+        ])
+        ChatMessage.objects.bulk_create([
+            ChatMessage(match=match, sender_id=match.user2_id, message='Hello there')
+            for match in Match.objects.filter(user1=profiles[0])
+        ])
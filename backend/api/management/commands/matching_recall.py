@@ -0,0 +1,73 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.features import as_features
+from api.lsh_index import get_lsh_index
+from api.matching_algorithm import get_top_suggestions
+from api.models import UserProfile
+from api.skill_index import SkillIndex
+
+
+class Command(BaseCommand):
+    help = 'Measure recall of approximate (lsh) suggestion candidates against exact ranking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', type=int, default=100, help='Users to evaluate')
+        parser.add_argument('--limit', type=int, default=10, help='Suggestions per user (k in recall@k)')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for picking the sample')
+
+    def handle(self, *args, **options):
+        profile_ids = list(UserProfile.objects.values_list('id', flat=True))
+        if not profile_ids:
+            self.stdout.write(self.style.WARNING('No profiles found.'))
+            return
+        sample = random.Random(options['seed']).sample(profile_ids, min(options['sample'], len(profile_ids)))
+        limit = options['limit']
+
+        started = time.monotonic()
+        index = get_lsh_index()
+        self.stdout.write(
+            f'LSH index: {len(index)} profiles, {index.bands} bands x {index.rows} rows, '
+            f'built in {time.monotonic() - started:.2f}s'
+        )
+
+        found = expected = 0
+        lsh_candidates = index_candidates = 0
+        exact_time = lsh_time = 0.0
+        for profile in UserProfile.objects.filter(pk__in=sample):
+            features = as_features(profile)
+            lsh_candidates += len(index.candidates(features) - {profile.id})
+            index_candidates += SkillIndex().candidates(
+                features, UserProfile.objects.exclude(pk=profile.id)
+            ).count()
+
+            started = time.monotonic()
+            exact = get_top_suggestions(profile, limit=limit, source='all')
+            exact_time += time.monotonic() - started
+            started = time.monotonic()
+            approximate = get_top_suggestions(profile, limit=limit, source='lsh')
+            lsh_time += time.monotonic() - started
+
+            # Ties at the cut-off score are interchangeable, so compare scores
+            exact_scores = sorted(score for _, score in exact)
+            for score in sorted(score for _, score in approximate):
+                if score in exact_scores:
+                    exact_scores.remove(score)
+                    found += 1
+            expected += len(exact)
+
+        users = len(sample)
+        recall = found / expected if expected else 1.0
+        self.stdout.write(
+            f'Candidates per user: {lsh_candidates / users:.1f} lsh vs '
+            f'{index_candidates / users:.1f} index vs {len(profile_ids) - 1} all'
+        )
+        self.stdout.write(
+            f'Latency per user: {lsh_time / users * 1000:.1f}ms lsh vs '
+            f'{exact_time / users * 1000:.1f}ms exact '
+            f'(fallback pool {getattr(settings, "MATCHING_FALLBACK_POOL", 0)})'
+        )
+        self.stdout.write(self.style.SUCCESS(f'\n✓ recall@{limit} over {users} users: {recall:.3f}'))
@@ -0,0 +1,57 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.features import decode_mask, load_skill_masks, sync_skill_masks
+from api.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the skills_mask / looking_for_mask columns of every profile from the M2M tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Profiles read per round trip')
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Report profiles whose stored masks are out of date instead of writing'
+        )
+
+    def handle(self, *args, **options):
+        rows = UserProfile.objects.order_by('pk').values_list(
+            'pk', 'skills_mask', 'looking_for_mask'
+        ).iterator(chunk_size=options['chunk_size'])
+
+        checked = 0
+        stale = []
+        while True:
+            chunk = list(islice(rows, options['chunk_size']))
+            if not chunk:
+                break
+            checked += len(chunk)
+            profile_ids = [profile_id for profile_id, _, _ in chunk]
+            skills = load_skill_masks(UserProfile.skills.through, profile_ids)
+            looking_for = load_skill_masks(UserProfile.looking_for.through, profile_ids)
+            stale += [
+                profile_id
+                for profile_id, skills_mask, looking_for_mask in chunk
+                if decode_mask(skills_mask) != skills.get(profile_id, 0)
+                or decode_mask(looking_for_mask) != looking_for.get(profile_id, 0)
+            ]
+
+        if options['check']:
+            if stale:
+                self.stdout.write(self.style.WARNING(
+                    f'{len(stale)} of {checked} profiles have out of date skill masks: '
+                    f'{", ".join(map(str, stale[:20]))}{" ..." if len(stale) > 20 else ""}'
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'✓ All {checked} profiles have current skill masks'))
+            return
+
+        with transaction.atomic():
+            for start in range(0, len(stale), options['chunk_size']):
+                sync_skill_masks(stale[start:start + options['chunk_size']])
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Rebuilt skill masks of {len(stale)} profiles ({checked} checked)'
+        ))
@@ -0,0 +1,203 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.features import load_profile_features
+from api.lsh_index import LSHIndex
+from api.matching_numpy import ProfileArrays, rank_rows
+from api.models import UserProfile, Like, Match, MatchSuggestion, SuggestedProfile
+
+# Set in each worker process by _init_worker
+_worker_state = {}
+
+
+def _init_worker(arrays, excluded, columns, options, lsh=None):
+    _worker_state.update(arrays=arrays, excluded=excluded, columns=columns, options=options, lsh=lsh)
+
+
+def _lsh_candidates(rows, columns):
+    """Boolean matrix of the columns sharing an LSH bucket with each row"""
+    index, features, index_of = _worker_state['lsh']
+    candidates = np.zeros((len(rows), columns), dtype=bool)
+    for i, row in enumerate(rows):
+        candidates[i, [index_of[profile_id] for profile_id in index.candidates(features[row])]] = True
+    return candidates
+
+
+def _rank_block(start, stop):
+    """Rank suggestions for rows [start, stop) in a worker process"""
+    arrays = _worker_state['arrays']
+    rows = np.arange(start, stop)
+    allowed = np.repeat(_worker_state['columns'][None, :], len(rows), axis=0)
+    for i, row in enumerate(rows):
+        allowed[i, _worker_state['excluded'][row]] = False
+    candidates = _lsh_candidates(rows, allowed.shape[1]) if _worker_state['lsh'] else None
+    return start, rank_rows(arrays, rows, allowed=allowed, candidates=candidates, **_worker_state['options'])
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute every user\'s stored suggestions (MatchSuggestion) in one blocked pass, '
+        'drawing candidates from MATCHING_CANDIDATES like the live ranking'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--block-size', type=int, default=512,
+            help='Users scored per block; peak memory is about block-size x users x 8 bytes per matrix'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Worker processes scoring blocks in parallel (1 scores in this process)'
+        )
+        parser.add_argument(
+            '--limit', type=int, default=getattr(settings, 'SUGGESTION_CACHE_SIZE', 10),
+            help='Suggestions stored per user'
+        )
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Compare with the stored lists and report drift instead of writing'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        computed_at = timezone.now()
+
+        features = list(load_profile_features().values())
+        if not features:
+            self.stdout.write(self.style.WARNING('No profiles found.'))
+            return
+        arrays = ProfileArrays(features)
+        profile_ids = [f.id for f in features]
+        index_of = {profile_id: i for i, profile_id in enumerate(profile_ids)}
+
+        # Columns that may be suggested to anyone, and per-user exclusions
+        columns = np.ones(len(features), dtype=bool)
+        admin_ids = UserProfile.objects.filter(user__username='admin').values_list('id', flat=True)
+        columns[[index_of[profile_id] for profile_id in admin_ids]] = False
+        excluded = [[i] for i in range(len(features))]
+        for liker_id, liked_id in Like.objects.values_list('liker_id', 'liked_id'):
+            excluded[index_of[liker_id]].append(index_of[liked_id])
+        for user1_id, user2_id in Match.objects.values_list('user1_id', 'user2_id'):
+            excluded[index_of[user1_id]].append(index_of[user2_id])
+            excluded[index_of[user2_id]].append(index_of[user1_id])
+
+        source = getattr(settings, 'MATCHING_CANDIDATES', 'index')
+        rank_options = {
+            'limit': options['limit'],
+            'use_index': source == 'index',
+            'fallback_pool': getattr(settings, 'MATCHING_FALLBACK_POOL', 0),
+        }
+        lsh = None
+        if source == 'lsh':
+            # Same bands, rows and seed as get_lsh_index, so the buckets
+            # match the live ones, but hashed from this snapshot
+            index = LSHIndex(
+                bands=getattr(settings, 'MATCHING_LSH_BANDS', 16),
+                rows=getattr(settings, 'MATCHING_LSH_ROWS', 2),
+            )
+            index.update(features)
+            lsh = (index, features, index_of)
+        block_size = max(options['block_size'], 1)
+        blocks = [
+            (start, min(start + block_size, len(features)))
+            for start in range(0, len(features), block_size)
+        ]
+        self.stdout.write(
+            f'Ranking {len(features)} users in {len(blocks)} blocks '
+            f'with {options["workers"]} worker(s)...'
+        )
+
+        self.drift = self.missing = 0
+        done = 0
+        for start, ranked in self.rank_blocks(
+            blocks, options['workers'], arrays, excluded, columns, rank_options, lsh
+        ):
+            suggestions = {
+                profile_ids[start + i]: [(profile_ids[column], score) for column, score in row]
+                for i, row in enumerate(ranked)
+            }
+            if options['check']:
+                self.check_block(suggestions)
+            else:
+                self.write_block(suggestions, computed_at)
+
+            done += len(ranked)
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'  {done}/{len(features)} users ({done / elapsed:.0f} users/s)')
+
+        elapsed = time.monotonic() - started
+        if options['check']:
+            style = self.style.SUCCESS if not (self.drift or self.missing) else self.style.WARNING
+            self.stdout.write(style(
+                f'\n✓ Checked {len(features)} users in {elapsed:.1f}s: '
+                f'{self.drift} stored lists differ, {self.missing} missing'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'\n✓ Rebuilt suggestions for {len(features)} users in {elapsed:.1f}s'
+            ))
+
+    def rank_blocks(self, blocks, workers, arrays, excluded, columns, rank_options, lsh=None):
+        """Yield (start, ranked rows) per block, in parallel when workers > 1"""
+        initargs = (arrays, excluded, columns, rank_options, lsh)
+        if workers <= 1 or len(blocks) == 1:
+            _init_worker(*initargs)
+            for start, stop in blocks:
+                yield _rank_block(start, stop)
+            return
+
+        # fork keeps the already configured Django process; workers only use NumPy
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_init_worker,
+            initargs=initargs,
+        ) as executor:
+            yield from executor.map(_rank_block, *zip(*blocks))
+
+    def write_block(self, suggestions, computed_at):
+        with transaction.atomic():
+            user_ids = list(suggestions)
+            MatchSuggestion.objects.bulk_create(
+                [MatchSuggestion(user_id=user_id) for user_id in user_ids],
+                ignore_conflicts=True
+            )
+            suggestion_ids = dict(
+                MatchSuggestion.objects.filter(user_id__in=user_ids).values_list('user_id', 'id')
+            )
+            SuggestedProfile.objects.filter(suggestion_id__in=suggestion_ids.values()).delete()
+            SuggestedProfile.objects.bulk_create([
+                SuggestedProfile(
+                    suggestion_id=suggestion_ids[user_id],
+                    profile_id=profile_id,
+                    compatibility_score=score,
+                    rank=rank
+                )
+                for user_id, ranked in suggestions.items()
+                for rank, (profile_id, score) in enumerate(ranked)
+            ], batch_size=5000)
+            MatchSuggestion.objects.filter(user_id__in=user_ids).update(last_updated=computed_at)
+
+    def check_block(self, suggestions):
+        stored = {}
+        for user_id, score in SuggestedProfile.objects.filter(
+            suggestion__user_id__in=list(suggestions)
+        ).order_by('rank').values_list('suggestion__user_id', 'compatibility_score'):
+            stored.setdefault(user_id, []).append(score)
+        present = set(
+            MatchSuggestion.objects.filter(user_id__in=list(suggestions)).values_list('user_id', flat=True)
+        )
+
+        for user_id, ranked in suggestions.items():
+            if user_id not in present:
+                self.missing += 1
+            elif stored.get(user_id, []) != [score for _, score in ranked]:
+                self.drift += 1
@@ -3,7 +3,24 @@ Matching algorithm for finding compatible teammate pairs.
 Uses skill overlap and preferences to calculate compatibility scores.
 """
 
-from .models import UserProfile, Match
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+
+from .features import as_features, iter_feature_chunks, load_profile_features
+from .models import UserProfile, Like, Match
+from .score_cache import cached_compatibility_score, get_pair_score_cache
+from .scoring_tables import EXPERIENCE_CAP, tables
+from .skill_index import SkillIndex
+
+# Scoring engines selectable through settings.MATCHING_ENGINE
+MATCHING_ENGINES = ('python', 'numpy', 'sql')
+
+# Candidate generation strategies selectable through settings.MATCHING_CANDIDATES
+CANDIDATE_SOURCES = ('index', 'lsh', 'all')
 
 
 def calculate_compatibility_score(user1, user2):
@@ -17,8 +34,16 @@ def calculate_compatibility_score(user1, user2):
     - Availability matching
     - Experience level proximity
     
+    Args:
+        user1, user2: UserProfile or ProfileFeatures instances. Pass
+            ProfileFeatures (see features.load_profile_features) when scoring
+            many pairs, so no queries are made per pair.
+    
     Returns: float between 0 and 100
     """
+    user1 = as_features(user1)
+    user2 = as_features(user2)
+    
     score = 0
     weights = {
         'skill_overlap': 0.25,
@@ -28,16 +53,10 @@ def calculate_compatibility_score(user1, user2):
         'experience': 0.10
     }
     
-    # Get skills as sets (using Skill objects)
-    user1_skills = set(user1.skills.all())
-    user2_skills = set(user2.skills.all())
-    user1_looking = set(user1.looking_for.all())
-    user2_looking = set(user2.looking_for.all())
-    
     # 1. Skill Overlap - how many skills they have in common
-    if user1_skills and user2_skills:
-        overlap = len(user1_skills.intersection(user2_skills))
-        max_skills = max(len(user1_skills), len(user2_skills))
+    if user1.skills and user2.skills:
+        overlap = (user1.skills & user2.skills).bit_count()
+        max_skills = max(user1.skill_count, user2.skill_count)
         skill_overlap_score = (overlap / max_skills) * 100
         score += skill_overlap_score * weights['skill_overlap']
     
@@ -45,132 +64,312 @@ def calculate_compatibility_score(user1, user2):
     complementary_score = 0
     
     # User1 has skills that User2 is looking for
-    user2_gets = len(user1_skills.intersection(user2_looking))
-    if user2_looking:
-        complementary_score += (user2_gets / len(user2_looking)) * 50
+    user2_gets = (user1.skills & user2.looking_for).bit_count()
+    if user2.looking_for:
+        complementary_score += (user2_gets / user2.looking_count) * 50
     
     # User2 has skills that User1 is looking for
-    user1_gets = len(user2_skills.intersection(user1_looking))
-    if user1_looking:
-        complementary_score += (user1_gets / len(user1_looking)) * 50
+    user1_gets = (user2.skills & user1.looking_for).bit_count()
+    if user1.looking_for:
+        complementary_score += (user1_gets / user1.looking_count) * 50
     
     score += complementary_score * weights['complementary_skills']
     
     # 3. Developer Type Compatibility
-    type_compatibility_score = 0
-    
-    # Check if user2's type matches user1's preference
-    if user1.teammate_preference == 'any' or user1.teammate_preference == user2.developer_type:
-        type_compatibility_score += 50
-    
-    # Check if user1's type matches user2's preference
-    if user2.teammate_preference == 'any' or user2.teammate_preference == user1.developer_type:
-        type_compatibility_score += 50
-    
+    # Whether each one's type matches the other's preference (see scoring_tables)
+    type_compatibility_score = (
+        tables.preference_list[user1.teammate_preference][user2.developer_type]
+        + tables.preference_list[user2.teammate_preference][user1.developer_type]
+    )
     score += type_compatibility_score * weights['type_compatibility']
     
     # 4. Availability Matching
-    availability_score = 0
-    if user1.availability == user2.availability or \
-       user1.availability == 'flexible' or user2.availability == 'flexible':
-        availability_score = 100
-    else:
-        # Partial match
-        availability_score = 50
-    
+    availability_score = tables.availability_list[user1.availability][user2.availability]
     score += availability_score * weights['availability']
     
     # 5. Experience Level Proximity
     experience_diff = abs(user1.years_of_experience - user2.years_of_experience)
-    # More compatible if experience levels are closer (within 3 years)
-    if experience_diff <= 3:
-        experience_score = 100
-    elif experience_diff <= 7:
-        experience_score = 75
-    else:
-        experience_score = 50
-    
+    experience_score = tables.experience_list[min(experience_diff, EXPERIENCE_CAP)]
     score += experience_score * weights['experience']
     
     return min(score, 100)  # Cap at 100
 
 
-def get_top_suggestions(user_profile, limit=10):
+def get_top_suggestions(user_profile, limit=10, source=None):
     """
     Get top N suggestions for a user based on compatibility.
     
+    Candidates come from settings.MATCHING_CANDIDATES:
+    - 'index': only profiles sharing or complementing a skill (see SkillIndex).
+      If that yields fewer than `limit` suggestions, up to
+      settings.MATCHING_FALLBACK_POOL of the most recent other profiles are
+      scored as well.
+    - 'lsh': only profiles sharing a MinHash bucket (see LSHIndex), an
+      approximate subset of the 'index' candidates, with the same fallback.
+    - 'all': every other profile.
+    
     Args:
         user_profile: UserProfile instance
         limit: Number of suggestions to return (default 10)
+        source: Candidate source overriding settings.MATCHING_CANDIDATES
     
     Returns:
         List of (UserProfile, compatibility_score) tuples
     """
-    # Get all other users except the current user
-    all_users = UserProfile.objects.exclude(id=user_profile.id).exclude(
-        user__username='admin'  # Exclude admin if exists
+    ranked = rank_suggestions(user_profile, limit, source)
+    
+    # Only the winners are loaded as model instances
+    profiles = UserProfile.objects.in_bulk([profile_id for profile_id, _ in ranked])
+    return [
+        (profiles[profile_id], score)
+        for profile_id, score in ranked
+        if profile_id in profiles
+    ]
+
+
+def rank_suggestions(user_profile, limit=10, source=None):
+    """
+    Rank suggestions like get_top_suggestions without loading the profiles.
+    
+    Returns:
+        List of (profile_id, compatibility_score) tuples, best first
+    """
+    engine = getattr(settings, 'MATCHING_ENGINE', 'python')
+    if engine not in MATCHING_ENGINES:
+        raise ValueError(f"Unknown MATCHING_ENGINE {engine!r}, expected one of {MATCHING_ENGINES}")
+    if source is None:
+        source = getattr(settings, 'MATCHING_CANDIDATES', 'index')
+    if source not in CANDIDATE_SOURCES:
+        raise ValueError(f"Unknown MATCHING_CANDIDATES {source!r}, expected one of {CANDIDATE_SOURCES}")
+    
+    if engine == 'numpy':
+        from .matching_numpy import rank_candidates_numpy as rank_candidates
+    elif engine == 'sql' and connection.vendor == 'postgresql':
+        from .matching_sql import rank_candidates_sql as rank_candidates
+    else:
+        # The SQL engine targets PostgreSQL; other databases score in Python
+        rank_candidates = rank_candidates_python
+    chunk_size = getattr(settings, 'MATCHING_CHUNK_SIZE', 2000)
+    
+    # Get all other users except the current user, and those already
+    # matched with or liked by them
+    all_users = exclude_seen_profiles(
+        UserProfile.objects.exclude(id=user_profile.id).exclude(
+            user__username='admin'  # Exclude admin if exists
+        ),
+        user_profile.id
     )
+    user_features = as_features(user_profile)
     
-    # Calculate scores for each user
-    suggestions = []
-    for other_user in all_users:
-        # Skip if already matched
-        if Match.objects.filter(
-            user1__in=[user_profile, other_user],
-            user2__in=[user_profile, other_user]
-        ).exists():
-            continue
+    fallback_pool = getattr(settings, 'MATCHING_FALLBACK_POOL', 0)
+    if source == 'all':
+        ranked = rank_candidates(user_features, all_users, limit, chunk_size)
+    elif source == 'lsh':
+        from .lsh_index import get_lsh_index
+        candidate_ids = get_lsh_index().candidates(user_features)
+        ranked = rank_id_batches(rank_candidates, user_features, all_users, sorted(candidate_ids), limit, chunk_size)
+        
+        if len(ranked) < limit and fallback_pool:
+            # Read ids in the queryset's order, skipping the candidates, rather
+            # than sending the candidate set back in an exclude()
+            fallback_ids = list(islice(
+                (
+                    profile_id
+                    for profile_id in all_users.values_list('pk', flat=True).iterator(chunk_size=chunk_size)
+                    if profile_id not in candidate_ids
+                ),
+                fallback_pool
+            ))
+            ranked += rank_id_batches(rank_candidates, user_features, all_users, fallback_ids, limit, chunk_size)
+            ranked.sort(key=lambda x: x[1], reverse=True)
+            ranked = ranked[:limit]
+    else:
+        candidate_filter = SkillIndex().candidate_filter(user_features)
+        ranked = rank_candidates(user_features, all_users.filter(candidate_filter), limit, chunk_size)
         
-        score = calculate_compatibility_score(user_profile, other_user)
-        if score > 0:  # Only include if there's some compatibility
-            suggestions.append((other_user, score))
+        if len(ranked) < limit and fallback_pool:
+            fallback = all_users.exclude(candidate_filter)[:fallback_pool]
+            ranked += rank_candidates(user_features, fallback, limit, chunk_size)
+            ranked.sort(key=lambda x: x[1], reverse=True)
+            ranked = ranked[:limit]
+    
+    return ranked
+
+
+def rank_id_batches(rank_candidates, user_features, candidates, profile_ids, limit, chunk_size=2000):
+    """
+    Rank the profiles of `candidates` with the given ids, `chunk_size` ids at
+    a time, so no statement carries more than `chunk_size` id parameters.
+    
+    Returns:
+        List of (profile_id, compatibility_score) tuples, best first
+    """
+    ranked = []
+    for start in range(0, len(profile_ids), chunk_size):
+        batch = candidates.filter(pk__in=profile_ids[start:start + chunk_size])
+        ranked += rank_candidates(user_features, batch, limit, chunk_size)
+    # Stable, so ties keep the order they were ranked in
+    ranked.sort(key=lambda x: x[1], reverse=True)
+    return ranked[:limit]
+
+
+def exclude_seen_profiles(queryset, profile_id):
+    """
+    Exclude profiles already matched with, or liked by, the given profile.
+    
+    Applied as anti-join subqueries, so the exclusion costs no extra round
+    trips however many matches and likes the profile has.
+    
+    Args:
+        queryset: UserProfile queryset
+        profile_id: id of the profile the suggestions are for
     
-    # Sort by score descending and return top N
-    suggestions.sort(key=lambda x: x[1], reverse=True)
-    return suggestions[:limit]
+    Returns:
+        Filtered UserProfile queryset
+    """
+    return queryset.exclude(
+        pk__in=Match.objects.filter(user1_id=profile_id).values('user2_id')
+    ).exclude(
+        pk__in=Match.objects.filter(user2_id=profile_id).values('user1_id')
+    ).exclude(
+        pk__in=Like.objects.filter(liker_id=profile_id).values('liked_id')
+    )
 
 
-def find_or_create_match(user1, user2):
+class TopK:
+    """
+    Bounded min-heap keeping the `k` best scored items of a stream.
+    
+    Ties are broken by stream position (earlier wins), which is the same
+    order a stable sort of the whole stream would produce.
     """
-    Check if a mutual like exists and create a Match if so.
+    
+    def __init__(self, k):
+        self.k = k
+        self.heap = []
+    
+    def __len__(self):
+        return len(self.heap)
+    
+    def push(self, score, position, item):
+        # The heap root is the worst entry: lowest score, then latest position
+        entry = (score, -position, item)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        elif self.heap and entry[:2] > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, entry)
+    
+    def results(self):
+        """List of (item, score), best first"""
+        ranked = sorted(self.heap, key=lambda entry: (-entry[0], -entry[1]))
+        return [(item, score) for score, _, item in ranked]
+
+
+def rank_candidates_python(user_features, candidates, limit, chunk_size=2000):
+    """
+    Pure Python engine: score each candidate with calculate_compatibility_score.
+    
+    Candidates are streamed as feature snapshots and only the best `limit`
+    are kept, so memory is O(limit + chunk_size). Scores go through the
+    pair-score cache.
     
     Args:
-        user1: UserProfile instance
-        user2: UserProfile instance
+        user_features: ProfileFeatures of the user
+        candidates: UserProfile queryset of possible suggestions, already
+            excluding matched and liked profiles
+        limit: Number of suggestions to return
+        chunk_size: Number of candidates read per round trip
     
     Returns:
-        (Match instance or None, is_new_match: bool)
+        List of (profile_id, compatibility_score) tuples, best first
     """
-    from .models import Like
+    pair_scores = get_pair_score_cache()
+    top = TopK(limit)
+    position = 0
+    for chunk in iter_feature_chunks(candidates, chunk_size):
+        scores = pair_scores.score_many(user_features, chunk, calculate_compatibility_score)
+        for features, score in zip(chunk, scores):
+            if score > 0:  # Only include if there's some compatibility
+                top.push(score, position, features.id)
+            position += 1
+    return top.results()
+
+
+def batch_compatibility_scores(user_profile, profile_ids):
+    """
+    Compatibility of a user with each of the given profiles.
     
-    # Check if both users like each other
-    like_1_to_2 = Like.objects.filter(liker=user1, liked=user2).exists()
-    like_2_to_1 = Like.objects.filter(liker=user2, liked=user1).exists()
+    All snapshots are loaded in one feature-loading pass (one query)
+    and scored through the pair-score cache.
     
-    if not (like_1_to_2 and like_2_to_1):
-        return None, False
+    Args:
+        user_profile: UserProfile instance
+        profile_ids: Iterable of UserProfile ids
     
-    # Check if match already exists
-    match = Match.objects.filter(
-        user1__in=[user1, user2],
-        user2__in=[user1, user2]
-    ).first()
+    Returns:
+        Dict of profile id -> compatibility_score, for the ids that exist;
+        like rank_suggestions, the user and the admin profile are left out
+    """
+    profile_ids = set(profile_ids) - {user_profile.id}
+    features = load_profile_features(UserProfile.objects.filter(
+        Q(pk=user_profile.id)
+        | (Q(pk__in=profile_ids) & ~Q(user__username='admin'))  # Exclude admin if exists
+    ))
+    user_features = features.get(user_profile.id) or as_features(user_profile)
+    others = [features[profile_id] for profile_id in profile_ids if profile_id in features]
+    scores = get_pair_score_cache().score_many(user_features, others, calculate_compatibility_score)
+    return {other.id: score for other, score in zip(others, scores)}
+
+
+def like_profile(liker, liked):
+    """
+    Record a like and create the Match if it makes the like mutual.
     
-    if match:
-        return match, False
+    Everything runs in one transaction with a fixed number of statements.
+    Duplicate likes and matches are rejected by the unique_together
+    constraints instead of being looked up first. The pair's profile rows
+    are locked before checking for the reverse like. When two users like
+    each other at the same moment, the second transaction therefore sees
+    the first one's like, and exactly one Match is created.
     
-    # Create new match
-    # Ensure consistent ordering (lower id first)
-    if user1.id < user2.id:
-        match_user1, match_user2 = user1, user2
-    else:
-        match_user1, match_user2 = user2, user1
+    Args:
+        liker: UserProfile giving the like
+        liked: UserProfile receiving it
     
-    score = calculate_compatibility_score(match_user1, match_user2)
-    match = Match.objects.create(
-        user1=match_user1,
-        user2=match_user2,
-        compatibility_score=score
-    )
+    Returns:
+        (like_created: bool, Match instance or None, is_new_match: bool)
+    """
+    # Matches are stored with the lower id first
+    user1, user2 = sorted((liker, liked), key=lambda profile: profile.id)
     
-    return match, True
+    with transaction.atomic():
+        like_created = _insert_unless_duplicate(Like(liker=liker, liked=liked))
+        
+        # NO KEY UPDATE does not conflict with the key-share locks the like
+        # inserts take on these rows, but does serialize likes in this pair
+        list(
+            UserProfile.objects.select_for_update(no_key=True)
+            .filter(pk__in=[user1.id, user2.id]).order_by('pk').values_list('pk', flat=True)
+        )
+        if not Like.objects.filter(liker=liked, liked=liker).exists():
+            return like_created, None, False
+        
+        match = Match(
+            user1=user1,
+            user2=user2,
+            compatibility_score=cached_compatibility_score(user1, user2)
+        )
+        if _insert_unless_duplicate(match):
+            return like_created, match, True
+        existing = Match.objects.select_related('user1__user', 'user2__user').between(user1, user2).get()
+        return like_created, existing, False
+
+
+def _insert_unless_duplicate(instance):
+    """Insert a new row, returning False if a unique constraint rejects it"""
+    try:
+        with transaction.atomic():
+            instance.save(force_insert=True)
+    except IntegrityError:
+        return False
+    return True
@@ -0,0 +1,212 @@
+"""
+Vectorized NumPy scoring engine for the matching algorithm.
+
+Encodes profiles as arrays (skill / looking-for bit matrices, categorical
+codes and an experience vector) so one user can be scored against every
+candidate in a few array operations. Scores and ordering are identical to
+calculate_compatibility_score / the Python engine in get_top_suggestions.
+"""
+
+import numpy as np
+
+from .features import iter_feature_chunks
+from .matching_algorithm import TopK
+from .scoring_tables import EXPERIENCE_CAP, tables
+
+
+def mask_matrix(masks):
+    """Unpack integer bitmasks into a (len(masks), max_bit + 1) 0/1 matrix"""
+    width = max((mask.bit_length() for mask in masks), default=0)
+    nbytes = (width + 7) // 8 or 1
+    buffer = np.frombuffer(
+        b''.join(mask.to_bytes(nbytes, 'little') for mask in masks), dtype=np.uint8
+    ).reshape(len(masks), nbytes)
+    return np.unpackbits(buffer, axis=1, bitorder='little')
+
+
+class ProfileArrays:
+    """
+    Column-oriented encoding of a list of ProfileFeatures.
+
+    Row i of every array describes features[i]. Skill columns are only the
+    skill ids used by at least one of the encoded profiles.
+    """
+
+    def __init__(self, features):
+        self.features = list(features)
+
+        skills = mask_matrix([f.skills for f in self.features])
+        looking_for = mask_matrix([f.looking_for for f in self.features])
+        width = max(skills.shape[1], looking_for.shape[1])
+        skills = np.pad(skills, ((0, 0), (0, width - skills.shape[1])))
+        looking_for = np.pad(looking_for, ((0, 0), (0, width - looking_for.shape[1])))
+        used = (skills | looking_for).any(axis=0)
+        self.skills = skills[:, used].astype(np.float64)
+        self.looking_for = looking_for[:, used].astype(np.float64)
+
+        self.skill_count = np.array([f.skill_count for f in self.features], dtype=np.float64)
+        self.looking_count = np.array([f.looking_count for f in self.features], dtype=np.float64)
+        self.developer_type = np.array([f.developer_type for f in self.features], dtype=np.int64)
+        self.preference = np.array([f.teammate_preference for f in self.features], dtype=np.int64)
+        self.availability = np.array([f.availability for f in self.features], dtype=np.int64)
+        self.experience = np.array([f.years_of_experience for f in self.features], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.features)
+
+
+def compatibility_matrix(arrays, rows, cols=None):
+    """
+    Score every profile in `rows` against every profile in `cols`.
+
+    Args:
+        arrays: ProfileArrays instance
+        rows: index array (or slice) of scoring profiles
+        cols: index array (or slice) of candidate profiles, all rows if None
+
+    Returns:
+        float64 array of shape (len(rows), len(cols)) holding the same values
+        calculate_compatibility_score returns for each pair
+    """
+    if cols is None:
+        cols = slice(None)
+
+    a_skills, b_skills = arrays.skills[rows], arrays.skills[cols]
+    a_looking, b_looking = arrays.looking_for[rows], arrays.looking_for[cols]
+    a_skill_count = arrays.skill_count[rows][:, None]
+    b_skill_count = arrays.skill_count[cols][None, :]
+    a_looking_count = arrays.looking_count[rows][:, None]
+    b_looking_count = arrays.looking_count[cols][None, :]
+
+    # 1. Skill Overlap
+    overlap = a_skills @ b_skills.T
+    max_skills = np.maximum(a_skill_count, b_skill_count)
+    has_skills = (a_skill_count > 0) & (b_skill_count > 0)
+    skill_overlap_score = np.divide(
+        overlap, max_skills, out=np.zeros_like(overlap), where=has_skills
+    ) * 100
+    score = np.where(has_skills, skill_overlap_score * 0.25, 0.0)
+
+    # 2. Complementary Skills
+    user2_gets = a_skills @ b_looking.T
+    user2_part = np.divide(
+        user2_gets, b_looking_count, out=np.zeros_like(user2_gets),
+        where=b_looking_count > 0
+    ) * 50
+    user1_gets = a_looking @ b_skills.T
+    user1_part = np.divide(
+        user1_gets, a_looking_count, out=np.zeros_like(user1_gets),
+        where=a_looking_count > 0
+    ) * 50
+    score = score + (user2_part + user1_part) * 0.35
+
+    # 3. Developer Type Compatibility
+    a_pref = arrays.preference[rows][:, None]
+    b_pref = arrays.preference[cols][None, :]
+    a_type = arrays.developer_type[rows][:, None]
+    b_type = arrays.developer_type[cols][None, :]
+    type_compatibility_score = tables.preference[a_pref, b_type] + tables.preference[b_pref, a_type]
+    score = score + type_compatibility_score * 0.15
+
+    # 4. Availability Matching
+    a_avail = arrays.availability[rows][:, None]
+    b_avail = arrays.availability[cols][None, :]
+    score = score + tables.availability[a_avail, b_avail] * 0.15
+
+    # 5. Experience Level Proximity
+    experience_diff = np.abs(
+        arrays.experience[rows][:, None] - arrays.experience[cols][None, :]
+    )
+    score = score + tables.experience[np.minimum(experience_diff, EXPERIENCE_CAP)] * 0.10
+
+    return np.minimum(score, 100)
+
+
+def rank_candidates_numpy(user_features, candidates, limit, chunk_size=2000):
+    """
+    NumPy engine: score candidates a chunk at a time with compatibility_matrix.
+
+    Args:
+        user_features: ProfileFeatures of the user
+        candidates: UserProfile queryset of possible suggestions, already
+            excluding matched and liked profiles
+        limit: Number of suggestions to return
+        chunk_size: Number of candidates scored per array pass
+
+    Returns:
+        List of (profile_id, compatibility_score) tuples, best first
+    """
+    top = TopK(limit)
+    position = 0
+    for chunk in iter_feature_chunks(candidates, chunk_size):
+        arrays = ProfileArrays([user_features] + chunk)
+        scores = compatibility_matrix(arrays, [0], slice(1, None))[0]
+
+        # Stable sort keeps queryset order between equal scores, like list.sort()
+        for i in np.argsort(-scores, kind='stable')[:limit]:
+            if scores[i] > 0:
+                top.push(float(scores[i]), position + i, chunk[i].id)
+        position += len(chunk)
+    return top.results()
+
+
+def candidate_matrix(arrays, rows, cols=None):
+    """
+    Boolean matrix of the pairs SkillIndex.candidate_filter would return:
+    the column profile shares a skill with the row profile, has a skill it
+    is looking for, or is looking for one of its skills.
+    """
+    if cols is None:
+        cols = slice(None)
+    a_skills, b_skills = arrays.skills[rows], arrays.skills[cols]
+    a_looking, b_looking = arrays.looking_for[rows], arrays.looking_for[cols]
+    return ((a_skills + a_looking) @ b_skills.T + a_skills @ b_looking.T) > 0
+
+
+def _top_columns(scores, mask, limit):
+    """Indices of the `limit` best scores where mask is set, ties by column order"""
+    columns = np.flatnonzero(mask)
+    return columns[np.argsort(-scores[columns], kind='stable')][:limit]
+
+
+def rank_rows(arrays, rows, limit, allowed, use_index=False, fallback_pool=0, candidates=None):
+    """
+    Top `limit` suggestions for a block of rows against every column.
+
+    Replicates get_top_suggestions for each row profile: columns are
+    candidates in queryset order, `allowed` removes the user, admins and
+    already matched or liked profiles, and with `use_index` (or given
+    `candidates`) only those candidates are ranked, topped up from the first
+    `fallback_pool` other allowed columns when too few score.
+
+    Args:
+        arrays: ProfileArrays of every profile
+        rows: index array of the profiles to rank suggestions for
+        limit: Number of suggestions per row
+        allowed: Boolean matrix (len(rows), len(arrays)) of allowed pairs
+        use_index: Restrict candidates like MATCHING_CANDIDATES='index'
+        fallback_pool: Like MATCHING_FALLBACK_POOL
+        candidates: Boolean matrix shaped like `allowed` restricting the
+            candidates instead of the skill index, e.g. LSH buckets
+
+    Returns:
+        List (one per row) of lists of (column_index, compatibility_score)
+    """
+    scores = compatibility_matrix(arrays, rows)
+    restricted = use_index or candidates is not None
+    if candidates is None and use_index:
+        candidates = candidate_matrix(arrays, rows)
+    candidates = allowed & candidates if restricted else allowed
+    positive = scores > 0
+
+    ranked = []
+    for i in range(len(rows)):
+        top = _top_columns(scores[i], candidates[i] & positive[i], limit)
+        if restricted and len(top) < limit and fallback_pool:
+            pool = np.flatnonzero(allowed[i] & ~candidates[i])[:fallback_pool]
+            pool = pool[positive[i, pool]]
+            fallback = pool[np.argsort(-scores[i, pool], kind='stable')][:limit]
+            top = np.concatenate([top, fallback])
+            top = top[np.argsort(-scores[i, top], kind='stable')][:limit]
+        ranked.append([(int(column), float(scores[i, column])) for column in top])
+    return ranked
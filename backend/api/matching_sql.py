@@ -0,0 +1,166 @@
+"""
+SQL engine for the matching algorithm.
+
+Scores every candidate in a single annotated query and lets the database do
+the ranking (ORDER BY score DESC LIMIT k), so only the winners' ids and scores
+cross the wire. The user's side of calculate_compatibility_score is known up
+front: skill counts of candidates come from correlated subqueries on the M2M
+through tables, and the categorical parts become CASE expressions generated
+from scoring_tables. Terms are combined in the same order and in double
+precision, so scores are identical to the Python engine.
+
+Meant for PostgreSQL; on other databases rank_suggestions uses the Python
+engine instead.
+"""
+
+from django.db.models import Case, Count, F, FloatField, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Abs, Cast, Coalesce, Greatest, Least
+from django.db.models.lookups import GreaterThan, LessThanOrEqual
+
+from .features import mask_skill_ids
+from .models import UserProfile
+from .scoring_tables import (
+    AVAILABILITY_CODES, EXPERIENCE_CAP, TYPE_CODES, availability_score, preference_score, tables
+)
+
+
+def _float(value):
+    # Plain literals would be numeric on PostgreSQL, which rounds differently
+    return Cast(Value(value), FloatField())
+
+
+def _skill_count(through, skill_ids=None):
+    """Rows of the candidate in a through table, optionally only those for `skill_ids`"""
+    rows = through.objects.filter(userprofile_id=OuterRef('pk'))
+    if skill_ids is not None:
+        rows = rows.filter(skill_id__in=skill_ids)
+    count = rows.order_by().values('userprofile_id').annotate(count=Count('*')).values('count')
+    return Coalesce(Subquery(count, output_field=IntegerField()), 0)
+
+
+def _ratio(numerator, denominator, scale):
+    return Cast(numerator, FloatField()) / Cast(denominator, FloatField()) * _float(scale)
+
+
+def _code_value(codes, code):
+    return next(value for value, value_code in codes.items() if value_code == code)
+
+
+def _table_case(field, codes, score, default):
+    """CASE mapping each value of `field` to its table score, one branch per distinct score"""
+    values_by_score = {}
+    for value, code in codes.items():
+        values_by_score.setdefault(score(code), []).append(value)
+    return Case(
+        *[When(**{f'{field}__in': values}, then=Value(points)) for points, values in values_by_score.items()],
+        default=Value(default),
+        output_field=IntegerField(),
+    )
+
+
+def _experience_case(years_of_experience):
+    """CASE bucketing the experience difference the way tables.experience_list does"""
+    experience_diff = Abs(F('years_of_experience') - years_of_experience)
+    branches = [
+        When(LessThanOrEqual(experience_diff, diff), then=Value(tables.experience_list[diff]))
+        for diff in range(EXPERIENCE_CAP)
+        if tables.experience_list[diff] != tables.experience_list[diff + 1]
+    ]
+    return Case(*branches, default=Value(tables.experience_list[EXPERIENCE_CAP]), output_field=IntegerField())
+
+
+def compatibility_score_expression(user_features):
+    """
+    Expression equal to calculate_compatibility_score(user, candidate) for
+    every UserProfile row it annotates.
+
+    Args:
+        user_features: ProfileFeatures of the user
+
+    Returns:
+        FloatField expression
+    """
+    skills_table = UserProfile.skills.through
+    looking_for_table = UserProfile.looking_for.through
+    user = user_features
+
+    # 1. Skill Overlap
+    skill_count = _skill_count(skills_table)
+    if user.skills:
+        overlap = _skill_count(skills_table, mask_skill_ids(user.skills))
+        score = Case(
+            When(
+                GreaterThan(skill_count, 0),
+                then=_ratio(overlap, Greatest(skill_count, user.skill_count), 100) * _float(0.25),
+            ),
+            default=_float(0),
+            output_field=FloatField(),
+        )
+    else:
+        score = _float(0)
+
+    # 2. Complementary Skills
+    looking_count = _skill_count(looking_for_table)
+    candidate_gets = _skill_count(looking_for_table, mask_skill_ids(user.skills))
+    complementary_score = Case(
+        When(GreaterThan(looking_count, 0), then=_ratio(candidate_gets, looking_count, 50)),
+        default=_float(0),
+        output_field=FloatField(),
+    )
+    if user.looking_for:
+        user_gets = _skill_count(skills_table, mask_skill_ids(user.looking_for))
+        complementary_score = complementary_score + _ratio(user_gets, user.looking_count, 50)
+    score = score + complementary_score * _float(0.35)
+
+    # 3. Developer Type Compatibility
+    # Values missing from the tables score like any value the user's differs from
+    type_compatibility_score = _table_case(
+        'developer_type', TYPE_CODES,
+        lambda code: tables.preference_list[user.teammate_preference][code],
+        preference_score(_code_value(TYPE_CODES, user.teammate_preference), None),
+    ) + _table_case(
+        'teammate_preference', TYPE_CODES,
+        lambda code: tables.preference_list[code][user.developer_type],
+        0,
+    )
+    score = score + type_compatibility_score * _float(0.15)
+
+    # 4. Availability Matching
+    availability = _table_case(
+        'availability', AVAILABILITY_CODES,
+        lambda code: tables.availability_list[user.availability][code],
+        availability_score(_code_value(AVAILABILITY_CODES, user.availability), None),
+    )
+    score = score + availability * _float(0.15)
+
+    # 5. Experience Level Proximity
+    score = score + _experience_case(user.years_of_experience) * _float(0.10)
+
+    return Least(score, _float(100))
+
+
+def rank_candidates_sql(user_features, candidates, limit, chunk_size=2000):
+    """
+    SQL engine: score, filter and rank the candidates in one query.
+
+    Args:
+        user_features: ProfileFeatures of the user
+        candidates: UserProfile queryset of possible suggestions, already
+            excluding matched and liked profiles
+        limit: Number of suggestions to return
+        chunk_size: Unused; accepted for parity with the other engines
+
+    Returns:
+        List of (profile_id, compatibility_score) tuples, best first
+    """
+    # Ties keep candidate order, as in the other engines
+    ordering = candidates.query.order_by or UserProfile._meta.ordering
+    if candidates.query.is_sliced:
+        # A sliced queryset cannot be reordered; rank it as a subquery
+        candidates = UserProfile.objects.filter(pk__in=candidates.values('pk'))
+    ranked = candidates.annotate(
+        compatibility_score=compatibility_score_expression(user_features)
+    ).filter(
+        compatibility_score__gt=0
+    ).order_by('-compatibility_score', *ordering).values_list('pk', 'compatibility_score')
+    return list(ranked[:limit])
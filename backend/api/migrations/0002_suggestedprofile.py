@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SuggestedProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('compatibility_score', models.FloatField()),
+                ('rank', models.PositiveIntegerField()),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='suggestion_entries', to='api.userprofile')),
+                ('suggestion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='api.matchsuggestion')),
+            ],
+            options={
+                'ordering': ['rank'],
+                'unique_together': {('suggestion', 'profile')},
+            },
+        ),
+        # The old auto-created table was never written to; a through model
+        # cannot be added with AlterField, so the field is recreated
+        migrations.RemoveField(
+            model_name='matchsuggestion',
+            name='suggested_users',
+        ),
+        migrations.AddField(
+            model_name='matchsuggestion',
+            name='suggested_users',
+            field=models.ManyToManyField(related_name='suggested_to', through='api.SuggestedProfile', to='api.userprofile'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:53
+
+from django.db import migrations, models
+
+
+def canonicalize_matches(apps, schema_editor):
+    """Store every match with the lower profile id as user1"""
+    Match = apps.get_model('api', 'Match')
+    ChatMessage = apps.get_model('api', 'ChatMessage')
+
+    # A profile cannot like itself, so these are never valid
+    Match.objects.filter(user1_id=models.F('user2_id')).delete()
+
+    for match in Match.objects.filter(user1_id__gt=models.F('user2_id')).iterator():
+        canonical = Match.objects.filter(user1_id=match.user2_id, user2_id=match.user1_id).first()
+        if canonical is None:
+            Match.objects.filter(pk=match.pk).update(user1_id=match.user2_id, user2_id=match.user1_id)
+        else:
+            # The pair was stored twice; keep one match with all the messages
+            ChatMessage.objects.filter(match_id=match.pk).update(match_id=canonical.pk)
+            match.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_suggestedprofile'),
+    ]
+
+    operations = [
+        migrations.RunPython(canonicalize_matches, migrations.RunPython.noop),
+    ]
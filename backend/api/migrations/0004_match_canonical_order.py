@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Separate from the backfill: PostgreSQL cannot alter a table with
+    # deferred foreign key checks still pending in the same transaction
+    dependencies = [
+        ('api', '0003_canonicalize_matches'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='match',
+            constraint=models.CheckConstraint(check=models.Q(('user1__lt', models.F('user2'))), name='match_user1_lt_user2'),
+        ),
+    ]
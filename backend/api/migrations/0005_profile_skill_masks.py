@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:57
+
+from django.db import migrations, models
+
+
+def fill_skill_masks(apps, schema_editor):
+    """Compute the bitmask columns from the existing skills / looking_for rows"""
+    UserProfile = apps.get_model('api', 'UserProfile')
+    masks = {}
+    for field in ('skills', 'looking_for'):
+        through = getattr(UserProfile, field).through
+        for profile_id, skill_id in through.objects.values_list('userprofile_id', 'skill_id').iterator():
+            profile_masks = masks.setdefault(profile_id, {'skills': 0, 'looking_for': 0})
+            profile_masks[field] |= 1 << skill_id
+
+    profiles = [
+        UserProfile(pk=profile_id, **{
+            f'{field}_mask': mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+            for field, mask in profile_masks.items()
+        })
+        for profile_id, profile_masks in masks.items()
+    ]
+    UserProfile.objects.bulk_update(profiles, ['skills_mask', 'looking_for_mask'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_match_canonical_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='looking_for_mask',
+            field=models.BinaryField(default=b'', editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='skills_mask',
+            field=models.BinaryField(default=b'', editable=False),
+        ),
+        migrations.RunPython(fill_skill_masks, migrations.RunPython.noop),
+    ]
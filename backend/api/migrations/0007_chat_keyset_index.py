@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['match', 'created_at', 'id'], name='chat_match_keyset_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='chatmessage',
+            name='chat_match_created_idx',
+        ),
+    ]
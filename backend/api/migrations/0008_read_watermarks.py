@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:11
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_read_watermarks(apps, schema_editor):
+    """Set each participant's watermark to the newest message they had read"""
+    Match = apps.get_model('api', 'Match')
+    ChatMessage = apps.get_model('api', 'ChatMessage')
+
+    def last_read(sender):
+        return Coalesce(models.Subquery(
+            ChatMessage.objects.filter(match=models.OuterRef('pk'), sender=models.OuterRef(sender), is_read=True)
+            .order_by().values('match').annotate(last=models.Max('pk')).values('last')
+        ), 0)
+
+    # Unread messages older than a read one become read, as the watermark
+    # cannot leave gaps
+    Match.objects.update(user1_read_up_to=last_read('user2'), user2_read_up_to=last_read('user1'))
+
+
+def fill_is_read(apps, schema_editor):
+    """Reverse: flag every message up to its recipient's watermark as read"""
+    ChatMessage = apps.get_model('api', 'ChatMessage')
+    ChatMessage.objects.filter(
+        models.Q(sender=models.F('match__user1'), pk__lte=models.F('match__user2_read_up_to'))
+        | models.Q(sender=models.F('match__user2'), pk__lte=models.F('match__user1_read_up_to'))
+    ).update(is_read=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_chat_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='user1_read_up_to',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='user2_read_up_to',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_read_watermarks, fill_is_read),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['match', 'id'], name='chat_match_id_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='chatmessage',
+            name='chat_unread_idx',
+        ),
+        migrations.RemoveField(
+            model_name='chatmessage',
+            name='is_read',
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:24
+
+from django.db import migrations, models
+
+
+def mark_applied(apps, schema_editor):
+    """Stored lists so far were kept current in process; nothing is pending"""
+    UserProfile = apps.get_model('api', 'UserProfile')
+    UserProfile.objects.update(suggestions_version=models.F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_read_watermarks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='suggestions_version',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(mark_applied, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Greatest
 from django.contrib.auth.models import User
 from django.core.validators import URLValidator
 from django.utils import timezone
@@ -108,6 +109,10 @@ class UserProfile(models.Model):
         blank=True,
         help_text="Skills you're looking for in a teammate"
     )
+    # Denormalized copies of skills / looking_for as little-endian bitmasks
+    # (bit n set = skill id n), kept in sync by api.signals
+    skills_mask = models.BinaryField(default=b'', editable=False)
+    looking_for_mask = models.BinaryField(default=b'', editable=False)
     
     # Experience
     years_of_experience = models.IntegerField(default=0)
@@ -131,10 +136,17 @@ class UserProfile(models.Model):
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # updated_at of the last change patched into stored suggestion lists;
+    # any other value means the change is pending (see api.suggestions)
+    suggestions_version = models.DateTimeField(null=True, editable=False)
     is_verified = models.BooleanField(default=False)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # "Changed since" checks: suggestion staleness, LSH index refresh
+            models.Index(fields=['updated_at'], name='profile_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.first_name} {self.user.last_name} - {self.developer_type}"
@@ -165,13 +177,37 @@ class Like(models.Model):
     class Meta:
         unique_together = ('liker', 'liked')
         ordering = ['-created_at']
+        indexes = [
+            # likes_received, newest first (liker lookups use the unique index)
+            models.Index(fields=['liked', '-created_at'], name='like_liked_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.liker.user.first_name} likes {self.liked.user.first_name}"
 
 
+def canonical_pair(profile_a, profile_b):
+    """Ids of two profiles (instances or ids) as (lower, higher), the order Match stores them in"""
+    id_a = getattr(profile_a, 'pk', profile_a)
+    id_b = getattr(profile_b, 'pk', profile_b)
+    return (id_a, id_b) if id_a < id_b else (id_b, id_a)
+
+
+class MatchQuerySet(models.QuerySet):
+    
+    def between(self, profile_a, profile_b):
+        """The match of two profiles, in either order: one lookup on the (user1, user2) index"""
+        user1_id, user2_id = canonical_pair(profile_a, profile_b)
+        return self.filter(user1_id=user1_id, user2_id=user2_id)
+    
+    def involving(self, profile):
+        """Matches `profile` (instance or id) is part of"""
+        profile_id = getattr(profile, 'pk', profile)
+        return self.filter(models.Q(user1_id=profile_id) | models.Q(user2_id=profile_id))
+
+
 class Match(models.Model):
-    """Represents a mutual match between two users"""
+    """Represents a mutual match between two users (user1 always has the lower id)"""
     user1 = models.ForeignKey(
         UserProfile,
         on_delete=models.CASCADE,
@@ -184,13 +220,96 @@ class Match(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     compatibility_score = models.FloatField(default=0.0)
+    # Read watermarks: id of the last message each participant has read
+    user1_read_up_to = models.PositiveBigIntegerField(default=0)
+    user2_read_up_to = models.PositiveBigIntegerField(default=0)
+    
+    objects = MatchQuerySet.as_manager()
     
     class Meta:
         unique_together = ('user1', 'user2')
         ordering = ['-compatibility_score', '-created_at']
+        indexes = [
+            # A profile's matches, best first, from either side of the pair
+            models.Index(fields=['user1', '-compatibility_score'], name='match_user1_score_idx'),
+            models.Index(fields=['user2', '-compatibility_score'], name='match_user2_score_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(user1__lt=models.F('user2')),
+                name='match_user1_lt_user2'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.user1.user.first_name} <-> {self.user2.user.first_name}"
+    
+    def save(self, *args, **kwargs):
+        # Store every pair in canonical order so lookups need a single equality
+        if self.user1_id is not None and self.user2_id is not None and self.user1_id > self.user2_id:
+            self.user1, self.user2 = self.user2, self.user1
+        super().save(*args, **kwargs)
+    
+    def has_participant(self, profile):
+        """Whether `profile` (instance or id) is one of the two matched users"""
+        profile_id = getattr(profile, 'pk', profile)
+        return profile_id in (self.user1_id, self.user2_id)
+    
+    def other_participant(self, profile):
+        """The matched user that is not `profile`"""
+        return self.user2 if getattr(profile, 'pk', profile) == self.user1_id else self.user1
+    
+    def read_up_to(self, profile):
+        """Id of the last message `profile` (instance or id) has read, 0 for none"""
+        return self.user1_read_up_to if getattr(profile, 'pk', profile) == self.user1_id else self.user2_read_up_to
+    
+    def mark_read(self, profile, message_id):
+        """
+        Mark every message up to `message_id` as read by `profile` with a
+        single UPDATE. The watermark only moves forward, so concurrent or out
+        of order calls cannot unread messages.
+        
+        Args:
+            profile: Reading participant (instance or id)
+            message_id: Id of the last message read
+        """
+        field = 'user1_read_up_to' if getattr(profile, 'pk', profile) == self.user1_id else 'user2_read_up_to'
+        Match.objects.filter(pk=self.pk).update(**{
+            field: Greatest(models.F(field), models.Value(message_id))
+        })
+        setattr(self, field, max(getattr(self, field), message_id))
+
+
+class ChatMessageQuerySet(models.QuerySet):
+    
+    def before(self, created_at, pk):
+        """Messages older than the (created_at, id) position, for a keyset page"""
+        # The created_at bound is an index range; the OR only settles ties
+        return self.filter(
+            models.Q(created_at__lt=created_at) | models.Q(pk__lt=pk),
+            created_at__lte=created_at
+        )
+    
+    def after(self, created_at, pk):
+        """Messages newer than the (created_at, id) position, for a keyset page"""
+        return self.filter(
+            models.Q(created_at__gt=created_at) | models.Q(pk__gt=pk),
+            created_at__gte=created_at
+        )
+    
+    def unread_by(self, profile):
+        """Messages sent to `profile` (instance or id) past its read watermark in their match"""
+        profile_id = getattr(profile, 'pk', profile)
+        return self.filter(
+            models.Q(match__user1_id=profile_id, pk__gt=models.F('match__user1_read_up_to'))
+            | models.Q(match__user2_id=profile_id, pk__gt=models.F('match__user2_read_up_to'))
+        ).exclude(sender_id=profile_id)
+    
+    def unread_counts(self, profile):
+        """(match_id, unread) rows for the matches of `profile` with unread messages"""
+        return self.unread_by(profile).order_by().values('match').annotate(
+            unread=models.Count('pk')
+        ).values_list('match', 'unread')
 
 
 class ChatMessage(models.Model):
@@ -207,13 +326,27 @@ class ChatMessage(models.Model):
     )
     message = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
-    is_read = models.BooleanField(default=False)
+    
+    objects = ChatMessageQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # A match's conversation paged by (created_at, id) keyset (by_match)
+            models.Index(fields=['match', 'created_at', 'id'], name='chat_match_keyset_idx'),
+            # Messages past a read watermark (unread counts)
+            models.Index(fields=['match', 'id'], name='chat_match_id_idx'),
+        ]
     
     def __str__(self):
         return f"Message from {self.sender.user.first_name} - {self.created_at}"
+    
+    @property
+    def is_read(self):
+        """Whether the recipient's read watermark has reached this message"""
+        match = self.match
+        recipient_id = match.user2_id if self.sender_id == match.user1_id else match.user1_id
+        return self.pk is not None and self.pk <= match.read_up_to(recipient_id)
 
 
 class MatchSuggestion(models.Model):
@@ -225,9 +358,33 @@ class MatchSuggestion(models.Model):
     )
     suggested_users = models.ManyToManyField(
         UserProfile,
+        through='SuggestedProfile',
         related_name='suggested_to'
     )
     last_updated = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"Suggestions for {self.user.user.first_name}"
+
+
+class SuggestedProfile(models.Model):
+    """A ranked entry in a user's stored suggestions, with its score"""
+    suggestion = models.ForeignKey(
+        MatchSuggestion,
+        on_delete=models.CASCADE,
+        related_name='entries'
+    )
+    profile = models.ForeignKey(
+        UserProfile,
+        on_delete=models.CASCADE,
+        related_name='suggestion_entries'
+    )
+    compatibility_score = models.FloatField()
+    rank = models.PositiveIntegerField()
+    
+    class Meta:
+        unique_together = ('suggestion', 'profile')
+        ordering = ['rank']
+    
+    def __str__(self):
+        return f"#{self.rank} {self.profile_id} ({self.compatibility_score:.2f})"
@@ -0,0 +1,124 @@
+"""
+Per-request and per-message accounting of database queries.
+
+Every database connection gets an execute wrapper that, while a
+track_queries() block is active in the current context, counts the queries
+and the time spent in the database. The context travels through
+sync_to_async, so queries made from a ChatConsumer's database helpers are
+counted against the WebSocket message being handled.
+
+Budgets are declared on viewsets, either as `query_budget` for every action
+or as `query_budgets` keyed by action name. A request over its budget is
+logged. With QUERY_BUDGET_STRICT, which api.test_runner turns on, it raises
+QueryBudgetExceeded instead, so a new N+1 fails the tests that exercise it.
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+_current_usage = ContextVar('query_usage', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryUsage:
+    """Queries run and seconds spent in the database"""
+
+    __slots__ = ('count', 'duration')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+def record_query(execute, sql, params, many, context):
+    usage = _current_usage.get()
+    if usage is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        usage.count += 1
+        usage.duration += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    # execute_wrappers outlives reconnects, so only add the recorder once
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def track_queries():
+    """Count the queries made in this context (and sync_to_async calls from it)"""
+    usage = QueryUsage()
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+
+
+def enforce_budget(label, usage, budget):
+    """Log `usage` over `budget`, or raise QueryBudgetExceeded in strict mode"""
+    if budget is None or usage.count <= budget:
+        return
+    message = (
+        f'{label} made {usage.count} queries ({usage.duration * 1000:.1f}ms), '
+        f'over its budget of {budget}'
+    )
+    if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def view_query_budget(view_func, method):
+    """Budget declared on the viewset serving `view_func`, else QUERY_BUDGET_DEFAULT"""
+    default = getattr(settings, 'QUERY_BUDGET_DEFAULT', None)
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return default
+    action = (getattr(view_func, 'actions', None) or {}).get(method.lower())
+    budgets = getattr(view_class, 'query_budgets', {})
+    if action in budgets:
+        return budgets[action]
+    return getattr(view_class, 'query_budget', default)
+
+
+class QueryBudgetMiddleware:
+    """
+    Counts queries per request, adds X-DB-Queries / X-DB-Time-Ms headers
+    when QUERY_BUDGET_HEADERS is on (default: DEBUG) and enforces budgets.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with track_queries() as usage:
+            response = self.get_response(request)
+
+        budget = getattr(request, 'query_budget', getattr(settings, 'QUERY_BUDGET_DEFAULT', None))
+        if getattr(settings, 'QUERY_BUDGET_HEADERS', settings.DEBUG):
+            response['X-DB-Queries'] = str(usage.count)
+            response['X-DB-Time-Ms'] = f'{usage.duration * 1000:.1f}'
+            if budget is not None:
+                response['X-DB-Query-Budget'] = str(budget)
+        enforce_budget(f'{request.method} {request.path}', usage, budget)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = view_query_budget(view_func, request.method)
+
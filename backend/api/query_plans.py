@@ -0,0 +1,116 @@
+"""
+Declarative select_related / prefetch_related plans for serializers.
+
+A serializer lists the relations it reads itself in its Meta, as
+`select_related` (single-valued, joined) and `prefetch_related` (many-valued,
+one extra query each). Nested serializer fields are followed automatically:
+their plans are prefixed with the field's source, and everything below a
+many-valued field is prefetched. query_plan(LikeSerializer) therefore covers
+both embedded profiles, their users and their skills, and listing any number
+of likes costs a constant number of queries.
+
+Viewsets get the plan of their serializer applied by QueryPlanMixin.
+"""
+
+from functools import lru_cache
+
+from django.db.models import QuerySet, prefetch_related_objects
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+
+class QueryPlan:
+    """Lookups a serializer needs loaded up front"""
+
+    __slots__ = ('select_related', 'prefetch_related')
+
+    def __init__(self, select_related=(), prefetch_related=()):
+        self.select_related = tuple(dict.fromkeys(select_related))
+        self.prefetch_related = tuple(dict.fromkeys(prefetch_related))
+
+    def __repr__(self):
+        return f"<QueryPlan select_related={list(self.select_related)} prefetch_related={list(self.prefetch_related)}>"
+
+
+@lru_cache(maxsize=None)
+def query_plan(serializer_class):
+    """
+    QueryPlan of a serializer class, including its nested serializers.
+
+    Args:
+        serializer_class: Serializer class, optionally declaring
+            Meta.select_related and Meta.prefetch_related
+
+    Returns:
+        QueryPlan
+    """
+    meta = getattr(serializer_class, 'Meta', None)
+    select_related = list(getattr(meta, 'select_related', ()))
+    prefetch_related = list(getattr(meta, 'prefetch_related', ()))
+
+    for field in serializer_class().fields.values():
+        if field.write_only:
+            continue
+        many = isinstance(field, ListSerializer)
+        nested = field.child if many else field
+        if not isinstance(nested, BaseSerializer):
+            continue
+        nested_plan = query_plan(type(nested))
+        if field.source == '*':
+            select_related += nested_plan.select_related
+            prefetch_related += nested_plan.prefetch_related
+            continue
+
+        lookup = field.source.replace('.', '__')
+        if many:
+            # Relations of prefetched objects can only be prefetched themselves
+            prefetch_related.append(lookup)
+            prefetch_related += [
+                f'{lookup}__{nested_lookup}'
+                for nested_lookup in nested_plan.select_related + nested_plan.prefetch_related
+            ]
+        else:
+            select_related.append(lookup)
+            select_related += [f'{lookup}__{nested_lookup}' for nested_lookup in nested_plan.select_related]
+            prefetch_related += [f'{lookup}__{nested_lookup}' for nested_lookup in nested_plan.prefetch_related]
+
+    # 'liker' is implied by 'liker__user'
+    select_related = [
+        lookup for lookup in select_related
+        if not any(other.startswith(f'{lookup}__') for other in select_related)
+    ]
+    return QueryPlan(select_related, prefetch_related)
+
+
+def plan_queryset(queryset, serializer_class):
+    """`queryset` with the plan of `serializer_class` applied"""
+    plan = query_plan(serializer_class)
+    if plan.select_related:
+        queryset = queryset.select_related(*plan.select_related)
+    if plan.prefetch_related:
+        queryset = queryset.prefetch_related(*plan.prefetch_related)
+    return queryset
+
+
+def plan_instances(instances, serializer_class):
+    """Load the plan of `serializer_class` for already fetched model instances"""
+    plan = query_plan(serializer_class)
+    # One query per select_related level as well, as the rows are already read
+    prefetch_related_objects(list(instances), *plan.select_related, *plan.prefetch_related)
+    return instances
+
+
+class QueryPlanMixin:
+    """
+    Applies the serializer's QueryPlan to the querysets a viewset serializes:
+    the page of list(), and any queryset passed to get_serializer().
+    """
+
+    def paginate_queryset(self, queryset):
+        if isinstance(queryset, QuerySet):
+            queryset = plan_queryset(queryset, self.get_serializer_class())
+        return super().paginate_queryset(queryset)
+
+    def get_serializer(self, *args, **kwargs):
+        if args and isinstance(args[0], QuerySet):
+            args = (plan_queryset(args[0], self.get_serializer_class()), *args[1:])
+        return super().get_serializer(*args, **kwargs)
@@ -0,0 +1,206 @@
+"""
+Cache of compatibility scores per unordered profile pair.
+
+calculate_compatibility_score is symmetric, so a pair is cached once under
+(lower id, higher id) together with both profiles' versions (updated_at)
+and a digest of the scoring rules. Editing a profile changes its version,
+and deploying new weights or tables changes the digest, so old entries are
+never read again and simply age out; no explicit invalidation is needed.
+
+Two tiers:
+- an in-process LRU bounded by PAIR_SCORE_CACHE_SIZE entries
+- optionally a Django cache (PAIR_SCORE_CACHE_ALIAS) shared between workers
+"""
+
+import functools
+import hashlib
+import threading
+from collections import OrderedDict
+from types import CodeType
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .features import as_features
+
+
+def profile_version(profile):
+    """Version of a UserProfile or ProfileFeatures as an integer, None if unknown"""
+    version = getattr(profile, 'version', None) or getattr(profile, 'updated_at', None)
+    if version is None:
+        return None
+    return int(version.timestamp() * 1_000_000)
+
+
+@functools.cache
+def score_version():
+    """
+    Short digest of the scoring rules the cached scores were computed with.
+
+    Covers calculate_compatibility_score (weights included, as constants of
+    its code) and the rules the scoring tables are built from, so workers
+    running a different formula never share entries.
+    """
+    from .matching_algorithm import calculate_compatibility_score
+    from .scoring_tables import availability_score, experience_score, preference_score
+
+    digest = hashlib.sha1()
+    for function in (calculate_compatibility_score, preference_score, availability_score, experience_score):
+        code = function.__code__
+        constants = [value for value in code.co_consts if not isinstance(value, CodeType)]
+        digest.update(repr((code.co_code, constants, code.co_names)).encode())
+    return digest.hexdigest()[:12]
+
+
+def pair_key(user1, user2):
+    """Cache key for an unordered pair, or None if either version is unknown"""
+    version1, version2 = profile_version(user1), profile_version(user2)
+    if version1 is None or version2 is None:
+        return None
+    if user1.id > user2.id:
+        user1, user2, version1, version2 = user2, user1, version2, version1
+    return f'pair-score:{score_version()}:{user1.id}:{user2.id}:{version1}:{version2}'
+
+
+class PairScoreCache:
+    """Two-tier pair-score cache with hit/miss counters"""
+
+    def __init__(self, maxsize=100_000, alias=None, timeout=None):
+        self.maxsize = maxsize
+        self.shared = caches[alias] if alias else None
+        self.timeout = timeout
+        self.local = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """Counters since the cache was created or cleared"""
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'size': len(self.local),
+                'maxsize': self.maxsize,
+            }
+
+    def clear(self):
+        with self.lock:
+            self.local.clear()
+            self.hits = self.shared_hits = self.misses = 0
+
+    def _get_local(self, key):
+        with self.lock:
+            score = self.local.get(key)
+            if score is not None:
+                self.local.move_to_end(key)
+            return score
+
+    def _set_local(self, items):
+        if not self.maxsize:
+            return
+        with self.lock:
+            for key, score in items:
+                self.local[key] = score
+                self.local.move_to_end(key)
+            while len(self.local) > self.maxsize:
+                self.local.popitem(last=False)
+
+    def score_many(self, user, others, compute):
+        """
+        Scores of `user` against each of `others`, computing only the misses.
+
+        Args:
+            user: UserProfile or ProfileFeatures
+            others: List of UserProfile or ProfileFeatures
+            compute: Function (user, other) -> score used on a miss
+
+        Returns:
+            List of scores, in the order of `others`
+        """
+        scores = [None] * len(others)
+        keys = [pair_key(user, other) for other in others]
+
+        missing = {}
+        for i, key in enumerate(keys):
+            if key is None:
+                continue
+            score = self._get_local(key)
+            if score is None:
+                missing.setdefault(key, []).append(i)
+            else:
+                scores[i] = score
+        local_hits = sum(key is not None for key in keys) - sum(map(len, missing.values()))
+
+        shared_hits = 0
+        if self.shared is not None and missing:
+            found = self.shared.get_many(list(missing))
+            self._set_local(found.items())
+            for key, score in found.items():
+                for i in missing.pop(key):
+                    scores[i] = score
+                    shared_hits += 1
+
+        computed = {}
+        for i, other in enumerate(others):
+            if scores[i] is None:
+                scores[i] = compute(user, other)
+                if keys[i] is not None:
+                    computed[keys[i]] = scores[i]
+        self._set_local(computed.items())
+        if self.shared is not None and computed:
+            self.shared.set_many(computed, timeout=self.timeout)
+
+        with self.lock:
+            self.hits += local_hits + shared_hits
+            self.shared_hits += shared_hits
+            self.misses += len(others) - local_hits - shared_hits
+        return scores
+
+    def score(self, user1, user2, compute):
+        """Score of one pair, computing it on a miss"""
+        return self.score_many(user1, [user2], compute)[0]
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_pair_score_cache():
+    """The process-wide PairScoreCache configured from settings"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PairScoreCache(
+                    maxsize=getattr(settings, 'PAIR_SCORE_CACHE_SIZE', 100_000),
+                    alias=getattr(settings, 'PAIR_SCORE_CACHE_ALIAS', None),
+                    timeout=getattr(settings, 'PAIR_SCORE_CACHE_TIMEOUT', None),
+                )
+    return _cache
+
+
+@receiver(setting_changed)
+def reset_pair_score_cache(setting, **kwargs):
+    global _cache
+    if setting.startswith('PAIR_SCORE_CACHE_'):
+        _cache = None
+
+
+def cached_compatibility_score(user1, user2):
+    """
+    calculate_compatibility_score through the pair-score cache.
+
+    UserProfile instances are only converted to features on a miss; that
+    reads their skill mask columns, so scoring makes no queries either way.
+    """
+    from .matching_algorithm import calculate_compatibility_score
+
+    return get_pair_score_cache().score(
+        user1, user2,
+        lambda a, b: calculate_compatibility_score(as_features(a), as_features(b))
+    )
@@ -0,0 +1,137 @@
+"""
+Lookup tables for the categorical parts of the compatibility score.
+
+developer_type, teammate_preference and availability are small fixed choice
+sets, so they are encoded as small integers and every partial score is
+precomputed at import time:
+
+- preference[pref][type]: 50 if a teammate preference accepts a developer type
+- availability[a][b]: 100 for matching (or flexible) availability, else 50
+- experience[min(diff, EXPERIENCE_CAP)]: 100 / 75 / 50 experience proximity
+
+The tables exist both as nested lists (scalar path) and NumPy arrays
+(batched path). A value outside the model choices gets a new code and the
+tables are rebuilt to include it, so scores never depend on validation.
+"""
+
+import threading
+
+import numpy as np
+
+from .models import DEVELOPER_TYPES, TEAMMATE_PREFERENCES, UserProfile
+
+ANY = 'any'
+FLEXIBLE = 'flexible'
+AVAILABILITY_CHOICES = UserProfile._meta.get_field('availability').choices
+
+# Experience differences at or above this share the last table entry
+EXPERIENCE_CAP = 8
+
+# developer_type and teammate_preference share one code space so a
+# preference can be compared to a type directly
+TYPE_CODES = {value: code for code, (value, _) in enumerate(TEAMMATE_PREFERENCES)}
+for value, _ in DEVELOPER_TYPES:
+    TYPE_CODES.setdefault(value, len(TYPE_CODES))
+AVAILABILITY_CODES = {value: code for code, (value, _) in enumerate(AVAILABILITY_CHOICES)}
+
+ANY_PREFERENCE = TYPE_CODES[ANY]
+FLEXIBLE_AVAILABILITY = AVAILABILITY_CODES[FLEXIBLE]
+
+
+def preference_score(preference, developer_type):
+    """Half of the type compatibility: does `preference` accept `developer_type`"""
+    return 50 if preference == ANY or preference == developer_type else 0
+
+
+def availability_score(availability1, availability2):
+    if availability1 == availability2 or availability1 == FLEXIBLE or availability2 == FLEXIBLE:
+        return 100
+    # Partial match
+    return 50
+
+
+def experience_score(experience_diff):
+    # More compatible if experience levels are closer (within 3 years)
+    if experience_diff <= 3:
+        return 100
+    elif experience_diff <= 7:
+        return 75
+    return 50
+
+
+def _table(codes_a, codes_b, score):
+    values_a = sorted(codes_a, key=codes_a.get)
+    values_b = sorted(codes_b, key=codes_b.get)
+    return [[score(a, b) for b in values_b] for a in values_a]
+
+
+class ScoringTables:
+    """Current lookup tables; rebuilt in place when a new code appears"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rebuild()
+
+    def rebuild(self, type_codes=TYPE_CODES, availability_codes=AVAILABILITY_CODES):
+        self.preference_list = _table(type_codes, type_codes, preference_score)
+        self.availability_list = _table(availability_codes, availability_codes, availability_score)
+        self.experience_list = [experience_score(diff) for diff in range(EXPERIENCE_CAP + 1)]
+        self.preference = np.array(self.preference_list, dtype=np.int64)
+        self.availability = np.array(self.availability_list, dtype=np.int64)
+        self.experience = np.array(self.experience_list, dtype=np.int64)
+
+    def encode(self, codes, value):
+        """Small-int code for a categorical value, extending the tables if it is new"""
+        code = codes.get(value)
+        if code is None:
+            with self.lock:
+                code = codes.get(value)
+                if code is None:
+                    # Readers look codes up without the lock: grow the tables
+                    # first and publish the code once it indexes into them
+                    code = len(codes)
+                    extended = {**codes, value: code}
+                    if codes is TYPE_CODES:
+                        self.rebuild(type_codes=extended)
+                    else:
+                        self.rebuild(availability_codes=extended)
+                    codes[value] = code
+        return code
+
+
+tables = ScoringTables()
+
+
+def check_tables():
+    """
+    Verify the tables against the model choices and the scoring rules.
+
+    Returns:
+        List of problem descriptions (empty when consistent)
+    """
+    problems = []
+    for name, choices, codes in (
+        ('DEVELOPER_TYPES', DEVELOPER_TYPES, TYPE_CODES),
+        ('TEAMMATE_PREFERENCES', TEAMMATE_PREFERENCES, TYPE_CODES),
+        ('UserProfile.availability choices', AVAILABILITY_CHOICES, AVAILABILITY_CODES),
+    ):
+        for value, _ in choices:
+            if value not in codes:
+                problems.append(f"{name} value {value!r} has no code")
+    if ANY not in TYPE_CODES:
+        problems.append(f"TEAMMATE_PREFERENCES has no {ANY!r} choice")
+    if FLEXIBLE not in AVAILABILITY_CODES:
+        problems.append(f"availability choices have no {FLEXIBLE!r} choice")
+
+    for preference, preference_code in TYPE_CODES.items():
+        for developer_type, type_code in TYPE_CODES.items():
+            if tables.preference[preference_code, type_code] != preference_score(preference, developer_type):
+                problems.append(f"preference table wrong for ({preference!r}, {developer_type!r})")
+    for first, first_code in AVAILABILITY_CODES.items():
+        for second, second_code in AVAILABILITY_CODES.items():
+            if tables.availability[first_code, second_code] != availability_score(first, second):
+                problems.append(f"availability table wrong for ({first!r}, {second!r})")
+    for diff in range(EXPERIENCE_CAP + 2):
+        if tables.experience[min(diff, EXPERIENCE_CAP)] != experience_score(diff):
+            problems.append(f"experience table wrong for a difference of {diff}")
+    return problems
@@ -1,7 +1,11 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from .fast_serializers import ChatMessageRows, MatchRows, ProfileListRows
 from .models import UserProfile, Like, Match, ChatMessage, MatchSuggestion, Skill
 
+# Relations a serializer reads besides its nested serializers are declared as
+# Meta.select_related / Meta.prefetch_related; see query_plans
+
 
 class SkillSerializer(serializers.ModelSerializer):
     class Meta:
@@ -65,6 +69,9 @@ class UserProfileListSerializer(serializers.ModelSerializer):
             'availability',
             'github_url', 'x_url', 'portfolio_url',
         ]
+        select_related = ['user']  # get_user
+        # many=True renders with compiled rows (fast_serializers); keep in sync with fields
+        list_serializer_class = ProfileListRows
     
     def get_user(self, obj):
         return {
@@ -95,16 +102,21 @@ class MatchSerializer(serializers.ModelSerializer):
             'created_at', 'compatibility_score'
         ]
         read_only_fields = ['id', 'created_at']
+        list_serializer_class = MatchRows
 
 
 class ChatMessageSerializer(serializers.ModelSerializer):
     sender_name = serializers.CharField(source='sender.user.first_name', read_only=True)
     sender_id = serializers.IntegerField(source='sender.id', read_only=True)
+    # Computed from the recipient's read watermark; set it with mark_as_read
+    is_read = serializers.BooleanField(read_only=True)
     
     class Meta:
         model = ChatMessage
         fields = ['id', 'match', 'sender', 'sender_id', 'sender_name', 'message', 'created_at', 'is_read']
         read_only_fields = ['id', 'created_at', 'match']
+        select_related = ['sender__user', 'match']  # sender_name, is_read
+        list_serializer_class = ChatMessageRows
 
 
 class MatchSuggestionSerializer(serializers.ModelSerializer):
@@ -0,0 +1,110 @@
+"""
+Signal handlers keeping denormalized profile data current: the skill bitmask
+columns of UserProfile and stored suggestion lists (MatchSuggestion).
+
+Profile saves and skill changes schedule the profile's change to be patched
+into the stored lists when the transaction commits (apply_profile_change,
+which runs once per profile version). Patching rescans every stored list, so
+past SUGGESTION_INCREMENTAL_MAX_HOLDERS lists it is left out of the request:
+the change stays pending, lists read as stale until the
+apply_suggestion_updates command patches it.
+"""
+
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .features import sync_skill_masks
+from .models import UserProfile, Like, Match, MatchSuggestion, Skill
+from .suggestions import apply_profile_change, invalidate_suggestions
+
+
+def incremental_updates_enabled():
+    return getattr(settings, 'SUGGESTION_INCREMENTAL_UPDATES', False)
+
+
+def schedule_suggestion_update(profile_ids):
+    """Patch each profile's change into the stored lists once the transaction commits"""
+    for profile_id in profile_ids:
+        transaction.on_commit(partial(_apply_update, profile_id))
+
+
+def _apply_update(profile_id):
+    max_holders = getattr(settings, 'SUGGESTION_INCREMENTAL_MAX_HOLDERS', 500)
+    if MatchSuggestion.objects.count() > max_holders:
+        return
+    apply_profile_change(profile_id)
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_saved(sender, instance, raw=False, **kwargs):
+    if incremental_updates_enabled() and not raw:
+        schedule_suggestion_update([instance.pk])
+
+
+@receiver(m2m_changed, sender=UserProfile.skills.through)
+@receiver(m2m_changed, sender=UserProfile.looking_for.through)
+def profile_skills_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # Clearing from the Skill side sends no pk_set; note the profiles
+        # holding the skill while their rows still exist
+        cleared = instance.__dict__.setdefault('_cleared_profile_ids', {})
+        cleared[sender] = list(
+            sender.objects.filter(skill_id=instance.pk).values_list('userprofile_id', flat=True)
+        )
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        profile_ids = [instance.pk]
+    elif action == 'post_clear':
+        profile_ids = instance.__dict__.get('_cleared_profile_ids', {}).pop(sender, [])
+    else:
+        # Changed from the Skill side: pk_set holds the affected profiles
+        profile_ids = list(pk_set or ())
+    if not profile_ids:
+        return
+
+    # Skill changes are profile changes: refresh the changed bitmask and
+    # bump the version in one update, without re-saving
+    field = 'skills' if sender is UserProfile.skills.through else 'looking_for'
+    now = timezone.now()
+    stored = sync_skill_masks(profile_ids, fields=[field], updated_at=now)
+    if not reverse:
+        instance.updated_at = now
+        for name, value in stored[instance.pk].items():
+            setattr(instance, name, value)
+    if incremental_updates_enabled():
+        schedule_suggestion_update(profile_ids)
+
+
+@receiver(pre_delete, sender=Skill)
+def skill_deleted(sender, instance, **kwargs):
+    # The cascade removes the M2M rows without m2m_changed; clear the skill's
+    # bit from the profiles holding it once the rows are gone
+    profile_ids = set(instance.users_with_skill.values_list('pk', flat=True))
+    profile_ids.update(instance.users_looking_for_skill.values_list('pk', flat=True))
+    if profile_ids:
+        transaction.on_commit(partial(sync_skill_masks, profile_ids, updated_at=timezone.now()))
+
+
+@receiver(pre_delete, sender=UserProfile)
+def profile_deleted(sender, instance, **kwargs):
+    # Lists containing the profile lose an entry they cannot refill
+    if incremental_updates_enabled():
+        MatchSuggestion.objects.filter(entries__profile=instance).delete()
+
+
+@receiver(post_delete, sender=Like)
+def like_deleted(sender, instance, **kwargs):
+    # The unliked profile can be suggested to the liker again
+    invalidate_suggestions([instance.liker_id])
+
+
+@receiver(post_delete, sender=Match)
+def match_deleted(sender, instance, **kwargs):
+    invalidate_suggestions([instance.user1_id, instance.user2_id])
@@ -0,0 +1,60 @@
+"""
+Inverted skill index used to generate suggestion candidates.
+
+The skills and looking_for through tables are indexed by skill_id, so they
+already are a skill -> profile inverted index in the database. SkillIndex
+queries them to find the profiles that can score on the skill components
+(shared skills or complementary skills) without scanning every profile.
+"""
+
+from django.db.models import Q
+
+from .features import as_features, mask_skill_ids
+from .models import UserProfile
+
+
+class SkillIndex:
+    """Skill -> profile lookups over the skills / looking_for M2M tables"""
+
+    skills_table = UserProfile.skills.through
+    looking_for_table = UserProfile.looking_for.through
+
+    def profiles_with_skills(self, skill_ids):
+        """Subquery of profile ids that have any of `skill_ids`"""
+        return self.skills_table.objects.filter(
+            skill_id__in=skill_ids
+        ).values('userprofile_id')
+
+    def profiles_looking_for(self, skill_ids):
+        """Subquery of profile ids looking for any of `skill_ids`"""
+        return self.looking_for_table.objects.filter(
+            skill_id__in=skill_ids
+        ).values('userprofile_id')
+
+    def candidate_filter(self, user_profile):
+        """
+        Q matching profiles that share a skill with `user_profile`, have a
+        skill it is looking for, or are looking for one of its skills.
+        """
+        features = as_features(user_profile)
+        skills = mask_skill_ids(features.skills)
+        wanted = mask_skill_ids(features.looking_for)
+
+        condition = Q(pk__in=[])
+        if skills or wanted:
+            condition |= Q(pk__in=self.profiles_with_skills(skills + wanted))
+        if skills:
+            condition |= Q(pk__in=self.profiles_looking_for(skills))
+        return condition
+
+    @staticmethod
+    def is_candidate(user_features, other_features):
+        """Whether `other_features` would be returned by candidate_filter for the user"""
+        return bool(
+            other_features.skills & (user_features.skills | user_features.looking_for)
+            or other_features.looking_for & user_features.skills
+        )
+
+    def candidates(self, user_profile, queryset):
+        """Restrict a UserProfile queryset to the index candidates"""
+        return queryset.filter(self.candidate_filter(user_profile))
@@ -0,0 +1,320 @@
+"""
+Materialized suggestion lists stored in MatchSuggestion.
+
+Each user's top suggestions are persisted with their scores and served from
+the database until they go stale, so the matching algorithm only runs when
+something that could change the ranking has happened.
+"""
+
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from .features import iter_feature_chunks, load_profile_features
+from .matching_algorithm import (
+    calculate_compatibility_score, exclude_seen_profiles, get_top_suggestions, rank_suggestions
+)
+from .models import UserProfile, Like, Match, MatchSuggestion, SuggestedProfile
+from .skill_index import SkillIndex
+
+
+def is_stale(suggestion):
+    """
+    Check whether a stored suggestion list may no longer be the current top-N.
+
+    A list is stale when it is older than SUGGESTION_CACHE_TTL seconds, or
+    when since it was computed any profile was created or updated (with
+    SUGGESTION_INCREMENTAL_UPDATES on, only changes not yet patched into the
+    stored lists count), the user liked someone, or the user got a new match.
+    """
+    last_updated = suggestion.last_updated
+    ttl = getattr(settings, 'SUGGESTION_CACHE_TTL', None)
+    if ttl is not None and last_updated < timezone.now() - timedelta(seconds=ttl):
+        return True
+
+    # With incremental updates, profile changes are patched into stored
+    # lists by update_suggestions_for_profile instead; only changes still
+    # pending (see apply_profile_change) make a list stale
+    changed = UserProfile.objects.filter(updated_at__gt=last_updated)
+    if getattr(settings, 'SUGGESTION_INCREMENTAL_UPDATES', False):
+        changed = pending_profile_changes(changed)
+    if changed.exists():
+        return True
+
+    profile_id = suggestion.user_id
+    return (
+        Like.objects.filter(liker_id=profile_id, created_at__gt=last_updated).exists()
+        or Match.objects.involving(profile_id).filter(created_at__gt=last_updated).exists()
+    )
+
+
+def store_suggestions(user_profile, ranked, computed_at):
+    """
+    Replace a user's stored suggestions.
+
+    Args:
+        user_profile: UserProfile the suggestions are for
+        ranked: List of (UserProfile, compatibility_score) tuples, best first
+        computed_at: When the ranking started; stored as last_updated so
+            changes made while it was computed still mark it stale
+
+    Returns:
+        The MatchSuggestion instance
+    """
+    with transaction.atomic():
+        suggestion, _ = MatchSuggestion.objects.get_or_create(user=user_profile)
+        suggestion.entries.all().delete()
+        SuggestedProfile.objects.bulk_create([
+            SuggestedProfile(
+                suggestion=suggestion,
+                profile=profile,
+                compatibility_score=score,
+                rank=rank
+            )
+            for rank, (profile, score) in enumerate(ranked)
+        ])
+        # update() bypasses auto_now so last_updated is the compute start time
+        MatchSuggestion.objects.filter(pk=suggestion.pk).update(last_updated=computed_at)
+        suggestion.last_updated = computed_at
+    return suggestion
+
+
+def get_suggestions(user_profile, limit=10):
+    """
+    Get a user's top suggestions, from MatchSuggestion when still fresh.
+
+    The stored list always holds SUGGESTION_CACHE_SIZE entries (or fewer if
+    there are not that many candidates), so any `limit` up to that size can
+    be served from it.
+
+    Args:
+        user_profile: UserProfile instance
+        limit: Number of suggestions to return
+
+    Returns:
+        (List of (UserProfile, compatibility_score) tuples, cache_hit: bool)
+    """
+    size = getattr(settings, 'SUGGESTION_CACHE_SIZE', 10)
+    if limit > size:
+        return get_top_suggestions(user_profile, limit=limit), False
+
+    suggestion = MatchSuggestion.objects.filter(user=user_profile).first()
+    if suggestion is not None and not is_stale(suggestion):
+        entries = suggestion.entries.select_related('profile')[:limit]
+        return [(entry.profile, entry.compatibility_score) for entry in entries], True
+
+    computed_at = timezone.now()
+    ranked = get_top_suggestions(user_profile, limit=size)
+    store_suggestions(user_profile, ranked, computed_at)
+    return ranked[:limit], False
+
+
+def invalidate_suggestions(profile_ids):
+    """Drop stored suggestion lists so they are recomputed on next read"""
+    MatchSuggestion.objects.filter(user_id__in=profile_ids).delete()
+
+
+def pending_profile_changes(queryset=None):
+    """Profiles of `queryset` whose latest change is not patched into the stored lists yet"""
+    if queryset is None:
+        queryset = UserProfile.objects.all()
+    return queryset.exclude(suggestions_version=F('updated_at'))
+
+
+def apply_profile_change(profile_id):
+    """
+    Patch a profile's latest change into the stored suggestion lists, once.
+
+    A create_profile request saves the row and sets both skill lists, firing
+    several signals for the same final state; the version (updated_at) is
+    recorded in suggestions_version, so only the first call rescans.
+
+    Returns:
+        Whether update_suggestions_for_profile ran
+    """
+    profiles = UserProfile.objects.filter(pk=profile_id)
+    version, applied = profiles.values_list('updated_at', 'suggestions_version').first() or (None, None)
+    if version is None or version == applied:
+        return False
+    update_suggestions_for_profile(profile_id)
+    # A change saved meanwhile stays pending
+    profiles.filter(updated_at=version).update(suggestions_version=version)
+    return True
+
+
+def update_suggestions_for_profile(profile_id):
+    """
+    Patch one changed profile into, or out of, every stored suggestion list.
+
+    This is a reverse top-k update: the changed profile is rescored against
+    each user holding a stored list, and only lists whose top-N it enters,
+    leaves or moves within are touched. Entries below a list's previous
+    minimum were never stored, so when the profile drops below that minimum
+    (or becomes ineligible) the list cannot be patched and is dropped to be
+    recomputed on next read. The profile's own list is always dropped.
+
+    Args:
+        profile_id: id of the UserProfile that was created or changed
+    """
+    invalidate_suggestions([profile_id])
+
+    profile_queryset = UserProfile.objects.filter(pk=profile_id)
+    changed = load_profile_features(profile_queryset).get(profile_id)
+    if changed is None:
+        return
+    is_admin = profile_queryset.filter(user__username='admin').exists()
+
+    # Users for whom the profile must not be suggested
+    excluded = set(Like.objects.filter(liked_id=profile_id).values_list('liker_id', flat=True))
+    for user1_id, user2_id in Match.objects.involving(profile_id).values_list('user1_id', 'user2_id'):
+        excluded.update((user1_id, user2_id))
+
+    current_entries = {
+        entry.suggestion_id: entry
+        for entry in SuggestedProfile.objects.filter(profile_id=profile_id)
+    }
+    size = getattr(settings, 'SUGGESTION_CACHE_SIZE', 10)
+    use_index = getattr(settings, 'MATCHING_CANDIDATES', 'index') == 'index'
+    chunk_size = getattr(settings, 'MATCHING_CHUNK_SIZE', 2000)
+
+    holders = UserProfile.objects.filter(suggestions__isnull=False).exclude(pk=profile_id)
+    for chunk in iter_feature_chunks(holders, chunk_size):
+        holder_ids = [features.id for features in chunk]
+        suggestion_ids = dict(
+            MatchSuggestion.objects.filter(user_id__in=holder_ids).values_list('user_id', 'id')
+        )
+        stats = {
+            row['suggestion_id']: (row['count'], row['lowest'])
+            for row in SuggestedProfile.objects.filter(
+                suggestion_id__in=suggestion_ids.values()
+            ).values('suggestion_id').annotate(
+                count=Count('id'), lowest=Min('compatibility_score')
+            )
+        }
+
+        stale = []
+        touched = []
+        to_create = []
+        to_update = []
+        to_delete = []
+        for holder in chunk:
+            suggestion_id = suggestion_ids.get(holder.id)
+            if suggestion_id is None:
+                continue
+            count, lowest = stats.get(suggestion_id, (0, None))
+            entry = current_entries.get(suggestion_id)
+
+            score = calculate_compatibility_score(holder, changed)
+            eligible = (
+                score > 0
+                and not is_admin
+                and holder.id not in excluded
+                and (count < size or not use_index or SkillIndex.is_candidate(holder, changed))
+            )
+
+            if entry is not None:
+                if eligible and (count < size or score >= lowest):
+                    entry.compatibility_score = score
+                    to_update.append(entry)
+                    touched.append(suggestion_id)
+                else:
+                    stale.append(holder.id)
+            elif eligible and (count < size or score > lowest):
+                to_create.append(SuggestedProfile(
+                    suggestion_id=suggestion_id,
+                    profile_id=profile_id,
+                    compatibility_score=score,
+                    rank=size
+                ))
+                if count >= size:
+                    to_delete.append(suggestion_id)
+                touched.append(suggestion_id)
+
+        with transaction.atomic():
+            invalidate_suggestions(stale)
+            SuggestedProfile.objects.bulk_update(to_update, ['compatibility_score'])
+            for suggestion_id in to_delete:
+                # Drop the current lowest entry to make room
+                SuggestedProfile.objects.filter(suggestion_id=suggestion_id).order_by(
+                    'compatibility_score', '-rank'
+                ).first().delete()
+            SuggestedProfile.objects.bulk_create(to_create)
+            _rerank(touched)
+
+
+def _rerank(suggestion_ids):
+    """Renumber entry ranks by score, keeping the stored order between ties"""
+    reranked = []
+    entries = SuggestedProfile.objects.filter(suggestion_id__in=suggestion_ids).order_by(
+        'suggestion_id', '-compatibility_score', 'rank'
+    )
+    previous_suggestion, rank = None, 0
+    for entry in entries:
+        if entry.suggestion_id != previous_suggestion:
+            previous_suggestion, rank = entry.suggestion_id, 0
+        if entry.rank != rank:
+            entry.rank = rank
+            reranked.append(entry)
+        rank += 1
+    SuggestedProfile.objects.bulk_update(reranked, ['rank'])
+
+
+def feed_snapshot_key(profile_id, snapshot_id):
+    return f'suggestion-feed:{profile_id}:{snapshot_id}'
+
+
+def get_feed_page(user_profile, snapshot_id=None, offset=0, page_size=10):
+    """
+    One page of a user's suggestion feed.
+
+    The first page ranks up to SUGGESTION_FEED_SIZE suggestions once and
+    stores them as a snapshot (profile ids and scores) in the cache for
+    SUGGESTION_FEED_TTL seconds. Later pages are slices of that snapshot, so
+    the order does not change while the user scrolls, and only the profiles
+    on the requested page are loaded. Profiles deleted, liked or matched
+    since the snapshot was taken are left out of their page.
+
+    Args:
+        user_profile: UserProfile instance
+        snapshot_id: Snapshot returned with the previous page, None to start
+        offset: Position of the page in the snapshot
+        page_size: Number of snapshot entries per page
+
+    Returns:
+        (List of (UserProfile, compatibility_score) tuples, snapshot_id,
+        offset of the next page or None on the last page), or None if the
+        snapshot expired
+    """
+    if snapshot_id is None:
+        snapshot_id = uuid.uuid4().hex
+        ranked = rank_suggestions(user_profile, getattr(settings, 'SUGGESTION_FEED_SIZE', 100))
+        snapshot = (
+            [profile_id for profile_id, _ in ranked],
+            [score for _, score in ranked],
+        )
+        cache.set(
+            feed_snapshot_key(user_profile.id, snapshot_id), snapshot,
+            timeout=getattr(settings, 'SUGGESTION_FEED_TTL', 900)
+        )
+    else:
+        snapshot = cache.get(feed_snapshot_key(user_profile.id, snapshot_id))
+        if snapshot is None:
+            return None
+
+    profile_ids, scores = snapshot
+    page_ids = profile_ids[offset:offset + page_size]
+    profiles = exclude_seen_profiles(
+        UserProfile.objects.filter(pk__in=page_ids), user_profile.id
+    ).in_bulk()
+    page = [
+        (profiles[profile_id], score)
+        for profile_id, score in zip(page_ids, scores[offset:offset + page_size])
+        if profile_id in profiles
+    ]
+    next_offset = offset + page_size if offset + page_size < len(profile_ids) else None
+    return page, snapshot_id, next_offset
@@ -1,3 +1,1730 @@
-from django.test import TestCase
+import datetime
+import random
+import uuid
 
-# Create your tests here.
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from rest_framework import renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.test import APIClient
+
+from . import json_codec
+
+from .features import as_features, decode_mask, load_profile_features, skill_mask
+from .matching_algorithm import (
+    TopK, calculate_compatibility_score, exclude_seen_profiles, get_top_suggestions,
+    rank_candidates_python
+)
+from .score_cache import cached_compatibility_score, get_pair_score_cache
+from .suggestions import get_suggestions, pending_profile_changes
+from .models import (
+    DEVELOPER_TYPES, TEAMMATE_PREFERENCES, UserProfile, Like, Match, ChatMessage, MatchSuggestion,
+    SuggestedProfile, Skill
+)
+
+AVAILABILITY_CHOICES = ['part-time', 'full-time', 'weekends', 'flexible']
+
+
+def create_skills(count=12):
+    return [
+        Skill.objects.create(name=f'Skill {i}', slug=f'skill-{i}')
+        for i in range(count)
+    ]
+
+
+def create_profile(username, skills=(), looking_for=(), **fields):
+    user = User.objects.create(username=username, first_name=username.title())
+    profile = UserProfile.objects.create(user=user, **fields)
+    profile.skills.set(skills)
+    profile.looking_for.set(looking_for)
+    return profile
+
+
+def create_population(skills, count, seed=0, prefix='user'):
+    """Create `count` profiles with random skills and preferences"""
+    rng = random.Random(seed)
+    profiles = []
+    for i in range(count):
+        profiles.append(create_profile(
+            f'{prefix}{i}',
+            skills=rng.sample(skills, rng.randint(0, 5)),
+            looking_for=rng.sample(skills, rng.randint(0, 4)),
+            developer_type=rng.choice(DEVELOPER_TYPES)[0],
+            teammate_preference=rng.choice(TEAMMATE_PREFERENCES)[0],
+            availability=rng.choice(AVAILABILITY_CHOICES),
+            years_of_experience=rng.randint(0, 15),
+        ))
+    return profiles
+
+
+class ScoringEngineParityTests(TestCase):
+    """The NumPy engine must reproduce the Python engine exactly"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.skills = create_skills()
+        cls.profiles = create_population(cls.skills, 40)
+        Match.objects.create(user1=cls.profiles[0], user2=cls.profiles[5])
+
+    def test_same_scores_and_order(self):
+        for profile in self.profiles[:10]:
+            with override_settings(MATCHING_ENGINE='python'):
+                expected = get_top_suggestions(profile, limit=15)
+            with override_settings(MATCHING_ENGINE='numpy'):
+                actual = get_top_suggestions(profile, limit=15)
+            self.assertEqual(
+                [(p.id, score) for p, score in actual],
+                [(p.id, score) for p, score in expected],
+            )
+
+    def test_matrix_matches_pairwise_scores(self):
+        from .matching_numpy import ProfileArrays, compatibility_matrix
+
+        profiles = list(UserProfile.objects.prefetch_related('skills', 'looking_for'))
+        features = load_profile_features()
+        matrix = compatibility_matrix(
+            ProfileArrays(features[p.id] for p in profiles), slice(None)
+        )
+        for i, first in enumerate(profiles[:8]):
+            for j, second in enumerate(profiles):
+                self.assertEqual(matrix[i, j], calculate_compatibility_score(first, second))
+
+    def test_excludes_matched_users(self):
+        with override_settings(MATCHING_ENGINE='numpy'):
+            suggestions = get_top_suggestions(self.profiles[0], limit=100)
+        suggested_ids = {p.id for p, _ in suggestions}
+        self.assertNotIn(self.profiles[5].id, suggested_ids)
+        self.assertNotIn(self.profiles[0].id, suggested_ids)
+
+    @override_settings(MATCHING_ENGINE='fortran')
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            get_top_suggestions(self.profiles[0])
+
+
+class SqlEngineParityTests(TestCase):
+    """The SQL engine must reproduce the Python engine exactly"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.skills = create_skills()
+        cls.profiles = create_population(cls.skills, 40, seed=5)
+        cls.profiles.append(create_profile('empty', developer_type='other', availability='flexible'))
+        Match.objects.create(user1=cls.profiles[0], user2=cls.profiles[5])
+        Like.objects.create(liker=cls.profiles[0], liked=cls.profiles[6])
+        cls.features = load_profile_features()
+
+    def candidates(self, profile):
+        return exclude_seen_profiles(UserProfile.objects.exclude(id=profile.id), profile.id)
+
+    def test_same_scores_and_order(self):
+        from .matching_sql import rank_candidates_sql
+
+        for profile in self.profiles[:10] + self.profiles[-1:]:
+            features = self.features[profile.id]
+            self.assertEqual(
+                rank_candidates_sql(features, self.candidates(profile), 15),
+                rank_candidates_python(features, self.candidates(profile), 15),
+            )
+
+    def test_scores_match_pairwise(self):
+        from .matching_sql import rank_candidates_sql
+
+        for profile in self.profiles[:5]:
+            ranked = rank_candidates_sql(self.features[profile.id], UserProfile.objects.all(), 100)
+            self.assertEqual(
+                {profile_id for profile_id, _ in ranked},
+                {other.id for other in self.profiles
+                 if calculate_compatibility_score(profile, other) > 0},
+            )
+            for profile_id, score in ranked:
+                self.assertEqual(
+                    score, calculate_compatibility_score(self.features[profile.id], self.features[profile_id])
+                )
+
+    def test_sliced_candidates(self):
+        from .matching_sql import rank_candidates_sql
+
+        profile = self.profiles[0]
+        pool = self.candidates(profile)[:12]
+        self.assertEqual(
+            rank_candidates_sql(self.features[profile.id], pool, 5),
+            rank_candidates_python(self.features[profile.id], pool, 5),
+        )
+
+    @override_settings(MATCHING_CANDIDATES='index', MATCHING_FALLBACK_POOL=10)
+    def test_engine_setting(self):
+        # Scored in the database on PostgreSQL, by the Python engine elsewhere
+        for profile in self.profiles[:3]:
+            with override_settings(MATCHING_ENGINE='python'):
+                expected = get_top_suggestions(profile, limit=10)
+            with override_settings(MATCHING_ENGINE='sql'):
+                actual = get_top_suggestions(profile, limit=10)
+            self.assertEqual(
+                [(p.id, score) for p, score in actual],
+                [(p.id, score) for p, score in expected],
+            )
+
+
+class ProfileFeaturesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.skills = create_skills()
+        cls.profiles = create_population(cls.skills, 20, seed=1)
+
+    def test_bulk_load_uses_constant_queries(self):
+        with self.assertNumQueries(1):
+            features = load_profile_features()
+        self.assertEqual(len(features), 20)
+        with self.assertNumQueries(1):
+            load_profile_features(UserProfile.objects.filter(pk__in=[p.pk for p in self.profiles[:3]]))
+
+    def test_snapshot_matches_profile(self):
+        profile = self.profiles[3]
+        snapshot = load_profile_features()[profile.id]
+        self.assertEqual(
+            snapshot.skills,
+            sum(1 << skill.id for skill in profile.skills.all()),
+        )
+        self.assertEqual(snapshot.skill_count, profile.skills.count())
+        self.assertEqual(snapshot.looking_count, profile.looking_for.count())
+        self.assertFalse(hasattr(snapshot, '__dict__'))
+
+    def test_score_accepts_profiles_or_snapshots(self):
+        features = load_profile_features()
+        for first in self.profiles[:5]:
+            for second in self.profiles:
+                self.assertEqual(
+                    calculate_compatibility_score(features[first.id], features[second.id]),
+                    calculate_compatibility_score(first, second),
+                )
+        with self.assertNumQueries(0):
+            calculate_compatibility_score(features[self.profiles[0].id], features[self.profiles[1].id])
+
+    def test_known_score(self):
+        frontend, backend = self.skills[:2]
+        alice = create_profile(
+            'alice', skills=[frontend], looking_for=[backend],
+            developer_type='frontend', teammate_preference='backend',
+            availability='full-time', years_of_experience=4,
+        )
+        bob = create_profile(
+            'bob', skills=[backend], looking_for=[frontend],
+            developer_type='backend', teammate_preference='frontend',
+            availability='part-time', years_of_experience=6,
+        )
+        # 0 overlap, full complementarity (35), type (15), partial availability (7.5), experience (10)
+        self.assertAlmostEqual(calculate_compatibility_score(alice, bob), 67.5)
+
+
+class SkillMaskTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.skills = create_skills(10)
+        cls.profile = create_profile('masked', skills=cls.skills[:3], looking_for=cls.skills[8:])
+
+    def assertMasks(self, profile, skills, looking_for):
+        stored = UserProfile.objects.get(pk=profile.pk)
+        for instance in (profile, stored):
+            self.assertEqual(decode_mask(instance.skills_mask), skill_mask(s.id for s in skills))
+            self.assertEqual(decode_mask(instance.looking_for_mask), skill_mask(s.id for s in looking_for))
+
+    def test_masks_follow_m2m_changes(self):
+        profile = self.profile
+        self.assertMasks(profile, self.skills[:3], self.skills[8:])
+        profile.skills.remove(self.skills[0])
+        profile.looking_for.add(self.skills[5])
+        self.assertMasks(profile, self.skills[1:3], [self.skills[5], *self.skills[8:]])
+        profile.skills.clear()
+        profile.looking_for.set([self.skills[4]])
+        self.assertMasks(profile, [], [self.skills[4]])
+
+    def test_masks_follow_changes_from_the_skill_side(self):
+        self.skills[6].users_with_skill.add(self.profile)
+        self.skills[8].users_looking_for_skill.remove(self.profile)
+        self.assertMasks(
+            UserProfile.objects.get(pk=self.profile.pk), [*self.skills[:3], self.skills[6]], self.skills[9:]
+        )
+
+    def test_clearing_from_the_skill_side(self):
+        other = create_profile('other', skills=self.skills[:2], looking_for=self.skills[9:])
+        before = UserProfile.objects.get(pk=self.profile.pk).updated_at
+        self.skills[0].users_with_skill.clear()
+        self.skills[9].users_looking_for_skill.clear()
+        self.assertMasks(UserProfile.objects.get(pk=self.profile.pk), self.skills[1:3], self.skills[8:9])
+        self.assertMasks(UserProfile.objects.get(pk=other.pk), self.skills[1:2], [])
+        # A skill change is a new profile version for the score caches
+        self.assertGreater(UserProfile.objects.get(pk=self.profile.pk).updated_at, before)
+
+    def test_deleting_a_skill_clears_its_bit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.skills[1].delete()
+        self.assertMasks(
+            UserProfile.objects.get(pk=self.profile.pk), [self.skills[0], self.skills[2]], self.skills[8:]
+        )
+
+    def test_features_read_from_the_row(self):
+        profile = UserProfile.objects.get(pk=self.profile.pk)
+        with self.assertNumQueries(0):
+            features = as_features(profile)
+        self.assertEqual(features.skills, skill_mask(s.id for s in self.skills[:3]))
+        self.assertEqual(features.looking_count, 2)
+
+    def test_create_profile_stores_masks(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='new'))
+        response = client.post('/api/v1/profiles/create_profile/', {
+            'skills_ids': [self.skills[2].id, self.skills[7].id],
+            'looking_for_ids': [self.skills[0].id],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertMasks(
+            UserProfile.objects.get(pk=response.json()['id']), [self.skills[2], self.skills[7]], self.skills[:1]
+        )
+
+    def test_rebuild_command(self):
+        UserProfile.objects.filter(pk=self.profile.pk).update(skills_mask=b'', looking_for_mask=b'\x01')
+        out = StringIO()
+        call_command('rebuild_skill_masks', check=True, stdout=out)
+        self.assertIn('1 of 1 profiles have out of date skill masks', out.getvalue())
+
+        call_command('rebuild_skill_masks', stdout=out)
+        self.assertMasks(UserProfile.objects.get(pk=self.profile.pk), self.skills[:3], self.skills[8:])
+        out = StringIO()
+        call_command('rebuild_skill_masks', check=True, stdout=out)
+        self.assertIn('All 1 profiles have current skill masks', out.getvalue())
+
+
+class SkillIndexCandidateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.python, cls.react, cls.docker, cls.swift = create_skills(4)
+        cls.user = create_profile('user', skills=[cls.python], looking_for=[cls.react])
+        cls.shares = create_profile('shares', skills=[cls.python])
+        cls.supplies = create_profile('supplies', skills=[cls.react])
+        cls.wants = create_profile('wants', looking_for=[cls.python])
+        cls.unrelated = create_profile('unrelated', skills=[cls.docker], looking_for=[cls.swift])
+
+    def suggested_ids(self, limit=10):
+        return {p.id for p, _ in get_top_suggestions(self.user, limit=limit)}
+
+    @override_settings(MATCHING_CANDIDATES='index', MATCHING_FALLBACK_POOL=0)
+    def test_index_prunes_unrelated_profiles(self):
+        self.assertEqual(
+            self.suggested_ids(),
+            {self.shares.id, self.supplies.id, self.wants.id},
+        )
+
+    @override_settings(MATCHING_CANDIDATES='index', MATCHING_FALLBACK_POOL=10)
+    def test_fallback_fills_short_results(self):
+        self.assertIn(self.unrelated.id, self.suggested_ids(limit=4))
+        self.assertNotIn(self.unrelated.id, self.suggested_ids(limit=3))
+
+    @override_settings(MATCHING_CANDIDATES='all')
+    def test_all_candidates(self):
+        self.assertIn(self.unrelated.id, self.suggested_ids())
+
+    @override_settings(MATCHING_CANDIDATES='index', MATCHING_FALLBACK_POOL=10)
+    def test_engines_agree_with_fallback(self):
+        with override_settings(MATCHING_ENGINE='python'):
+            expected = get_top_suggestions(self.user, limit=10)
+        with override_settings(MATCHING_ENGINE='numpy'):
+            actual = get_top_suggestions(self.user, limit=10)
+        self.assertEqual(
+            [(p.id, score) for p, score in actual],
+            [(p.id, score) for p, score in expected],
+        )
+
+
+class SuggestionExclusionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.skills = create_skills()
+        cls.profiles = create_population(cls.skills, 10, seed=2)
+        cls.user = cls.profiles[0]
+        Match.objects.create(user1=cls.profiles[1], user2=cls.user)
+        Match.objects.create(user1=cls.user, user2=cls.profiles[2])
+        Like.objects.create(liker=cls.user, liked=cls.profiles[3])
+        Like.objects.create(liker=cls.profiles[4], liked=cls.user)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            get_top_suggestions(self.user, limit=3)
+        return len(queries)
+
+    @override_settings(MATCHING_CANDIDATES='all')
+    def test_excludes_matched_and_liked(self):
+        for engine in ('python', 'numpy'):
+            with override_settings(MATCHING_ENGINE=engine):
+                suggested_ids = {p.id for p, _ in get_top_suggestions(self.user, limit=100)}
+            self.assertEqual(
+                suggested_ids,
+                {p.id for p in self.profiles} - {p.id for p in self.profiles[:4]},
+            )
+
+    @override_settings(MATCHING_CANDIDATES='index', MATCHING_FALLBACK_POOL=0)
+    def test_query_count_constant_as_profiles_grow(self):
+        for engine in ('python', 'numpy'):
+            with override_settings(MATCHING_ENGINE=engine):
+                before = self.count_queries()
+                grown = create_population(self.skills, 30, seed=3, prefix=engine)
+                Match.objects.create(user1=self.user, user2=grown[0])
+                Like.objects.create(liker=self.user, liked=grown[1])
+                self.assertEqual(self.count_queries(), before)
+
+
+class StreamingTopKTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.skills = create_skills(6)
+        cls.profiles = create_population(cls.skills, 30, seed=4)
+
+    def test_topk_is_bounded_and_breaks_ties_by_position(self):
+        top = TopK(3)
+        for position, score in enumerate([5, 9, 7, 9, 1, 7, 9]):
+            top.push(score, position, position)
+            self.assertLessEqual(len(top), 3)
+        self.assertEqual(top.results(), [(1, 9), (3, 9), (6, 9)])
+        self.assertEqual(TopK(0).results(), [])
+
+    @override_settings(MATCHING_CANDIDATES='all')
+    def test_chunk_size_does_not_change_results(self):
+        user = self.profiles[0]
+        for engine in ('python', 'numpy'):
+            with override_settings(MATCHING_ENGINE=engine, MATCHING_CHUNK_SIZE=2000):
+                expected = get_top_suggestions(user, limit=12)
+            with override_settings(MATCHING_ENGINE=engine, MATCHING_CHUNK_SIZE=4):
+                actual = get_top_suggestions(user, limit=12)
+            self.assertEqual(
+                [(p.id, score) for p, score in actual],
+                [(p.id, score) for p, score in expected],
+            )
+            scores = [score for _, score in actual]
+            self.assertEqual(scores, sorted(scores, reverse=True))
+
+    @override_settings(MATCHING_CANDIDATES='all', MATCHING_ENGINE='python')
+    def test_matches_full_sort(self):
+        features = load_profile_features()
+        user = self.profiles[0]
+        ordered = list(UserProfile.objects.exclude(pk=user.pk))
+        expected = sorted(
+            ((p.id, calculate_compatibility_score(features[user.id], features[p.id])) for p in ordered),
+            key=lambda x: x[1], reverse=True,
+        )[:10]
+        self.assertEqual(
+            [(p.id, score) for p, score in get_top_suggestions(user, limit=10)],
+            expected,
+        )
+
+
+@override_settings(SUGGESTION_CACHE_SIZE=10, SUGGESTION_CACHE_TTL=3600)
+class SuggestionCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.skills = create_skills()
+        cls.profiles = create_population(cls.skills, 12, seed=5)
+        cls.user = cls.profiles[0]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user.user)
+
+    def get_suggestions(self):
+        response = self.client.get('/api/v1/profiles/suggestions/')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_second_request_is_served_from_cache(self):
+        first = self.get_suggestions()
+        self.assertEqual(first['X-Suggestions-Cache'], 'miss')
+        second = self.get_suggestions()
+        self.assertEqual(second['X-Suggestions-Cache'], 'hit')
+        self.assertEqual(second.json(), first.json())
+
+        stored = MatchSuggestion.objects.get(user=self.user)
+        expected = get_top_suggestions(self.user, limit=10)
+        self.assertEqual(
+            [(e.profile_id, e.compatibility_score) for e in stored.entries.all()],
+            [(p.id, score) for p, score in expected],
+        )
+
+    @override_settings(SUGGESTION_INCREMENTAL_UPDATES=False)
+    def test_profile_update_invalidates(self):
+        self.get_suggestions()
+        other = self.profiles[3]
+        other.years_of_experience += 1
+        other.save()
+        self.assertEqual(self.get_suggestions()['X-Suggestions-Cache'], 'miss')
+
+    def test_new_like_invalidates(self):
+        suggested_id = self.get_suggestions().json()[0]['id']
+        Like.objects.create(liker=self.user, liked_id=suggested_id)
+        response = self.get_suggestions()
+        self.assertEqual(response['X-Suggestions-Cache'], 'miss')
+        self.assertNotIn(suggested_id, [p['id'] for p in response.json()])
+
+    def test_new_match_invalidates(self):
+        suggested_id = self.get_suggestions().json()[0]['id']
+        Match.objects.create(user1=self.user, user2_id=suggested_id)
+        self.assertEqual(self.get_suggestions()['X-Suggestions-Cache'], 'miss')
+
+    @override_settings(SUGGESTION_CACHE_TTL=0)
+    def test_ttl_expires(self):
+        self.get_suggestions()
+        self.assertEqual(self.get_suggestions()['X-Suggestions-Cache'], 'miss')
+
+
+@override_settings(
+    SUGGESTION_CACHE_SIZE=5, SUGGESTION_CACHE_TTL=3600, SUGGESTION_INCREMENTAL_UPDATES=True
+)
+class IncrementalSuggestionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.skills = create_skills()
+        cls.profiles = create_population(cls.skills, 25, seed=6)
+
+    def build_lists(self):
+        for profile in self.profiles[:15]:
+            get_suggestions(profile, limit=5)
+
+    def assert_lists_consistent(self):
+        """Every stored list must hold the true top-N scores"""
+        features = load_profile_features()
+        for suggestion in MatchSuggestion.objects.all():
+            entries = list(suggestion.entries.all())
+            user = features[suggestion.user_id]
+            for entry in entries:
+                self.assertEqual(
+                    entry.compatibility_score,
+                    calculate_compatibility_score(user, features[entry.profile_id]),
+                )
+            expected = get_top_suggestions(suggestion.user, limit=5)
+            self.assertEqual(
+                [e.compatibility_score for e in entries],
+                [score for _, score in expected],
+            )
+
+    def change_skills(self, profile, skills, looking_for):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                profile.skills.set(skills)
+                profile.looking_for.set(looking_for)
+
+    @override_settings(MATCHING_CANDIDATES='all')
+    def test_skill_change_is_patched_into_lists(self):
+        self.build_lists()
+        for i, profile in enumerate(self.profiles[10:20]):
+            self.change_skills(profile, self.skills[i:i + 4], self.skills[i + 1:i + 2])
+            self.assert_lists_consistent()
+        self.assertTrue(MatchSuggestion.objects.exists())
+
+    @override_settings(MATCHING_CANDIDATES='index', MATCHING_FALLBACK_POOL=0)
+    def test_skill_change_with_index_candidates(self):
+        self.build_lists()
+        for i, profile in enumerate(self.profiles[5:12]):
+            self.change_skills(profile, self.skills[i:i + 3], self.skills[i + 3:i + 5])
+            self.assert_lists_consistent()
+
+    @override_settings(MATCHING_CANDIDATES='all')
+    def test_new_profile_enters_lists_without_full_rebuild(self):
+        self.build_lists()
+        target = self.profiles[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            newcomer = create_profile(
+                'newcomer', skills=target.looking_for.all(), looking_for=target.skills.all(),
+                developer_type=target.teammate_preference if target.teammate_preference != 'any' else 'backend',
+                teammate_preference='any', availability='flexible',
+                years_of_experience=target.years_of_experience,
+            )
+        self.assert_lists_consistent()
+        self.assertTrue(
+            MatchSuggestion.objects.get(user=target).entries.filter(profile=newcomer).exists()
+        )
+
+    def test_changed_profile_own_list_is_dropped(self):
+        self.build_lists()
+        profile = self.profiles[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.years_of_experience += 10
+            profile.save()
+        self.assertFalse(MatchSuggestion.objects.filter(user=profile).exists())
+        _, cache_hit = get_suggestions(self.profiles[1], limit=5)
+        self.assertTrue(cache_hit)
+
+    @override_settings(MATCHING_CANDIDATES='all', SUGGESTION_INCREMENTAL_MAX_HOLDERS=5)
+    def test_changes_past_the_holder_cap_wait_for_the_command(self):
+        # The population was created without its commit hooks running
+        call_command('apply_suggestion_updates', stdout=StringIO())
+        self.build_lists()
+        profile = self.profiles[20]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.change_skills(profile, self.skills[:4], self.skills[4:6])
+        self.assertTrue(pending_profile_changes().filter(pk=profile.pk).exists())
+        # Lists cannot be trusted until the change is patched in
+        _, cache_hit = get_suggestions(self.profiles[1], limit=5)
+        self.assertFalse(cache_hit)
+
+        call_command('apply_suggestion_updates', stdout=StringIO())
+        self.assertFalse(pending_profile_changes().exists())
+        self.assert_lists_consistent()
+        _, cache_hit = get_suggestions(self.profiles[2], limit=5)
+        self.assertTrue(cache_hit)
+
+
+class CreateProfileSuggestionUpdateTests(TransactionTestCase):
+
+    def test_one_update_per_request(self):
+        user = User.objects.create(username='fresh', first_name='Fresh')
+        skills = create_skills(4)
+        client = APIClient()
+        client.force_authenticate(user)
+        with mock.patch('api.suggestions.update_suggestions_for_profile') as update:
+            response = client.post('/api/v1/profiles/create_profile/', {
+                'bio': 'New here',
+                'skills_ids': [skill.id for skill in skills[:2]],
+                'looking_for_ids': [skills[3].id],
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        update.assert_called_once_with(response.json()['id'])
+
+
+class RebuildSuggestionsCommandTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.skills = create_skills()
+        cls.profiles = create_population(cls.skills, 30, seed=8)
+        Match.objects.create(user1=cls.profiles[0], user2=cls.profiles[1])
+        Like.objects.create(liker=cls.profiles[2], liked=cls.profiles[3])
+        admin = create_profile('admin', skills=cls.skills[:3])
+        cls.admin = admin
+
+    def rebuild(self, **options):
+        out = StringIO()
+        call_command('rebuild_suggestions', stdout=out, limit=6, **options)
+        return out.getvalue()
+
+    def assert_matches_live_ranking(self):
+        for profile in UserProfile.objects.all():
+            stored = MatchSuggestion.objects.get(user=profile).entries.all()
+            self.assertEqual(
+                [(e.profile_id, e.compatibility_score) for e in stored],
+                [(p.id, score) for p, score in get_top_suggestions(profile, limit=6)],
+            )
+
+    @override_settings(MATCHING_CANDIDATES='all')
+    def test_blocked_rebuild_matches_get_top_suggestions(self):
+        self.rebuild(block_size=7, workers=1)
+        self.assert_matches_live_ranking()
+        self.assertFalse(SuggestedProfile.objects.filter(profile=self.admin).exists())
+
+    @override_settings(MATCHING_CANDIDATES='index', MATCHING_FALLBACK_POOL=3)
+    def test_rebuild_with_index_candidates_and_fallback(self):
+        self.rebuild(block_size=64, workers=1)
+        self.assert_matches_live_ranking()
+
+    @override_settings(
+        MATCHING_CANDIDATES='lsh', MATCHING_FALLBACK_POOL=3,
+        MATCHING_LSH_BANDS=4, MATCHING_LSH_ROWS=2, MATCHING_LSH_REFRESH=0
+    )
+    def test_rebuild_with_lsh_candidates(self):
+        self.rebuild(block_size=8, workers=1)
+        self.assert_matches_live_ranking()
+
+    @override_settings(MATCHING_CANDIDATES='all')
+    def test_parallel_rebuild_and_check(self):
+        output = self.rebuild(block_size=5, workers=2)
+        self.assertIn('users/s', output)
+        self.assert_matches_live_ranking()
+        self.assertIn('0 stored lists differ, 0 missing', self.rebuild(check=True, workers=1))
+
+        SuggestedProfile.objects.filter(suggestion__user=self.profiles[4]).delete()
+        MatchSuggestion.objects.filter(user=self.profiles[5]).delete()
+        self.assertIn('1 stored lists differ, 1 missing', self.rebuild(check=True, workers=1))
+
+
+@override_settings(
+    PAIR_SCORE_CACHE_SIZE=100,
+    PAIR_SCORE_CACHE_ALIAS=None,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class PairScoreCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.skills = create_skills()
+        cls.first, cls.second, cls.third = create_population(cls.skills, 3, seed=9)
+
+    def setUp(self):
+        get_pair_score_cache().clear()
+        caches['default'].clear()
+
+    def test_symmetric_hits_and_misses(self):
+        cache = get_pair_score_cache()
+        score = cached_compatibility_score(self.first, self.second)
+        self.assertEqual(score, calculate_compatibility_score(self.first, self.second))
+        self.assertEqual(cached_compatibility_score(self.second, self.first), score)
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (1, 1, 1))
+
+    def test_hit_makes_no_queries(self):
+        cached_compatibility_score(self.first, self.second)
+        with self.assertNumQueries(0):
+            cached_compatibility_score(self.first, self.second)
+
+    def test_version_change_misses(self):
+        cached_compatibility_score(self.first, self.second)
+        self.first.skills.set(self.skills[:1])
+        self.assertEqual(
+            cached_compatibility_score(self.first, self.second),
+            calculate_compatibility_score(self.first, self.second),
+        )
+        self.assertEqual(get_pair_score_cache().stats()['misses'], 2)
+
+    def test_lru_is_bounded(self):
+        with override_settings(PAIR_SCORE_CACHE_SIZE=1):
+            cached_compatibility_score(self.first, self.second)
+            cached_compatibility_score(self.first, self.third)
+            self.assertEqual(get_pair_score_cache().stats()['size'], 1)
+
+    def test_shared_tier(self):
+        with override_settings(PAIR_SCORE_CACHE_ALIAS='default'):
+            cached_compatibility_score(self.first, self.second)
+            get_pair_score_cache().local.clear()
+            cached_compatibility_score(self.first, self.second)
+            stats = get_pair_score_cache().stats()
+            self.assertEqual((stats['shared_hits'], stats['misses']), (1, 1))
+
+    def test_formula_change_misses_shared_tier(self):
+        from . import score_cache
+
+        with override_settings(PAIR_SCORE_CACHE_ALIAS='default'):
+            cached_compatibility_score(self.first, self.second)
+            get_pair_score_cache().local.clear()
+            with mock.patch.object(score_cache, 'score_version', return_value='next-formula'):
+                cached_compatibility_score(self.first, self.second)
+            stats = get_pair_score_cache().stats()
+            self.assertEqual((stats['shared_hits'], stats['misses']), (0, 2))
+
+    @override_settings(MATCHING_ENGINE='python', MATCHING_CANDIDATES='all')
+    def test_suggestions_reuse_cached_scores(self):
+        get_top_suggestions(self.first)
+        misses = get_pair_score_cache().stats()['misses']
+        get_top_suggestions(self.first)
+        self.assertEqual(get_pair_score_cache().stats()['misses'], misses)
+
+
+class ScoringTablesTests(TestCase):
+    """Lookup tables must reproduce the original categorical rules"""
+
+    def test_tables_are_consistent(self):
+        from .scoring_tables import check_tables
+
+        self.assertEqual(check_tables(), [])
+
+    def test_every_categorical_combination(self):
+        from .features import ProfileFeatures
+
+        def original(preference1, type1, preference2, type2, availability1, availability2, diff):
+            type_score = 0
+            if preference1 == 'any' or preference1 == type2:
+                type_score += 50
+            if preference2 == 'any' or preference2 == type1:
+                type_score += 50
+            if availability1 == availability2 or 'flexible' in (availability1, availability2):
+                availability_score = 100
+            else:
+                availability_score = 50
+            experience_score = 100 if diff <= 3 else 75 if diff <= 7 else 50
+            return type_score * 0.15 + availability_score * 0.15 + experience_score * 0.10
+
+        types = [value for value, _ in DEVELOPER_TYPES]
+        preferences = [value for value, _ in TEAMMATE_PREFERENCES]
+        for preference1 in preferences:
+            for type2 in types:
+                for availability1 in AVAILABILITY_CHOICES:
+                    for availability2 in AVAILABILITY_CHOICES:
+                        for diff in (0, 3, 4, 7, 8, 20):
+                            first = ProfileFeatures.from_values(1, 'fullstack', preference1, availability1, 0)
+                            second = ProfileFeatures.from_values(2, type2, 'any', availability2, diff)
+                            self.assertEqual(
+                                calculate_compatibility_score(first, second),
+                                original(preference1, 'fullstack', 'any', type2, availability1, availability2, diff),
+                            )
+
+    def test_unknown_value_extends_tables(self):
+        from .features import ProfileFeatures
+        from .matching_numpy import ProfileArrays, compatibility_matrix
+
+        first = ProfileFeatures.from_values(1, 'data-science', 'data-science', 'evenings', 2)
+        second = ProfileFeatures.from_values(2, 'data-science', 'backend', 'flexible', 2)
+        # Preference accepted one way only (7.5), flexible (15), experience (10)
+        self.assertAlmostEqual(calculate_compatibility_score(first, second), 32.5)
+        matrix = compatibility_matrix(ProfileArrays([first, second]), slice(None))
+        self.assertEqual(matrix[0, 1], calculate_compatibility_score(first, second))
+
+    def test_new_code_is_published_after_the_tables_grow(self):
+        from .scoring_tables import AVAILABILITY_CODES, TYPE_CODES, tables
+
+        rebuild = tables.rebuild
+        seen_during_rebuild = []
+
+        def observed_rebuild(**codes):
+            # What a concurrent reader could see while the tables are rebuilt
+            seen_during_rebuild.append(('night-owl' in AVAILABILITY_CODES, 'quant' in TYPE_CODES))
+            rebuild(**codes)
+
+        with mock.patch.object(tables, 'rebuild', observed_rebuild):
+            availability = tables.encode(AVAILABILITY_CODES, 'night-owl')
+            developer_type = tables.encode(TYPE_CODES, 'quant')
+        self.assertEqual(seen_during_rebuild, [(False, False), (True, False)])
+        self.assertEqual(tables.availability[availability, availability], 100)
+        self.assertEqual(tables.preference[developer_type, developer_type], 50)
+        self.assertEqual(tables.preference.shape, (len(TYPE_CODES), len(TYPE_CODES)))
+
+
+@override_settings(MATCHING_LSH_BANDS=32, MATCHING_LSH_ROWS=1, MATCHING_LSH_REFRESH=0, MATCHING_ENGINE='python')
+class LSHCandidateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.skills = create_skills()
+        cls.profiles = create_population(cls.skills, 40, seed=4)
+
+    def setUp(self):
+        from .lsh_index import reset_lsh_index
+
+        reset_lsh_index('MATCHING_LSH_BANDS')
+
+    def test_candidates_are_index_candidates(self):
+        from .lsh_index import get_lsh_index
+        from .skill_index import SkillIndex
+
+        features = load_profile_features()
+        index = get_lsh_index()
+        for profile in self.profiles:
+            for candidate_id in index.candidates(features[profile.id]) - {profile.id}:
+                self.assertTrue(SkillIndex.is_candidate(features[profile.id], features[candidate_id]))
+
+    def test_perfect_complement_is_always_found(self):
+        from .lsh_index import get_lsh_index
+
+        user = create_profile('user', skills=self.skills[:2], looking_for=self.skills[2:4])
+        partner = create_profile('partner', skills=self.skills[:4], looking_for=self.skills[:2])
+        features = load_profile_features()
+        self.assertIn(partner.id, get_lsh_index().candidates(features[user.id]))
+
+    @override_settings(MATCHING_FALLBACK_POOL=0)
+    def test_scores_are_exact(self):
+        for profile in self.profiles[:10]:
+            for other, score in get_top_suggestions(profile, limit=5, source='lsh'):
+                self.assertEqual(score, calculate_compatibility_score(profile, other))
+
+    @override_settings(MATCHING_FALLBACK_POOL=5)
+    def test_candidates_are_ranked_in_bounded_batches(self):
+        import re
+        from .matching_algorithm import rank_suggestions
+
+        profile = self.profiles[0]
+        expected = rank_suggestions(profile, limit=8, source='lsh')
+        with override_settings(MATCHING_CHUNK_SIZE=4), CaptureQueriesContext(connection) as context:
+            ranked = rank_suggestions(profile, limit=8, source='lsh')
+        self.assertEqual(sorted(score for _, score in ranked), sorted(score for _, score in expected))
+        sql = ' '.join(query['sql'] for query in context.captured_queries)
+        id_lists = re.findall(r'"api_userprofile"\."id" IN \(([^()]*)\)', sql)
+        self.assertTrue(id_lists)
+        self.assertLessEqual(max(len(ids.split(',')) for ids in id_lists), 4)
+
+    def test_changed_profile_is_rehashed(self):
+        from .lsh_index import get_lsh_index
+
+        user = create_profile('user', skills=self.skills[:1])
+        partner = create_profile('partner', skills=self.skills[11:])
+        features = load_profile_features()
+        self.assertNotIn(partner.id, get_lsh_index().candidates(features[user.id]))
+
+        partner.skills.set(self.skills[:1])
+        self.assertIn(partner.id, get_lsh_index().candidates(features[user.id]))
+
+    def test_recall_report(self):
+        out = StringIO()
+        call_command('matching_recall', sample=10, limit=5, stdout=out)
+        self.assertIn('recall@5 over 10 users', out.getvalue())
+
+
+@override_settings(SUGGESTION_FEED_SIZE=25, MATCHING_CANDIDATES='all')
+class SuggestionFeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.skills = create_skills()
+        cls.profiles = create_population(cls.skills, 40, seed=6)
+        cls.user = cls.profiles[0]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user.user)
+
+    def get_page(self, url='/api/v1/profiles/suggestions_feed/?page_size=10'):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_follow_the_ranking(self):
+        expected = [(p.id, round(score, 2)) for p, score in get_top_suggestions(self.user, limit=25)]
+        pages = [self.get_page()]
+        while pages[-1]['next']:
+            pages.append(self.get_page(pages[-1]['next']))
+        self.assertEqual([len(page['results']) for page in pages], [10, 10, 5])
+        self.assertEqual(
+            [(item['id'], item['compatibility_score']) for page in pages for item in page['results']],
+            expected,
+        )
+
+    def test_later_pages_come_from_the_snapshot(self):
+
+        first = self.get_page()
+        expected = [p.id for p, _ in get_top_suggestions(self.user, limit=25)][10:20]
+        # A profile change would reorder a fresh ranking
+        self.profiles[-1].skills.set(self.user.looking_for.all())
+        with mock.patch('api.suggestions.rank_suggestions') as rank:
+            second = self.get_page(first['next'])
+        rank.assert_not_called()
+        self.assertEqual([item['id'] for item in second['results']], expected)
+
+    def test_liked_profiles_are_left_out(self):
+        first = self.get_page()
+        expected = [p.id for p, _ in get_top_suggestions(self.user, limit=25)][10:20]
+        Like.objects.create(liker=self.user, liked_id=expected[0])
+        second = self.get_page(first['next'])
+        self.assertEqual([item['id'] for item in second['results']], expected[1:])
+
+    def test_invalid_or_expired_cursor(self):
+        from django.core.cache import cache
+
+        first = self.get_page()
+        cache.clear()
+        self.assertEqual(self.client.get(first['next']).status_code, 404)
+        response = self.client.get('/api/v1/profiles/suggestions_feed/?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+
+
+class BenchmarkMatchingCommandTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.skills = create_skills()
+
+    def test_reports_every_engine_and_rolls_back(self):
+        import json
+        import tempfile
+
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            call_command(
+                'benchmark_matching', sizes=[40], requests=3, candidates=['index', 'all'],
+                output=output.name, stdout=StringIO()
+            )
+            report = json.load(open(output.name))
+
+        runs = [r for r in report['results'] if r['benchmark'] == 'get_top_suggestions']
+        self.assertEqual(
+            sorted((r['engine'], r['candidates']) for r in runs),
+            [('numpy', 'all'), ('numpy', 'index'), ('python', 'all'), ('python', 'index')],
+        )
+        for run in runs:
+            self.assertEqual(set(run['latency_ms']), {'mean', 'p50', 'p90', 'p99', 'max'})
+            self.assertGreater(run['queries']['max'], 0)
+            self.assertGreater(run['peak_memory_bytes'], 0)
+        self.assertFalse(UserProfile.objects.exists())
+
+
+class BenchmarkSerializersCommandTests(TestCase):
+
+    def test_reports_each_serializer_and_rolls_back(self):
+        out = StringIO()
+        call_command('benchmark_serializers', rows=5, repeat=1, stdout=out)
+        for name in ('UserProfileListSerializer', 'MatchSerializer', 'ChatMessageSerializer'):
+            self.assertIn(f'{name}: ', out.getvalue())
+        self.assertFalse(UserProfile.objects.exists())
+        self.assertFalse(Skill.objects.exists())
+
+
+class QueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.skills = create_skills()
+        cls.profiles = create_population(cls.skills, 6, seed=7)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.profiles[0].user)
+
+    @override_settings(QUERY_BUDGET_HEADERS=True)
+    def test_headers_report_the_request_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/v1/profiles/me/')
+        self.assertEqual(int(response['X-DB-Queries']), len(context.captured_queries))
+        self.assertIn('X-DB-Time-Ms', response)
+        self.assertEqual(response['X-DB-Query-Budget'], '10')
+
+    @override_settings(QUERY_BUDGET_HEADERS=False)
+    def test_headers_off(self):
+        self.assertNotIn('X-DB-Queries', self.client.get('/api/v1/profiles/me/'))
+
+    def test_over_budget_fails_in_tests(self):
+        from .query_budget import QueryBudgetExceeded
+        from .views import UserProfileViewSet
+
+        with mock.patch.object(UserProfileViewSet, 'query_budgets', {'me': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/api/v1/profiles/me/')
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_over_budget_is_logged(self):
+        from .views import UserProfileViewSet
+
+        with mock.patch.object(UserProfileViewSet, 'query_budgets', {'me': 1}):
+            with self.assertLogs('api.query_budget', 'WARNING') as logs:
+                self.assertEqual(self.client.get('/api/v1/profiles/me/').status_code, 200)
+        self.assertIn('GET /api/v1/profiles/me/', logs.output[0])
+        self.assertIn('over its budget of 1', logs.output[0])
+
+    def test_websocket_messages_are_counted(self):
+        from asgiref.sync import async_to_sync
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+        from .consumers import ChatConsumer
+        from .routing import websocket_urlpatterns
+
+        match = Match.objects.create(user1=self.profiles[0], user2=self.profiles[1])
+
+        async def send_message():
+            communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/chat/{match.id}/')
+            communicator.scope['user'] = self.profiles[0].user
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await communicator.receive_json_from()
+            await communicator.send_json_to({'message': 'hello'})
+            reply = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return reply
+
+        with override_settings(DEBUG=False):
+            self.assertEqual(async_to_sync(send_message)()['type'], 'message')
+            with mock.patch.object(ChatConsumer, 'query_budget', 1):
+                with self.assertRaises(Exception) as raised:
+                    async_to_sync(send_message)()
+        self.assertIn('over its budget of 1', str(raised.exception))
+
+
+class QueryPlanTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.skills = create_skills()
+        cls.profiles = create_population(cls.skills, 25, seed=8)
+        cls.user = cls.profiles[0]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user.user)
+
+    def test_plans_follow_nested_serializers(self):
+        from .query_plans import query_plan
+        from .serializers import LikeSerializer, MatchSuggestionSerializer
+
+        plan = query_plan(LikeSerializer)
+        self.assertEqual(plan.select_related, ('liker__user', 'liked__user'))
+        self.assertEqual(plan.prefetch_related, ('liker__skills', 'liked__skills'))
+        plan = query_plan(MatchSuggestionSerializer)
+        self.assertEqual(plan.select_related, ('user__user',))
+        self.assertEqual(
+            plan.prefetch_related,
+            ('user__skills', 'suggested_users', 'suggested_users__user', 'suggested_users__skills'),
+        )
+
+    def add_related(self, profiles):
+        for profile in profiles:
+            Like.objects.create(liker=profile, liked=self.user)
+            Like.objects.create(liker=self.user, liked=profile)
+            match = Match.objects.create(user1=self.user, user2=profile)
+            ChatMessage.objects.create(match=match, sender=profile, message='hi')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_list_queries_do_not_grow_with_results(self):
+        urls = [
+            '/api/v1/profiles/', '/api/v1/likes/', '/api/v1/likes/likes_received/',
+            '/api/v1/likes/likes_given/', '/api/v1/matches/', '/api/v1/messages/',
+        ]
+        self.add_related(self.profiles[1:3])
+        few = [self.count_queries(url) for url in urls]
+        self.add_related(self.profiles[3:])
+        self.assertEqual([self.count_queries(url) for url in urls], few)
+
+    def test_like_lists_keep_relative_image_urls(self):
+        liker, liked = self.profiles[1], self.profiles[2]
+        UserProfile.objects.filter(pk__in=[liker.pk, liked.pk]).update(profile_image='profiles/me.png')
+        Like.objects.create(liker=liker, liked=self.user)
+        Like.objects.create(liker=self.user, liked=liked)
+        received = self.client.get('/api/v1/likes/likes_received/').json()
+        given = self.client.get('/api/v1/likes/likes_given/').json()
+        self.assertEqual(received[0]['liker_profile']['profile_image'], '/media/profiles/me.png')
+        self.assertEqual(given[0]['liked_profile']['profile_image'], '/media/profiles/me.png')
+
+    def test_suggestions_load_profiles_in_bulk(self):
+        with override_settings(SUGGESTION_CACHE_SIZE=4):
+            self.client.get('/api/v1/profiles/suggestions/')
+            # Profile, stored list, freshness checks (pending profile changes,
+            # likes, matches), entries, then one query each for the users and
+            # the skills of all listed profiles
+            with self.assertNumQueries(8):
+                response = self.client.get('/api/v1/profiles/suggestions/')
+        self.assertEqual(len(response.json()), 4)
+        for result in response.json():
+            self.assertIn('skills', result)
+            self.assertIn('first_name', result['user'])
+
+
+class FastSerializerParityTests(TestCase):
+    """Compiled list serializers must render exactly what DRF renders"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.profiles = create_population(create_skills(), 8, seed=9)
+        UserProfile.objects.filter(pk=cls.profiles[1].pk).update(
+            age=31, bio='Ships things', profile_image='profiles/me.png', github_url='https://github.com/me'
+        )
+        for profile in cls.profiles[1:5]:
+            match = Match.objects.create(user1=cls.profiles[0], user2=profile, compatibility_score=profile.id / 3)
+            message = ChatMessage.objects.create(match=match, sender=profile, message='hi')
+            if profile.id % 2:
+                match.mark_read(cls.profiles[0], message.pk)
+
+    def assertSameRendering(self, serializer_class, queryset):
+        from rest_framework.renderers import JSONRenderer
+        from rest_framework.serializers import ListSerializer
+        from rest_framework.test import APIRequestFactory
+        from .query_plans import plan_queryset
+
+        request = APIRequestFactory().get('/api/v1/')
+        for context in ({}, {'request': request}):
+            rows = list(plan_queryset(queryset, serializer_class))
+            compiled = serializer_class(rows, many=True, context=context).data
+            drf = ListSerializer(rows, child=serializer_class(), context=context).data
+            self.assertNotEqual(type(serializer_class(many=True)), ListSerializer)
+            self.assertEqual(JSONRenderer().render(compiled), JSONRenderer().render(drf))
+
+    def test_profiles(self):
+        from .serializers import UserProfileListSerializer
+
+        self.assertSameRendering(UserProfileListSerializer, UserProfile.objects.all())
+
+    def test_matches(self):
+        from django.utils import timezone
+        from .serializers import MatchSerializer
+
+        self.assertSameRendering(MatchSerializer, Match.objects.all())
+        with timezone.override('Asia/Kolkata'):
+            self.assertSameRendering(MatchSerializer, Match.objects.all())
+
+    def test_chat_messages(self):
+        from .serializers import ChatMessageSerializer
+
+        self.assertSameRendering(ChatMessageSerializer, ChatMessage.objects.all())
+
+    def test_nested_list(self):
+        from django.utils import timezone
+        from .serializers import MatchSuggestionSerializer, UserProfileListSerializer
+        from .suggestions import store_suggestions
+
+        store_suggestions(self.profiles[0], [(p, 1.0) for p in self.profiles[2:6]], timezone.now())
+        suggestion = MatchSuggestion.objects.get()
+        self.assertEqual(
+            MatchSuggestionSerializer(suggestion).data['suggested_users'],
+            [UserProfileListSerializer(p).data for p in suggestion.suggested_users.all()],
+        )
+
+
+class JSONCodecTests(TestCase):
+    DATA = {
+        'id': 7,
+        'score': 83.5,
+        'name': 'Zoë 🚀 \u2028 "quoted"',
+        'created_at': datetime.datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+        'offset_at': datetime.datetime(2024, 5, 1, 12, 30, tzinfo=datetime.timezone(datetime.timedelta(hours=5, minutes=30))),
+        'naive_at': datetime.datetime(2024, 5, 1, 12, 30),
+        'date': datetime.date(2024, 5, 1),
+        'amount': Decimal('12.50'),
+        'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'tags': ('a', 'b'),
+        'nested': [{'is_read': False, 'value': None}],
+    }
+
+    def test_renderer_matches_drf(self):
+        expected = renderers.JSONRenderer().render(self.DATA)
+        for codec in json_codec.JSON_CODECS:
+            with self.subTest(codec=codec), override_settings(JSON_CODEC=codec):
+                self.assertEqual(json_codec.get_codec().name, codec)
+                self.assertEqual(json_codec.JSONRenderer().render(self.DATA), expected)
+
+    def test_big_integers_match_drf(self):
+        data = {'big': 2 ** 70, 'negative': -2 ** 64, 'nested': [{'id': 2 ** 80}]}
+        expected = renderers.JSONRenderer().render(data)
+        for codec in json_codec.JSON_CODECS:
+            with self.subTest(codec=codec), override_settings(JSON_CODEC=codec):
+                self.assertEqual(json_codec.JSONRenderer().render(data), expected)
+
+    def test_big_integers_parse_like_drf(self):
+        from rest_framework.parsers import JSONParser
+
+        body = b'{"big": 123456789012345678901234567890, "low": -9223372036854775809, "ids": [18446744073709551616]}'
+        expected = JSONParser().parse(BytesIO(body))
+        self.assertEqual(expected['big'], 123456789012345678901234567890)
+        for codec in json_codec.JSON_CODECS:
+            with self.subTest(codec=codec), override_settings(JSON_CODEC=codec):
+                parsed = json_codec.JSONParser().parse(BytesIO(body))
+                self.assertEqual(parsed, expected)
+                self.assertIsInstance(parsed['big'], int)
+
+    @override_settings(JSON_CODEC='orjson')
+    def test_exponent_floats_keep_their_value(self):
+        # Spelled differently from the stdlib (1e16 / 1e+16), same numbers
+        data = [1e16, 1e-05, 4.722452435761166e-07, 1.5e300, -2.5e-9]
+        self.assertEqual(json_codec.loads(json_codec.JSONRenderer().render(data)), data)
+        self.assertNotEqual(json_codec.JSONRenderer().render(data), renderers.JSONRenderer().render(data))
+
+    def test_indented_rendering_falls_back_to_drf(self):
+        context = {'indent': 2}
+        self.assertEqual(
+            json_codec.JSONRenderer().render(self.DATA, renderer_context=context),
+            renderers.JSONRenderer().render(self.DATA, renderer_context=context)
+        )
+
+    def test_parser(self):
+        body = '{"message": "Zoë \\u2028", "ids": [1, 2]}'.encode()
+        for codec in json_codec.JSON_CODECS:
+            with self.subTest(codec=codec), override_settings(JSON_CODEC=codec):
+                parser = json_codec.JSONParser()
+                self.assertEqual(parser.parse(BytesIO(body)), {'message': 'Zoë \u2028', 'ids': [1, 2]})
+                with self.assertRaises(ParseError):
+                    parser.parse(BytesIO(b'{"message": '))
+                with self.assertRaises(ParseError):
+                    parser.parse(BytesIO(b'{"score": NaN}'))
+
+    def test_missing_orjson_falls_back_to_stdlib(self):
+        with mock.patch.object(json_codec, 'orjson', None):
+            json_codec.get_codec.cache_clear()
+            try:
+                self.assertEqual(json_codec.get_codec().name, 'json')
+                self.assertEqual(json_codec.dumps_text({'a': [1]}), '{"a":[1]}')
+            finally:
+                json_codec.get_codec.cache_clear()
+
+    @override_settings(JSON_CODEC='yaml')
+    def test_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            json_codec.get_codec()
+
+    def test_api_responses_use_codec(self):
+        profile = create_profile('alice')
+        client = APIClient()
+        client.force_authenticate(profile.user)
+        response = client.get('/api/v1/skills/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.accepted_renderer, json_codec.JSONRenderer)
+
+
+class ChatHistoryPaginationTests(TestCase):
+    """by_match pages through a conversation by (created_at, id) keyset"""
+
+    @classmethod
+    def setUpTestData(cls):
+        from django.utils import timezone
+
+        alice, bob = create_profile('alice'), create_profile('bob')
+        cls.match = Match.objects.create(user1=alice, user2=bob)
+        cls.user = alice.user
+        # Messages sharing a timestamp are ordered by id
+        now = timezone.now()
+        ChatMessage.objects.bulk_create([
+            ChatMessage(match=cls.match, sender=alice if i % 2 else bob, message=f'message {i}')
+            for i in range(23)
+        ])
+        for i, message in enumerate(ChatMessage.objects.order_by('pk')):
+            message.created_at = now + datetime.timedelta(seconds=i // 3)
+            message.save(update_fields=['created_at'])
+        cls.expected = [f'message {i}' for i in range(23)]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_page(self, url=None, **params):
+        if url is None:
+            response = self.client.get('/api/v1/messages/by_match/', {'match_id': self.match.id, **params})
+        else:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_back_from_newest(self):
+        page = self.get_page(page_size=10)
+        self.assertEqual([m['message'] for m in page['results']], self.expected[-10:])
+        self.assertIsNone(page['previous'])
+
+        seen = [m['message'] for m in page['results']]
+        while page['next']:
+            page = self.get_page(page['next'])
+            self.assertIsNotNone(page['previous'])
+            seen = [m['message'] for m in page['results']] + seen
+        self.assertEqual(seen, self.expected)
+
+    def test_previous_pages_forward(self):
+        page = self.get_page(page_size=5)
+        for _ in range(3):
+            page = self.get_page(page['next'])
+        self.assertEqual([m['message'] for m in page['results']], self.expected[3:8])
+
+        seen = [m['message'] for m in page['results']]
+        while page['previous']:
+            page = self.get_page(page['previous'])
+            seen += [m['message'] for m in page['results']]
+        self.assertEqual(seen, self.expected[3:])
+
+    def test_page_cost_is_constant(self):
+        page = self.get_page(page_size=4)
+        with CaptureQueriesContext(connection) as first:
+            self.get_page(page_size=4)
+        for _ in range(4):
+            with CaptureQueriesContext(connection) as later:
+                page = self.get_page(page['next'])
+            self.assertEqual(len(later.captured_queries), len(first.captured_queries))
+        self.assertNotIn('OFFSET', later.captured_queries[-1]['sql'].upper())
+
+    def test_invalid_requests(self):
+        url = '/api/v1/messages/by_match/'
+        for params in (
+            {'match_id': self.match.id, 'before': 'not-a-cursor'},
+            {'match_id': self.match.id, 'before': 'MTo=', 'after': 'MTo='},
+            {'match_id': self.match.id, 'page_size': 'many'},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+
+        outsider = create_profile('carol')
+        self.client.force_authenticate(outsider.user)
+        self.assertEqual(self.client.get(url, {'match_id': self.match.id}).status_code, 403)
+
+
+class ReadWatermarkTests(TestCase):
+    """Read state is one watermark per participant and match"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice, cls.bob, cls.carol = create_profile('alice'), create_profile('bob'), create_profile('carol')
+        cls.match = Match.objects.create(user1=cls.alice, user2=cls.bob)
+        cls.other_match = Match.objects.create(user1=cls.carol, user2=cls.alice)
+        cls.messages = [
+            ChatMessage.objects.create(match=cls.match, sender=cls.bob if i % 3 else cls.alice, message=f'm{i}')
+            for i in range(9)
+        ]
+        ChatMessage.objects.create(match=cls.other_match, sender=cls.carol, message='hey')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice.user)
+
+    def test_mark_read_is_one_update(self):
+        with self.assertNumQueries(1):
+            self.match.mark_read(self.alice, self.messages[5].pk)
+        self.match.refresh_from_db()
+        self.assertEqual(self.match.read_up_to(self.alice), self.messages[5].pk)
+        self.assertEqual(self.match.read_up_to(self.bob), 0)
+
+        # An older message does not move the watermark back
+        self.match.mark_read(self.alice, self.messages[2].pk)
+        self.match.refresh_from_db()
+        self.assertEqual(self.match.read_up_to(self.alice), self.messages[5].pk)
+
+    def test_is_read_follows_recipient_watermark(self):
+        self.match.mark_read(self.alice, self.messages[5].pk)
+        read = {
+            message.message: message.is_read
+            for message in ChatMessage.objects.filter(match=self.match).select_related('match')
+        }
+        # Bob's messages up to m5 are read by Alice; Alice's own wait for Bob
+        self.assertEqual(read, {
+            'm0': False, 'm1': True, 'm2': True, 'm3': False, 'm4': True, 'm5': True,
+            'm6': False, 'm7': False, 'm8': False,
+        })
+
+    def test_mark_as_read_endpoint(self):
+        message = self.messages[7]
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(f'/api/v1/messages/{message.pk}/mark_as_read/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['is_read'])
+        self.assertEqual(sum(query['sql'].startswith('UPDATE') for query in context.captured_queries), 1)
+        self.assertEqual(
+            list(ChatMessage.objects.unread_by(self.alice).filter(match=self.match)), [self.messages[8]]
+        )
+
+    def test_is_read_is_read_only(self):
+        from .serializers import ChatMessageSerializer
+
+        self.assertTrue(ChatMessageSerializer().fields['is_read'].read_only)
+        message = self.messages[1]
+        response = self.client.patch(f'/api/v1/messages/{message.pk}/', {'is_read': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['is_read'])
+
+    def test_admin_shows_read_state_as_boolean(self):
+        from django.contrib import admin
+        from django.contrib.admin.templatetags.admin_list import items_for_result
+        from django.test import RequestFactory
+
+        self.match.mark_read(self.alice, self.messages[1].pk)
+        model_admin = admin.site._registry[ChatMessage]
+        request = RequestFactory().get('/admin/api/chatmessage/')
+        request.user = User.objects.create(username='staff', is_staff=True, is_superuser=True)
+        changelist = model_admin.get_changelist_instance(request)
+        cells = ''.join(items_for_result(changelist, ChatMessage.objects.get(pk=self.messages[1].pk), None))
+        self.assertIn('icon-yes', cells)
+
+    def test_unread_counts(self):
+        response = self.client.get('/api/v1/messages/unread_counts/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'total': 7, 'matches': {str(self.match.pk): 6, str(self.other_match.pk): 1},
+        })
+
+        self.match.mark_read(self.alice, self.messages[8].pk)
+        self.assertEqual(self.client.get('/api/v1/messages/unread_counts/').json(), {
+            'total': 1, 'matches': {str(self.other_match.pk): 1},
+        })
+
+
+class BatchCompatibilityTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.skills = create_skills()
+        cls.profiles = create_population(cls.skills, 30, seed=8)
+        cls.user = cls.profiles[0]
+
+    def setUp(self):
+        get_pair_score_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user.user)
+
+    def post(self, ids):
+        return self.client.post('/api/v1/profiles/compatibility/', {'ids': ids}, format='json')
+
+    def test_scores_match_pairwise(self):
+        ids = [p.id for p in reversed(self.profiles[1:])] + [999999]
+        response = self.post(ids)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            [
+                {'id': p.id, 'compatibility_score': round(calculate_compatibility_score(self.user, p), 2)}
+                for p in reversed(self.profiles[1:])
+            ],
+        )
+
+    def test_query_count_does_not_grow_with_ids(self):
+        from .matching_algorithm import batch_compatibility_scores
+
+        with self.assertNumQueries(1):
+            batch_compatibility_scores(self.user, [p.id for p in self.profiles[1:5]])
+        with self.assertNumQueries(1):
+            batch_compatibility_scores(self.user, [p.id for p in self.profiles[5:]])
+
+    def test_skips_own_and_admin_profiles(self):
+        admin = create_profile('admin', skills=self.skills[:3], looking_for=self.skills[3:6])
+        response = self.post([self.user.id, admin.id, self.profiles[1].id])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.json()], [self.profiles[1].id])
+
+    def test_rejects_bare_array_body(self):
+        response = self.client.post(
+            '/api/v1/profiles/compatibility/', [p.id for p in self.profiles[1:3]], format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_non_integer_ids(self):
+        for ids in ([1.5], [None], [True], [[1]], [{'id': 1}], [self.profiles[1].id, 'x']):
+            with self.subTest(ids=ids):
+                self.assertEqual(self.post(ids).status_code, 400)
+
+    @override_settings(COMPATIBILITY_BATCH_LIMIT=5)
+    def test_rejects_bad_input(self):
+        self.assertEqual(self.post([p.id for p in self.profiles[1:7]]).status_code, 400)
+        self.assertEqual(self.post('1,2').status_code, 400)
+        self.assertEqual(self.post(['1']).status_code, 400)
+
+
+class LikeTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.skills = create_skills()
+        cls.alice, cls.bob = create_population(cls.skills, 2, seed=9)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def like(self, liker, liked):
+        self.client.force_authenticate(liker.user)
+        return self.client.post(f'/api/v1/profiles/{liked.id}/like/')
+
+    def test_mutual_like_creates_one_match(self):
+        first = self.like(self.alice, self.bob)
+        self.assertEqual((first.status_code, first.json()['is_new_match']), (201, False))
+        second = self.like(self.bob, self.alice)
+        self.assertEqual((second.status_code, second.json()['is_new_match']), (201, True))
+        self.assertEqual(second.json()['match']['user1'], min(self.alice.id, self.bob.id))
+        again = self.like(self.bob, self.alice)
+        self.assertEqual((again.status_code, again.json()['is_new_match']), (200, False))
+        self.assertEqual(again.json()['match']['id'], second.json()['match']['id'])
+        self.assertEqual(Match.objects.count(), 1)
+        self.assertEqual(Like.objects.count(), 2)
+
+    def test_fixed_statement_count(self):
+        from .matching_algorithm import like_profile
+
+        def statements(context):
+            return [
+                query['sql'].split()[0] for query in context.captured_queries
+                if not query['sql'].startswith(('SAVEPOINT', 'RELEASE', 'ROLLBACK'))
+            ]
+
+        cached_compatibility_score(self.alice, self.bob)
+        with CaptureQueriesContext(connection) as first:
+            like_profile(self.alice, self.bob)
+        with CaptureQueriesContext(connection) as second:
+            like_profile(self.bob, self.alice)
+        with CaptureQueriesContext(connection) as repeat:
+            like_profile(self.bob, self.alice)
+        # Like insert, pair lock, reverse-like check, then the match insert
+        self.assertEqual(statements(first), ['INSERT', 'SELECT', 'SELECT'])
+        self.assertEqual(statements(second), ['INSERT', 'SELECT', 'SELECT', 'INSERT'])
+        # Both inserts hit unique constraints; the existing match is read back
+        self.assertEqual(statements(repeat), ['INSERT', 'SELECT', 'SELECT', 'INSERT', 'SELECT'])
+
+
+class ConcurrentLikeTests(TransactionTestCase):
+
+    # SQLite serializes writers per database and has no row locks, so
+    # parallel transactions fail with "table is locked" instead of queueing
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_parallel_mutual_likes_create_exactly_one_match(self):
+        import threading
+        from .matching_algorithm import like_profile
+
+        skills = create_skills()
+        profiles = create_population(skills, 16, seed=10)
+        pairs = list(zip(profiles[::2], profiles[1::2]))
+        barrier = threading.Barrier(2 * len(pairs))
+        errors = []
+
+        def like(liker, liked):
+            try:
+                barrier.wait()
+                like_profile(liker, liked)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=like, args=args)
+            for first, second in pairs
+            for args in ((first, second), (second, first))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Like.objects.count(), 2 * len(pairs))
+        for first, second in pairs:
+            self.assertEqual(
+                Match.objects.filter(
+                    Q(user1=first, user2=second) | Q(user1=second, user2=first)
+                ).count(),
+                1,
+            )
+
+
+class LikeInterleavingTests(TestCase):
+    """
+    The interleavings ConcurrentLikeTests produces with real threads, replayed
+    in one connection by committing the other user's rows mid-call, so they
+    also run on SQLite (which has no row locks).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice, cls.bob = create_profile('alice'), create_profile('bob')
+
+    def interleave(self, model, action):
+        """Run `action` just before like_profile inserts its first `model` row"""
+        from . import matching_algorithm
+
+        insert = matching_algorithm._insert_unless_duplicate
+        pending = [action]
+
+        def insert_after_other(instance):
+            if isinstance(instance, model) and pending:
+                pending.pop()()
+            return insert(instance)
+
+        return mock.patch.object(matching_algorithm, '_insert_unless_duplicate', insert_after_other)
+
+    def test_reverse_like_lands_before_the_check(self):
+        from .matching_algorithm import like_profile
+
+        # Bob's like commits just before Alice's, so her reverse-like check sees it
+        with self.interleave(Like, lambda: Like.objects.create(liker=self.bob, liked=self.alice)):
+            _, match, is_new = like_profile(self.alice, self.bob)
+        self.assertTrue(is_new)
+        # Bob's own call then finds both likes and the match already there
+        like_created, existing, is_new = like_profile(self.bob, self.alice)
+        self.assertEqual((like_created, existing, is_new), (False, match, False))
+        self.assertEqual(Match.objects.count(), 1)
+
+    def test_both_see_the_reverse_like(self):
+        from .matching_algorithm import like_profile
+
+        # Both likes exist and Bob's transaction inserts the match first
+        Like.objects.create(liker=self.bob, liked=self.alice)
+        with self.interleave(
+            Match, lambda: Match.objects.create(user1=self.alice, user2=self.bob, compatibility_score=1.0)
+        ):
+            like_created, match, is_new = like_profile(self.alice, self.bob)
+        self.assertTrue(like_created)
+        self.assertFalse(is_new)
+        self.assertEqual(match, Match.objects.between(self.alice, self.bob).get())
+        self.assertEqual(Match.objects.count(), 1)
+        self.assertEqual(Like.objects.count(), 2)
+
+
+class CanonicalMatchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.skills = create_skills()
+        cls.first, cls.second, cls.third = sorted(
+            create_population(cls.skills, 3, seed=11), key=lambda p: p.id
+        )
+
+    def test_pairs_are_stored_in_canonical_order(self):
+        match = Match.objects.create(user1=self.second, user2=self.first)
+        self.assertEqual((match.user1_id, match.user2_id), (self.first.id, self.second.id))
+        self.assertEqual(Match.objects.between(self.second, self.first).get(), match)
+        self.assertEqual(Match.objects.between(self.first.id, self.second.id).get(), match)
+        self.assertFalse(Match.objects.between(self.first, self.third).exists())
+
+    def test_pair_lookup_is_a_single_equality(self):
+        with CaptureQueriesContext(connection) as context:
+            list(Match.objects.between(self.second, self.first))
+        sql = context.captured_queries[0]['sql']
+        self.assertIn(f'"user1_id" = {self.first.id}', sql)
+        self.assertIn(f'"user2_id" = {self.second.id}', sql)
+        self.assertNotIn(' IN ', sql)
+
+    def test_constraint_rejects_reversed_rows(self):
+        from django.db import IntegrityError
+
+        match = Match.objects.create(user1=self.first, user2=self.second)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Match.objects.filter(pk=match.pk).update(user1=self.second, user2=self.first)
+
+    def test_participants(self):
+        match = Match.objects.create(user1=self.first, user2=self.second)
+        self.assertTrue(match.has_participant(self.second))
+        self.assertFalse(match.has_participant(self.third.id))
+        self.assertEqual(match.other_participant(self.first), self.second)
+        self.assertEqual(match.other_participant(self.second), self.first)
+        self.assertEqual(list(Match.objects.involving(self.second)), [match])
+
+
+class IndexUsageTests(TestCase):
+    """The hot path queries are planned with their indexes (see migrations 0006-0008)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.profiles = create_population(create_skills(), 30, seed=6)
+        for i, profile in enumerate(cls.profiles[1:]):
+            Like.objects.create(liker=profile, liked=cls.profiles[i % 3])
+            Match.objects.create(user1=cls.profiles[i % 3], user2=profile, compatibility_score=i)
+        cls.match = Match.objects.first()
+        for i in range(40):
+            message = ChatMessage.objects.create(
+                match=cls.match, sender=cls.match.user1 if i % 2 else cls.match.user2, message=f'message {i}',
+            )
+            if i == 34:
+                cls.match.mark_read(cls.match.user1, message.pk)
+
+    def assertUsesIndex(self, queryset, index_name):
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Tables this small are cheaper to scan; ask for the plan an index allows
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_messages_by_match(self):
+        newest = ChatMessage.objects.filter(match=self.match).order_by('-created_at', '-id')
+        self.assertUsesIndex(newest, 'chat_match_keyset_idx')
+        oldest = newest.last()
+        self.assertUsesIndex(newest.before(oldest.created_at, oldest.pk), 'chat_match_keyset_idx')
+
+    def test_unread_counts(self):
+        # The query of messages/unread_counts/: each match of the user, then
+        # its messages past the user's watermark as an index range
+        unread = ChatMessage.objects.unread_counts(self.match.user1)
+        self.assertEqual(list(unread), [(self.match.pk, 2)])
+        self.assertUsesIndex(unread, 'chat_match_id_idx')
+
+    def test_likes_received(self):
+        self.assertUsesIndex(Like.objects.filter(liked=self.profiles[0]), 'like_liked_created_idx')
+
+    def test_matches_by_score(self):
+        profile = self.profiles[0]
+        self.assertUsesIndex(
+            Match.objects.filter(user1=profile).order_by('-compatibility_score'), 'match_user1_score_idx'
+        )
+        self.assertUsesIndex(
+            Match.objects.filter(user2=profile).order_by('-compatibility_score'), 'match_user2_score_idx'
+        )
+
+    def test_profiles_updated_since(self):
+        self.assertUsesIndex(
+            UserProfile.objects.filter(updated_at__gt=self.match.created_at).values('pk'), 'profile_updated_idx'
+        )
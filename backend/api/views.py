@@ -1,8 +1,14 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from django.conf import settings
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 from django.db.models import Q
 
 from .models import UserProfile, Like, Match, ChatMessage, MatchSuggestion, Skill
@@ -11,15 +17,59 @@ from .serializers import (
     LikeSerializer, MatchSerializer, ChatMessageSerializer, MatchSuggestionSerializer,
     SkillSerializer
 )
-from .matching_algorithm import calculate_compatibility_score, get_top_suggestions, find_or_create_match
+from .matching_algorithm import (
+    calculate_compatibility_score, get_top_suggestions, like_profile, batch_compatibility_scores
+)
+from .query_plans import QueryPlanMixin, plan_instances, plan_queryset
+from .suggestions import get_feed_page, get_suggestions
+
+
+def encode_feed_cursor(snapshot_id, offset):
+    return urlsafe_b64encode(f'{snapshot_id}:{offset}'.encode()).decode()
+
+
+def decode_feed_cursor(cursor):
+    """(snapshot_id, offset) from a feed cursor, None if malformed"""
+    try:
+        snapshot_id, offset = urlsafe_b64decode(cursor.encode()).decode().split(':')
+        offset = int(offset)
+    except (ValueError, UnicodeError):
+        return None
+    return (snapshot_id, offset) if offset >= 0 else None
+
+
+def encode_message_cursor(message):
+    return urlsafe_b64encode(f'{message.pk}:{message.created_at.isoformat()}'.encode()).decode()
+
 
+def decode_message_cursor(cursor):
+    """(created_at, id) from a chat message cursor, None if malformed"""
+    try:
+        pk, created_at = urlsafe_b64decode(cursor.encode()).decode().split(':', 1)
+        pk = int(pk)
+        created_at = datetime.fromisoformat(created_at)
+    except (ValueError, UnicodeError):
+        return None
+    return (created_at, pk) if created_at.tzinfo is not None else None
 
-class UserProfileViewSet(viewsets.ModelViewSet):
+
+class UserProfileViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     """
     API endpoints for user profiles.
     """
     queryset = UserProfile.objects.all()
     permission_classes = [IsAuthenticated]
+    # Query budgets (see query_budget); listed profiles are loaded with their
+    # serializer's QueryPlan, so they do not grow with the page size
+    query_budget = 10
+    query_budgets = {
+        'create_profile': 50,
+        'suggestions': 20,
+        'suggestions_feed': 12,
+        'like': 20,
+        'unlike': 12,
+        'compatibility': 6,
+    }
     
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -48,16 +98,27 @@ class UserProfileViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def create_profile(self, request):
         """Create or update current user's profile"""
-        profile, created = UserProfile.objects.get_or_create(user=request.user)
-        
-        serializer = UserProfileSerializer(profile, data=request.data, partial=True)
-        if serializer.is_valid():
+        # One transaction, so suggestion updates run once for the new row,
+        # its fields and both skill lists
+        with transaction.atomic():
+            profile, created = UserProfile.objects.get_or_create(user=request.user)
+            
+            serializer = UserProfileSerializer(profile, data=request.data, partial=True)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
             serializer.save()
-            return Response(
-                serializer.data,
-                status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
-            )
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            serializer.data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+    
+    def suggestion_data(self, suggestions):
+        """Listed profiles of (UserProfile, score) pairs, with their compatibility_score"""
+        profiles = plan_instances([suggested_user for suggested_user, _ in suggestions], UserProfileListSerializer)
+        result = UserProfileListSerializer(profiles, many=True).data
+        for user_data, (_, score) in zip(result, suggestions):
+            user_data['compatibility_score'] = round(score, 2)
+        return result
     
     @action(detail=False, methods=['get'])
     def suggestions(self, request):
@@ -70,15 +131,81 @@ class UserProfileViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        suggestions = get_top_suggestions(profile, limit=4)
+        suggestions, cache_hit = get_suggestions(profile, limit=4)
+        result = self.suggestion_data(suggestions)
         
-        result = []
-        for suggested_user, score in suggestions:
-            user_data = UserProfileListSerializer(suggested_user).data
-            user_data['compatibility_score'] = round(score, 2)
-            result.append(user_data)
+        response = Response(result)
+        response['X-Suggestions-Cache'] = 'hit' if cache_hit else 'miss'
+        return response
+    
+    @action(detail=False, methods=['get'])
+    def suggestions_feed(self, request):
+        """Cursor-paginated suggestions, stable while the user scrolls"""
+        try:
+            profile = UserProfile.objects.get(user=request.user)
+        except UserProfile.DoesNotExist:
+            return Response(
+                {'error': 'Profile not created yet'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        try:
+            page_size = min(max(int(request.query_params.get('page_size', 10)), 1), 50)
+        except ValueError:
+            return Response({'error': 'page_size must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            position = decode_feed_cursor(cursor)
+            page = get_feed_page(profile, *position, page_size=page_size) if position else None
+            if page is None:
+                return Response(
+                    {'error': 'Invalid or expired cursor'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+        else:
+            page = get_feed_page(profile, page_size=page_size)
+        suggestions, snapshot_id, next_offset = page
+        result = self.suggestion_data(suggestions)
+        
+        next_url = None
+        if next_offset is not None:
+            next_url = replace_query_param(
+                request.build_absolute_uri(), 'cursor', encode_feed_cursor(snapshot_id, next_offset)
+            )
+        return Response({'next': next_url, 'results': result})
+    
+    @action(detail=False, methods=['post'])
+    def compatibility(self, request):
+        """Compatibility of the current user with each profile in `ids`"""
+        try:
+            profile = UserProfile.objects.get(user=request.user)
+        except UserProfile.DoesNotExist:
+            return Response(
+                {'error': 'Profile not created yet'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        # The body must be an object; a bare JSON array has no 'ids'
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        max_ids = getattr(settings, 'COMPATIBILITY_BATCH_LIMIT', 300)
+        if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            return Response(
+                {'error': 'ids must be a list of profile ids'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(ids) > max_ids:
+            return Response(
+                {'error': f'At most {max_ids} ids per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        return Response(result)
+        scores = batch_compatibility_scores(profile, ids)
+        return Response([
+            {'id': profile_id, 'compatibility_score': round(scores[profile_id], 2)}
+            for profile_id in dict.fromkeys(ids)
+            if profile_id in scores
+        ])
     
     @action(detail=True, methods=['post'])
     def like(self, request, pk=None):
@@ -99,13 +226,8 @@ class UserProfileViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        like, created = Like.objects.get_or_create(
-            liker=current_profile,
-            liked=liked_profile
-        )
-        
-        # Check if this creates a match
-        match, is_new_match = find_or_create_match(current_profile, liked_profile)
+        # Records the like and creates the match if it is mutual
+        created, match, is_new_match = like_profile(current_profile, liked_profile)
         
         response_data = {
             'liked': True,
@@ -139,19 +261,18 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         return Response({'error': 'Like not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
-class LikeViewSet(viewsets.ReadOnlyModelViewSet):
+class LikeViewSet(QueryPlanMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoints for viewing likes.
     """
     serializer_class = LikeSerializer
     permission_classes = [IsAuthenticated]
+    query_budget = 6
     
     def get_queryset(self):
         user = self.request.user
         # Return likes given by or received by current user
-        return Like.objects.filter(
-            Q(liker__user=user) | Q(liked__user=user)
-        ).select_related('liker__user', 'liked__user')
+        return Like.objects.filter(Q(liker__user=user) | Q(liked__user=user))
     
     @action(detail=False, methods=['get'])
     def likes_received(self, request):
@@ -161,8 +282,8 @@ class LikeViewSet(viewsets.ReadOnlyModelViewSet):
         except UserProfile.DoesNotExist:
             return Response([], status=status.HTTP_200_OK)
         
-        likes = Like.objects.filter(liked=profile).select_related('liker__user')
-        serializer = LikeSerializer(likes, many=True)
+        # Serialized without request context, so profile images stay relative paths
+        serializer = LikeSerializer(plan_queryset(Like.objects.filter(liked=profile), LikeSerializer), many=True)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
@@ -173,17 +294,17 @@ class LikeViewSet(viewsets.ReadOnlyModelViewSet):
         except UserProfile.DoesNotExist:
             return Response([], status=status.HTTP_200_OK)
         
-        likes = Like.objects.filter(liker=profile).select_related('liked__user')
-        serializer = LikeSerializer(likes, many=True)
+        serializer = LikeSerializer(plan_queryset(Like.objects.filter(liker=profile), LikeSerializer), many=True)
         return Response(serializer.data)
 
 
-class MatchViewSet(viewsets.ReadOnlyModelViewSet):
+class MatchViewSet(QueryPlanMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoints for matches.
     """
     serializer_class = MatchSerializer
     permission_classes = [IsAuthenticated]
+    query_budget = 8
     
     def get_queryset(self):
         user = self.request.user
@@ -193,9 +314,7 @@ class MatchViewSet(viewsets.ReadOnlyModelViewSet):
             return Match.objects.none()
         
         # Return matches involving current user
-        return Match.objects.filter(
-            Q(user1=profile) | Q(user2=profile)
-        ).select_related('user1__user', 'user2__user').order_by('-compatibility_score')
+        return Match.objects.involving(profile).select_related('user1__user', 'user2__user').order_by('-compatibility_score')
     
     @action(detail=True, methods=['get'])
     def other_user(self, request, pk=None):
@@ -209,26 +328,23 @@ class MatchViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        if match.user1 == current_profile:
-            other_user = match.user2
-        elif match.user2 == current_profile:
-            other_user = match.user1
-        else:
+        if not match.has_participant(current_profile):
             return Response(
                 {'error': 'Access denied'},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        serializer = UserProfileDetailSerializer(other_user)
+        serializer = UserProfileDetailSerializer(match.other_participant(current_profile))
         return Response(serializer.data)
 
 
-class ChatMessageViewSet(viewsets.ModelViewSet):
+class ChatMessageViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     """
     API endpoints for chat messages in a match.
     """
     serializer_class = ChatMessageSerializer
     permission_classes = [IsAuthenticated]
+    query_budget = 8
     
     def get_queryset(self):
         user = self.request.user
@@ -238,11 +354,8 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
             return ChatMessage.objects.none()
         
         # Return messages from matches involving current user
-        matches = Match.objects.filter(
-            Q(user1=profile) | Q(user2=profile)
-        )
         return ChatMessage.objects.filter(
-            match__in=matches
+            match__in=Match.objects.involving(profile)
         ).select_related('match', 'sender__user').order_by('-created_at')
     
     def create(self, request, *args, **kwargs):
@@ -271,7 +384,7 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
             )
         
         # Verify user is part of this match
-        if not (match.user1 == sender_profile or match.user2 == sender_profile):
+        if not match.has_participant(sender_profile):
             return Response(
                 {'error': 'Access denied'},
                 status=status.HTTP_403_FORBIDDEN
@@ -288,7 +401,13 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def by_match(self, request):
-        """Get messages for a specific match"""
+        """
+        One page of a match's messages, oldest first within the page.
+        
+        The first page holds the newest messages; `next` links to older ones
+        (`before` cursor) and `previous` to newer ones (`after` cursor). Pages
+        are keyset ranges on (created_at, id), so every page costs the same.
+        """
         match_id = request.query_params.get('match_id')
         if not match_id:
             return Response(
@@ -296,6 +415,23 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        default_page_size = getattr(settings, 'CHAT_PAGE_SIZE', 50)
+        try:
+            page_size = min(max(int(request.query_params.get('page_size', default_page_size)), 1), 200)
+        except ValueError:
+            return Response({'error': 'page_size must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        before = request.query_params.get('before')
+        after = request.query_params.get('after')
+        if before and after:
+            return Response(
+                {'error': 'Pass either before or after, not both'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        position = decode_message_cursor(before or after) if before or after else None
+        if (before or after) and position is None:
+            return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        
         try:
             user_profile = UserProfile.objects.get(user=request.user)
         except UserProfile.DoesNotExist:
@@ -313,25 +449,58 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
             )
         
         # Verify user is part of this match
-        if not (match.user1 == user_profile or match.user2 == user_profile):
+        if not match.has_participant(user_profile):
             return Response(
                 {'error': 'Access denied'},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        messages = ChatMessage.objects.filter(match=match).order_by('created_at')
-        serializer = self.get_serializer(messages, many=True)
-        return Response(serializer.data)
+        messages = plan_queryset(ChatMessage.objects.filter(match=match), self.get_serializer_class())
+        # One row past the page tells whether there is more in that direction
+        if after:
+            page = list(messages.after(*position).order_by('created_at', 'id')[:page_size + 1])
+            has_newer, has_older = len(page) > page_size, True
+            page = page[:page_size]
+        else:
+            if before:
+                messages = messages.before(*position)
+            page = list(messages.order_by('-created_at', '-id')[:page_size + 1])
+            has_newer, has_older = bool(before), len(page) > page_size
+            page = page[:page_size][::-1]
+        
+        next_url = previous_url = None
+        if page:
+            url = remove_query_param(remove_query_param(request.build_absolute_uri(), 'before'), 'after')
+            if has_older:
+                next_url = replace_query_param(url, 'before', encode_message_cursor(page[0]))
+            if has_newer:
+                previous_url = replace_query_param(url, 'after', encode_message_cursor(page[-1]))
+        serializer = self.get_serializer(page, many=True)
+        return Response({'next': next_url, 'previous': previous_url, 'results': serializer.data})
     
     @action(detail=True, methods=['post'])
     def mark_as_read(self, request, pk=None):
-        """Mark a message as read"""
+        """Mark a message and every earlier one in its match as read, with one write"""
         message = self.get_object()
-        message.is_read = True
-        message.save()
+        reader_id = UserProfile.objects.values_list('pk', flat=True).get(user=request.user)
+        message.match.mark_read(reader_id, message.pk)
         
         serializer = self.get_serializer(message)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def unread_counts(self, request):
+        """Unread messages of the current user, in total and per match"""
+        try:
+            profile = UserProfile.objects.get(user=request.user)
+        except UserProfile.DoesNotExist:
+            return Response(
+                {'error': 'Profile not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        counts = dict(ChatMessage.objects.unread_counts(profile))
+        return Response({'total': sum(counts.values()), 'matches': counts})
 
 class SkillViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -341,6 +510,7 @@ class SkillViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Skill.objects.all().order_by('category', 'name')
     serializer_class = SkillSerializer
     permission_classes = [IsAuthenticated]
+    query_budget = 4
     
     @action(detail=False, methods=['get'])
     def by_category(self, request):
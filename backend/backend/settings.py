@@ -60,6 +60,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.query_budget.QueryBudgetMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -173,10 +174,63 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.json_codec.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'api.json_codec.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
 
+# JSON codec for API responses, request bodies and chat frames: 'orjson' (the
+# stdlib is used when it is not installed) or 'json'
+JSON_CODEC = config('JSON_CODEC', default='orjson')
+
+# Matching engine used by get_top_suggestions: 'python', 'numpy' or 'sql' (scored
+# in one query on PostgreSQL, the Python engine elsewhere)
+MATCHING_ENGINE = config('MATCHING_ENGINE', default='python')
+# Suggestion candidates: 'index' (profiles sharing or complementing a skill), 'lsh'
+# (approximate MinHash buckets over the same relation) or 'all'
+MATCHING_CANDIDATES = config('MATCHING_CANDIDATES', default='index')
+# MinHash bands and rows per band for 'lsh', and the index refresh interval in seconds
+MATCHING_LSH_BANDS = config('MATCHING_LSH_BANDS', default=16, cast=int)
+MATCHING_LSH_ROWS = config('MATCHING_LSH_ROWS', default=2, cast=int)
+MATCHING_LSH_REFRESH = config('MATCHING_LSH_REFRESH', default=5, cast=int)
+# Most recent non-candidate profiles scored when the index yields too few suggestions (0 disables)
+MATCHING_FALLBACK_POOL = config('MATCHING_FALLBACK_POOL', default=200, cast=int)
+# Candidates read per round trip while streaming suggestions
+MATCHING_CHUNK_SIZE = config('MATCHING_CHUNK_SIZE', default=2000, cast=int)
+# Suggestions stored per user in MatchSuggestion, and their maximum age in seconds
+SUGGESTION_CACHE_SIZE = config('SUGGESTION_CACHE_SIZE', default=10, cast=int)
+SUGGESTION_CACHE_TTL = config('SUGGESTION_CACHE_TTL', default=3600, cast=int)
+# Suggestions ranked once per feed snapshot, and how long a snapshot can be paged through
+SUGGESTION_FEED_SIZE = config('SUGGESTION_FEED_SIZE', default=100, cast=int)
+SUGGESTION_FEED_TTL = config('SUGGESTION_FEED_TTL', default=900, cast=int)
+# Chat messages per by_match page (newest first, older pages by cursor)
+CHAT_PAGE_SIZE = config('CHAT_PAGE_SIZE', default=50, cast=int)
+# Most profile ids accepted by one profiles/compatibility/ request
+COMPATIBILITY_BATCH_LIMIT = config('COMPATIBILITY_BATCH_LIMIT', default=300, cast=int)
+# Pair-score cache: in-process LRU entries (0 disables), optional shared CACHES alias, timeout in seconds
+PAIR_SCORE_CACHE_SIZE = config('PAIR_SCORE_CACHE_SIZE', default=100000, cast=int)
+PAIR_SCORE_CACHE_ALIAS = config('PAIR_SCORE_CACHE_ALIAS', default='') or None
+PAIR_SCORE_CACHE_TIMEOUT = config('PAIR_SCORE_CACHE_TIMEOUT', default=86400, cast=int)
+# Patch profile changes into stored suggestion lists instead of invalidating all of them
+SUGGESTION_INCREMENTAL_UPDATES = config('SUGGESTION_INCREMENTAL_UPDATES', default=True, cast=bool)
+# Most stored lists patched inside a request; past that, changes wait for apply_suggestion_updates
+SUGGESTION_INCREMENTAL_MAX_HOLDERS = config('SUGGESTION_INCREMENTAL_MAX_HOLDERS', default=500, cast=int)
+
+# Query budgets: X-DB-Queries / X-DB-Time-Ms response headers, and the budget for
+# views that declare none (0: unlimited). Tests run with QUERY_BUDGET_STRICT on.
+QUERY_BUDGET_HEADERS = config('QUERY_BUDGET_HEADERS', default=DEBUG, cast=bool)
+QUERY_BUDGET_DEFAULT = config('QUERY_BUDGET_DEFAULT', default=0, cast=int) or None
+QUERY_BUDGET_STRICT = False
+TEST_RUNNER = 'api.test_runner.QueryBudgetTestRunner'
+
 # CORS Configuration
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -192,6 +246,8 @@ FRONTEND_URL = config('FRONTEND_URL', default='')
 if FRONTEND_URL:
     CORS_ALLOWED_ORIGINS.append(FRONTEND_URL)
 
+CORS_EXPOSE_HEADERS = ['X-Suggestions-Cache']
+
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOW_HEADERS = [
     'accept',
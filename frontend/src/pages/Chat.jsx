@@ -14,7 +14,10 @@ export default function Chat() {
   const [otherUser, setOtherUser] = useState(null);
   const [loading, setLoading] = useState(true);
   const [connected, setConnected] = useState(false);
+  const [olderCursor, setOlderCursor] = useState(null);
+  const [loadingOlder, setLoadingOlder] = useState(false);
   const messagesEndRef = useRef(null);
+  const prependingRef = useRef(false);
   const wsRef = useRef(null);
   useEffect(() => {
     if (!matchId) {
@@ -32,6 +35,11 @@ export default function Chat() {
     };
   }, [matchId]);
   useEffect(() => {
+    // Older pages are added above what the user is reading; only follow new messages
+    if (prependingRef.current) {
+      prependingRef.current = false;
+      return;
+    }
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
   }, [messages]);
 
@@ -42,8 +50,15 @@ export default function Chat() {
         matchesAPI.getOtherUser(matchId),
       ]);
       
-      setMessages(messagesData || []);
+      setMessages(messagesData.results || []);
+      setOlderCursor(messagesData.olderCursor);
       setOtherUser(otherUserData);
+
+      // One call marks the whole conversation up to the newest message as read
+      const newest = messagesData.results?.[messagesData.results.length - 1];
+      if (newest && !isMyMessage(newest) && !newest.is_read) {
+        chatAPI.markAsRead(newest.id).catch((error) => console.error("Failed to mark messages as read:", error));
+      }
     } catch (error) {
       console.error("Failed to load chat data:", error);
     } finally {
@@ -51,6 +66,22 @@ export default function Chat() {
     }
   };
 
+  const loadOlderMessages = async () => {
+    if (!olderCursor || loadingOlder) return;
+
+    setLoadingOlder(true);
+    try {
+      const page = await chatAPI.getMessages(matchId, olderCursor);
+      prependingRef.current = true;
+      setMessages((prev) => [...page.results, ...prev]);
+      setOlderCursor(page.olderCursor);
+    } catch (error) {
+      console.error("Failed to load older messages:", error);
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
   const connectWebSocket = () => {
     const handleMessage = (data) => {
       console.log("WebSocket message received:", data);
@@ -155,6 +186,17 @@ export default function Chat() {
         </div>
 
         <div className="flex-1 px-6 py-6 space-y-3 overflow-y-auto bg-[#F5F2ED]">
+          {olderCursor && (
+            <div className="text-center">
+              <button
+                onClick={loadOlderMessages}
+                disabled={loadingOlder}
+                className="text-xs text-[#6B6B6B] hover:text-[#1A1A1A] transition font-body disabled:opacity-40"
+              >
+                {loadingOlder ? "Loading\u2026" : "Load earlier messages"}
+              </button>
+            </div>
+          )}
           {messages.length === 0 ? (
             <div className="text-center text-[#9A9A9A] mt-10 font-body">
               <p>No messages yet.</p>
@@ -180,6 +180,39 @@ export const profileAPI = {
     throw new Error('Failed to get suggestions');
   },
 
+  /**
+   * Get one page of the suggestion feed; pass the returned nextCursor for the next page
+   */
+  getSuggestionsFeed: async (cursor = null, pageSize = 10) => {
+    const params = new URLSearchParams({ page_size: pageSize });
+    if (cursor) {
+      params.set('cursor', cursor);
+    }
+    const response = await apiRequest(`/api/v1/profiles/suggestions_feed/?${params}`);
+    if (response.ok) {
+      const data = await response.json();
+      return {
+        results: data.results,
+        nextCursor: data.next ? new URL(data.next).searchParams.get('cursor') : null,
+      };
+    }
+    throw new Error('Failed to get suggestions');
+  },
+
+  /**
+   * Get compatibility scores with a list of profiles (up to 300 ids)
+   */
+  getCompatibility: async (profileIds) => {
+    const response = await apiRequest('/api/v1/profiles/compatibility/', {
+      method: 'POST',
+      body: JSON.stringify({ ids: profileIds }),
+    });
+    if (response.ok) {
+      return response.json();
+    }
+    throw new Error('Failed to get compatibility scores');
+  },
+
   /**
    * Like a profile
    */
@@ -297,12 +330,21 @@ export const matchesAPI = {
 
 export const chatAPI = {
   /**
-   * Get messages for a specific match
+   * Get one page of a match's messages (newest page first, oldest first within it);
+   * pass the returned olderCursor to load the page before it
    */
-  getMessages: async (matchId) => {
-    const response = await apiRequest(`/api/v1/messages/by_match/?match_id=${matchId}`);
+  getMessages: async (matchId, before = null) => {
+    const params = new URLSearchParams({ match_id: matchId });
+    if (before) {
+      params.set('before', before);
+    }
+    const response = await apiRequest(`/api/v1/messages/by_match/?${params}`);
     if (response.ok) {
-      return response.json();
+      const data = await response.json();
+      return {
+        results: data.results,
+        olderCursor: data.next ? new URL(data.next).searchParams.get('before') : null,
+      };
     }
     throw new Error('Failed to get messages');
   },
@@ -322,7 +364,7 @@ export const chatAPI = {
   },
 
   /**
-   * Mark message as read
+   * Mark a message and every earlier one in its match as read
    */
   markAsRead: async (messageId) => {
     const response = await apiRequest(`/api/v1/messages/${messageId}/mark_as_read/`, {
@@ -333,6 +375,17 @@ export const chatAPI = {
     }
     throw new Error('Failed to mark message as read');
   },
+
+  /**
+   * Get unread message counts: { total, matches: { [matchId]: count } }
+   */
+  getUnreadCounts: async () => {
+    const response = await apiRequest('/api/v1/messages/unread_counts/');
+    if (response.ok) {
+      return response.json();
+    }
+    throw new Error('Failed to get unread counts');
+  },
 };
 
 // ======================